@@ -1,21 +1,57 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, send_file, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 import uuid
 import json
+import time
 from datetime import datetime
 import os
 import io
-from utils.openai_helper import generate_pdf_report, analyze_scan_with_chatgpt
+import queue
+from utils.openai_helper import analyze_scan_with_gemini, prepare_scan_analysis, stream_analysis_plan
+from utils.report_renderer import stream_report_html, render_pdf
+from utils.render_pool import RenderPool, RenderPoolFull
+from utils.zip_stream import stream_zip
 import traceback
 import sys
-from api.scan_api import scan_results, scans
+from utils.db import store, encode_cursor, decode_cursor
+from utils.validators import parse_page_args, parse_date_range
+from utils.export_cache import ExportCache, result_version
+from api.scan_api import analysis_queue, scan_events, publish_stage
+from utils.events import sse_event
+from utils.metrics import Trace, QUEUE_DEPTH, cache_lookup
 
 # Create reports directory if it doesn't exist
 REPORTS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'reports')
 os.makedirs(REPORTS_DIR, exist_ok=True)
 
-# In a real application, this would be a database
-reports = {}
+# Rendered exports, reused until the result changes
+export_cache = ExportCache(
+    os.getenv('EXPORT_CACHE_DIR', os.path.abspath(os.path.join(os.path.dirname(__file__), '../../reports/exports'))),
+    max_bytes=int(os.getenv('EXPORT_CACHE_MAX_MB', 500)) * 1024 * 1024,
+    max_age=int(os.getenv('EXPORT_CACHE_MAX_AGE', 7 * 24 * 3600))
+)
+
+# PDF renders run here, outside the request threads
+pdf_pool = RenderPool(
+    workers=int(os.getenv('PDF_WORKERS', 2)),
+    max_queued=int(os.getenv('PDF_QUEUE_SIZE', 8))
+)
+QUEUE_DEPTH.labels('pdf').set_function(lambda: pdf_pool.stats()['queued'])
+
+# Longest a status request may wait for an export to finish
+EXPORT_MAX_WAIT = 30
+
+# Full results read from the store at a time during a bulk export
+BULK_EXPORT_PAGE_SIZE = 20
+
+# Analysis states in which a queue worker or another stream is working on it
+ANALYSIS_ACTIVE_STATUSES = ('queued', 'running')
+
+# Longest a report stream follows an analysis that runs elsewhere
+ANALYSIS_FOLLOW_MAX_DURATION = int(os.getenv('ANALYSIS_FOLLOW_MAX_DURATION', 600))
+
+# Seconds between re-reads of the result while following an analysis (events may be missed)
+ANALYSIS_FOLLOW_POLL = 5
 
 report_bp = Blueprint('report', __name__)
 
@@ -23,11 +59,10 @@ report_bp = Blueprint('report', __name__)
 def get_report(report_id):
     """Get a specific report by ID."""
     # Check if report exists
-    if report_id not in scan_results:
+    result = store.get_result(report_id)
+    if result is None:
         return jsonify({"error": "Hisobot topilmadi"}), 404
     
-    result = scan_results[report_id]
-    
     return jsonify({
         "report": result
     }), 200
@@ -41,17 +76,17 @@ def export_report(scan_id):
             return jsonify({"error": "Noto'g'ri scan ID"}), 400
             
         # Check if scan exists
-        if scan_id not in scans:
+        scan = store.get_scan(scan_id)
+        if scan is None:
             return jsonify({"error": "Skanerlash topilmadi"}), 404
         
-        scan = scans[scan_id]
-        
         # Check if scan is completed
         if scan['status'] != 'completed':
             return jsonify({"error": "Skanerlash hali yakunlanmagan"}), 400
         
         # Check if result exists
-        if scan_id not in scan_results:
+        result = store.get_result(scan_id)
+        if result is None:
             return jsonify({"error": "Skanerlash natijasi topilmadi"}), 404
         
         # Get export format (pdf or html, default is pdf)
@@ -59,29 +94,58 @@ def export_report(scan_id):
         if format_type not in ['pdf', 'html', 'json']:
             format_type = 'pdf'
         
-        # Create reports directory if it doesn't exist
-        reports_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../reports/exports'))
-        os.makedirs(reports_dir, exist_ok=True)
+        # Reports show the analysis; run it once and keep it so the next export doesn't repeat it
+        trace = Trace('report')
+        if format_type != 'json' and not result.get('summary'):
+            print("No summary found, running AI analysis...")
+            with trace.span('report.analysis'):
+                analysis = analyze_scan_with_gemini(result, trace)
+            result = store.update_result(
+                scan_id,
+                summary=analysis.get('summary', ''),
+                recommendations=analysis.get('recommendations', [])
+            )
+        
+        # The version is a hash of the result, so a matching ETag means the client's copy is current
+        version = result_version(result)
+        etag = f"{version}-{format_type}"
         
-        # Generate filename
+        # Set appropriate download filename
         timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
         safe_url = scan['url'].replace('://', '_').replace('/', '_').replace('.', '_')
-        filename = f"{safe_url}_{timestamp}.{format_type}"
-        output_path = os.path.join(reports_dir, filename)
         
-        # Get scan result
-        result = scan_results[scan_id]
+        if format_type == 'html':
+            if request.if_none_match.contains(etag):
+                return Response(status=304, headers={'ETag': f'"{etag}"'})
+            # Rendered straight into the response, so large reports start downloading at once
+            response = Response(stream_with_context(stream_report_html(result)), mimetype='text/html')
+            response.set_etag(etag)
+            response.cache_control.public = True
+            response.cache_control.max_age = 300
+            response.headers['Content-Disposition'] = (
+                f'attachment; filename="CyberShield_Report_{safe_url[:20]}_{timestamp}.html"'
+            )
+            return response
+        
+        # Only the first download of a result version is rendered; later ones come from the cache
+        output_path = export_cache.lookup(scan_id, version, format_type)
+        if output_path and request.if_none_match.contains(etag):
+            return Response(status=304, headers={'ETag': f'"{etag}"'})
         
-        if format_type == 'json':
+        if output_path is None and format_type == 'pdf':
+            # PDFs are rendered by the render pool; POST /export/<scan_id> and poll its status
+            return pdf_export_response(scan_id, result, version, trace)
+        cache_lookup('export', output_path is not None)
+        
+        if output_path is None:
             # Export as JSON
-            with open(output_path, 'w', encoding='utf-8') as f:
+            rendered_path = export_cache.temp_path(scan_id, format_type)
+            with open(rendered_path, 'w', encoding='utf-8') as f:
                 json.dump(result, f, indent=2, ensure_ascii=False)
-        else:
-            # Generate PDF (or HTML as fallback)
-            output_path = generate_pdf_report(result, output_path)
-            # Check if output is HTML (fallback if PDF generation failed)
-            if output_path.endswith('.html'):
-                format_type = 'html'
+            output_path = export_cache.add(scan_id, version, format_type, rendered_path)
+        
+        # The cached file may be a fallback (HTML or JSON) of the requested format
+        actual_format = os.path.splitext(output_path)[1].lstrip('.')
         
         # Set appropriate content type
         content_types = {
@@ -90,14 +154,14 @@ def export_report(scan_id):
             'json': 'application/json'
         }
         
-        # Set appropriate download filename
-        download_filename = f"CyberShield_Report_{safe_url[:20]}_{timestamp}.{format_type}"
+        download_filename = f"CyberShield_Report_{safe_url[:20]}_{timestamp}.{actual_format}"
         
         return send_file(
             output_path,
-            mimetype=content_types[format_type],
+            mimetype=content_types.get(actual_format, 'application/octet-stream'),
             as_attachment=True,
             download_name=download_filename,
+            etag=etag,
             max_age=300  # Cache for 5 minutes
         )
     except Exception as e:
@@ -105,30 +169,137 @@ def export_report(scan_id):
         traceback.print_exc(file=sys.stdout)
         return jsonify({"error": f"Hisobotni eksport qilishda xatolik: {str(e)}"}), 500
 
+@report_bp.route('/export/<scan_id>', methods=['POST'])
+def create_pdf_export(scan_id):
+    """Queue the PDF export of a scan; poll GET /export/<scan_id>/status, then download it."""
+    try:
+        # Check for invalid scan ID
+        if not scan_id or scan_id == 'undefined':
+            return jsonify({"error": "Noto'g'ri scan ID"}), 400
+            
+        # Check if scan exists
+        scan = store.get_scan(scan_id)
+        if scan is None:
+            return jsonify({"error": "Skanerlash topilmadi"}), 404
+        
+        if scan['status'] != 'completed':
+            return jsonify({"error": "Skanerlash hali yakunlanmagan"}), 400
+        
+        result = store.get_result(scan_id)
+        if result is None:
+            return jsonify({"error": "Skanerlash natijasi topilmadi"}), 404
+        
+        # The render workers only draw the report, so the analysis has to be there first
+        trace = Trace('report')
+        if not result.get('summary'):
+            print("No summary found, running AI analysis...")
+            with trace.span('report.analysis'):
+                analysis = analyze_scan_with_gemini(result, trace)
+            result = store.update_result(
+                scan_id,
+                summary=analysis.get('summary', ''),
+                recommendations=analysis.get('recommendations', [])
+            )
+        
+        return pdf_export_response(scan_id, result, result_version(result), trace)
+    except Exception as e:
+        print(f"Error creating PDF export for scan {scan_id}: {str(e)}")
+        traceback.print_exc(file=sys.stdout)
+        return jsonify({"error": f"Hisobotni eksport qilishda xatolik: {str(e)}"}), 500
+
+@report_bp.route('/export/<scan_id>/status', methods=['GET'])
+def get_pdf_export_status(scan_id):
+    """Status of the PDF export of a scan's current result; ?wait=<seconds> waits for it to finish."""
+    try:
+        result = store.get_result(scan_id)
+        if result is None:
+            return jsonify({"error": "Skanerlash natijasi topilmadi"}), 404
+        
+        try:
+            wait = min(max(float(request.args.get('wait', 0)), 0), EXPORT_MAX_WAIT)
+        except ValueError:
+            return jsonify({"error": "wait parametri noto'g'ri"}), 400
+        
+        version = result_version(result)
+        key = pdf_export_key(scan_id, version)
+        status = None
+        if export_cache.lookup(scan_id, version, 'pdf') is None:
+            status = pdf_pool.wait(key, wait) if wait else pdf_pool.status(key)
+        
+        if status is None or status['status'] == 'done':
+            # A finished job's file can already have been evicted again
+            status = {'status': 'done'} if export_cache.lookup(scan_id, version, 'pdf') else {'status': 'not_started'}
+        
+        response = {"scan_id": scan_id, "status": status['status']}
+        if status['status'] == 'done':
+            response["download_url"] = f"/api/report/export/{scan_id}?format=pdf"
+        elif status['status'] == 'failed':
+            response["error"] = status.get('error')
+        return jsonify(response), 200
+    except Exception as e:
+        print(f"Error getting PDF export status for scan {scan_id}: {str(e)}")
+        traceback.print_exc(file=sys.stdout)
+        return jsonify({"error": f"Eksport holatini olishda xatolik: {str(e)}"}), 500
+
+@report_bp.route('/bulk', methods=['GET'])
+@jwt_required()
+def bulk_export():
+    """
+    Export all of the user's completed scans in one download.
+
+    Query parameters: format (zip or ndjson, default zip), report (html or json
+    per scan in a zip, default html), url (exact scan target), from and to (ISO
+    dates, inclusive). The response is generated while it is sent, so it starts
+    at once and memory use does not grow with the number of scans.
+    """
+    user_id = get_jwt_identity()
+    
+    format_type = request.args.get('format', 'zip').lower()
+    report_type = request.args.get('report', 'html').lower()
+    if format_type not in ('zip', 'ndjson') or report_type not in ('html', 'json'):
+        return jsonify({"error": "format zip yoki ndjson, report esa html yoki json bo'lishi kerak"}), 400
+    try:
+        since, until = parse_date_range(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Noto'g'ri sana oralig'i: {str(e)}"}), 400
+    
+    results = iter_bulk_results(user_id, request.args.get('url') or None, since, until)
+    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+    
+    if format_type == 'ndjson':
+        body = (json.dumps(result, ensure_ascii=False) + '\n' for result in results)
+        mimetype = 'application/x-ndjson'
+    else:
+        body = stream_zip(bulk_zip_entries(results, report_type))
+        mimetype = 'application/zip'
+    
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="CyberShield_Reports_{timestamp}.{format_type}"'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
 @report_bp.route('/generate/<scan_id>', methods=['POST'])
 def generate_report(scan_id):
-    """Generate an AI analysis report for a scan."""
+    """Queue the AI analysis of a scan; poll GET /generate/<scan_id> for the result."""
     try:
         # Check for invalid scan ID
         if not scan_id or scan_id == 'undefined':
             return jsonify({"error": "Noto'g'ri scan ID"}), 400
             
         # Check if scan exists
-        if scan_id not in scans:
+        scan = store.get_scan(scan_id)
+        if scan is None:
             return jsonify({"error": "Skanerlash topilmadi"}), 404
         
-        scan = scans[scan_id]
-        
         # Check if scan is completed
         if scan['status'] != 'completed':
             return jsonify({"error": "Skanerlash hali yakunlanmagan"}), 400
         
         # Check if result exists
-        if scan_id not in scan_results:
+        result = store.get_result(scan_id)
+        if result is None:
             return jsonify({"error": "Skanerlash natijasi topilmadi"}), 404
         
-        result = scan_results[scan_id]
-        
         # If analysis already exists, return existing data
         if result.get('is_analyzed'):
             return jsonify({
@@ -139,35 +310,154 @@ def generate_report(scan_id):
                 }
             }), 200
         
-        # Get analysis from OpenAI
-        analysis = analyze_scan_with_chatgpt(result)
-        
-        # Update result with analysis
-        result['summary'] = analysis.get('summary', '')
-        result['recommendations'] = analysis.get('recommendations', [])
-        result['is_analyzed'] = True
+        # An analysis already waiting or running for this scan is not queued twice
+        status = result.get('analysis_status')
+        if status not in ANALYSIS_ACTIVE_STATUSES:
+            status = 'queued'
+            store.update_result(scan_id, analysis_status=status)
+            analysis_queue.enqueue({'scan_id': scan_id})
         
         return jsonify({
-            "message": "Hisobot muvaffaqiyatli yaratildi",
-            "report": {
-                "summary": result['summary'],
-                "recommendations": result['recommendations']
-            }
-        }), 200
+            "message": "Hisobot tayyorlanmoqda",
+            "status": status
+        }), 202
     except Exception as e:
         print(f"Error generating report for scan {scan_id}: {str(e)}")
         traceback.print_exc(file=sys.stdout)
         return jsonify({"error": f"Hisobot yaratishda xatolik: {str(e)}"}), 500
 
+@report_bp.route('/generate/<scan_id>', methods=['GET'])
+def report_generation_status(scan_id):
+    """Get the state of a scan's AI analysis and the report once it is ready."""
+    result = store.get_result(scan_id)
+    if result is None:
+        return jsonify({"error": "Skanerlash natijasi topilmadi"}), 404
+    
+    if result.get('is_analyzed'):
+        return jsonify({
+            "status": "done",
+            "report": {
+                "summary": result.get('summary', ''),
+                "recommendations": result.get('recommendations', [])
+            }
+        }), 200
+    
+    return jsonify({
+        "status": result.get('analysis_status') or 'pending',
+        "error": result.get('analysis_error')
+    }), 200
+
+@report_bp.route('/stream/<scan_id>', methods=['GET'])
+def stream_report(scan_id):
+    """
+    Stream a scan's AI analysis as Server-Sent Events while Gemini writes it.
+    
+    Events: "summary" ({"text"} with the next piece of the summary),
+    "recommendation" ({"text"} with one finished recommendation) and finally
+    "done" with the full report, which is also saved on the result. If the
+    analysis is already queued or running elsewhere, the stream waits for it
+    and sends only "done", or "failed" ({"error"}) if it does not finish.
+    """
+    if store.get_result(scan_id) is None:
+        return jsonify({"error": "Skanerlash natijasi topilmadi"}), 404
+    
+    def events():
+        deadline = time.monotonic() + ANALYSIS_FOLLOW_MAX_DURATION
+        while True:
+            result = store.get_result(scan_id)
+            if result.get('is_analyzed'):
+                yield sse_event('done', {
+                    "summary": result.get('summary', ''),
+                    "recommendations": result.get('recommendations', [])
+                })
+                return
+            
+            # Only one stream or worker writes an analysis; the others follow it
+            claimed = store.update_result(
+                scan_id,
+                unless={'analysis_status': ANALYSIS_ACTIVE_STATUSES, 'is_analyzed': (True,)},
+                analysis_status='running'
+            )
+            if claimed is not None:
+                yield from stream_analysis(scan_id, claimed)
+                return
+            
+            if not (yield from follow_analysis(scan_id, deadline)):
+                return
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def stream_analysis(scan_id, result):
+    """Run the analysis of a result this stream has claimed and yield its events."""
+    finished = False
+    try:
+        publish_stage(scan_id, 'ai', 'started')
+        previous = store.get_result(result['previous_scan_id']) if result.get('previous_scan_id') else None
+        plan = prepare_scan_analysis(result, previous)
+        for event, data in stream_analysis_plan(plan):
+            if event == 'done':
+                report = {
+                    "summary": data.get('summary', ''),
+                    "recommendations": data.get('recommendations', [])
+                }
+                store.update_result(scan_id, is_analyzed=True, analysis_status='done', **report)
+                publish_stage(scan_id, 'ai', 'done')
+                scan_events.publish(scan_id, 'done', {'analysis_status': 'done'})
+                finished = True
+                yield sse_event('done', report)
+            else:
+                yield sse_event(event, {"text": data})
+    finally:
+        if not finished:
+            # The client went away mid-stream; let the next request start the analysis again
+            store.update_result(scan_id, analysis_status='interrupted')
+            publish_stage(scan_id, 'ai', 'interrupted')
+
+def follow_analysis(scan_id, deadline):
+    """
+    Wait for an analysis that a queue worker or another stream is running.
+    
+    Yields keepalive comments while waiting, and a "failed" event if the
+    analysis does not finish before deadline.
+    
+    Returns:
+        True once the analysis is no longer queued or running, so the caller
+        reads the result again; False if the stream should end
+    """
+    events = scan_events.subscribe(scan_id)
+    try:
+        while True:
+            result = store.get_result(scan_id) or {}
+            if result.get('is_analyzed') or result.get('analysis_status') not in ANALYSIS_ACTIVE_STATUSES:
+                if result.get('analysis_status') == 'failed':
+                    yield sse_event('failed', {"error": result.get('analysis_error')})
+                    return False
+                return True
+            
+            if time.monotonic() >= deadline:
+                yield sse_event('failed', {"error": "Tahlil belgilangan vaqtda tugamadi"})
+                return False
+            
+            # Any event of the scan (or the poll timeout) is a reason to look again
+            try:
+                events.get(timeout=ANALYSIS_FOLLOW_POLL)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+    finally:
+        scan_events.unsubscribe(scan_id, events)
+
 @report_bp.route('/summary/<report_id>', methods=['GET'])
 def get_report_summary(report_id):
     """Get a summary of a specific report."""
     # Check if report exists
-    if report_id not in scan_results:
+    result = store.get_result(report_id)
+    if result is None:
         return jsonify({"error": "Hisobot topilmadi"}), 404
     
-    result = scan_results[report_id]
-    
     # Create a summary
     summary = {
         "url": result["url"],
@@ -189,35 +479,132 @@ def get_latest_reports():
     """Get the latest reports for the user."""
     user_id = get_jwt_identity()
     
+    try:
+        limit, cursor, view = parse_page_args(request.args)
+        before = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return jsonify({"error": f"Noto'g'ri sahifalash parametri: {str(e)}"}), 400
+    summary_only = view == 'summary'
+    
     # If not authenticated, return limited results
     if not user_id:
         # Get most recent 3 scan results
-        latest_results = sorted(
-            [result for result in scan_results.values()],
-            key=lambda x: x["created_at"],
-            reverse=True
-        )[:3]
+        latest_results = store.latest_results(3, summary=summary_only)
         
         return jsonify({
             "message": "Barcha hisobotlarni ko'rish uchun tizimga kiring",
-            "reports": latest_results
+            "reports": [with_totals(result) for result in latest_results] if summary_only else latest_results
         }), 200
     
-    # Get user's scans
-    user_scan_ids = [
-        scan["id"] for scan in scans.values()
-        if scan["user_id"] == user_id and scan["status"] == "completed"
-    ]
+    # Get one page of the user's completed scans
+    page = store.list_scans(user_id=user_id, status="completed", limit=limit + 1, before=before)
+    has_more = len(page) > limit
+    page = page[:limit]
     
-    # Get user's reports
-    user_reports = [
-        result for scan_id, result in scan_results.items()
-        if scan_id in user_scan_ids
-    ]
-    
-    # Sort by created_at
-    user_reports = sorted(user_reports, key=lambda x: x["created_at"], reverse=True)
+    # Get the reports for that page, in the same order as the scans
+    results = {
+        result['scan_id']: result
+        for result in store.get_results([scan["id"] for scan in page], summary=summary_only)
+    }
+    user_reports = [results[scan["id"]] for scan in page if scan["id"] in results]
+    if summary_only:
+        user_reports = [with_totals(result) for result in user_reports]
     
     return jsonify({
-        "reports": user_reports
-    }), 200 
\ No newline at end of file
+        "reports": user_reports,
+        "next_cursor": encode_cursor(page[-1]) if has_more else None
+    }), 200
+
+def with_totals(summary):
+    """Add the total vulnerability count to a summary-only report."""
+    summary['total_vulnerabilities'] = sum((summary.get('severity_counts') or {}).values())
+    return summary
+
+def pdf_export_key(scan_id, version):
+    return f"{scan_id}-{version}-pdf"
+
+def pdf_export_response(scan_id, result, version, trace=None):
+    """
+    Queue (or join) the PDF render of a result version and describe it as a response.
+    
+    A render queued here stores the spans of trace, plus its own report.render
+    span (queue wait included), as the scan's report_spans once it is done.
+    """
+    cached = export_cache.lookup(scan_id, version, 'pdf') is not None
+    cache_lookup('export', cached)
+    if cached:
+        return jsonify({
+            "scan_id": scan_id,
+            "status": "done",
+            "download_url": f"/api/report/export/{scan_id}?format=pdf"
+        }), 200
+    
+    trace = trace or Trace('report')
+    submitted_at = time.time()
+    
+    def on_done(path):
+        export_cache.add(scan_id, version, 'pdf', path)
+        trace.add('report.render', submitted_at, time.time() - submitted_at)
+        store.update_scan(scan_id, report_spans=trace.finish())
+    
+    try:
+        status = pdf_pool.submit(
+            pdf_export_key(scan_id, version),
+            render_pdf,
+            result,
+            export_cache.temp_path(f"{scan_id}-{version}", 'pdf'),
+            on_done=on_done
+        )
+    except RenderPoolFull as e:
+        retry_after = pdf_pool.retry_after()
+        print(f"Rejecting PDF export for scan {scan_id}: {str(e)}")
+        response = jsonify({
+            "error": "Hisobot yaratish navbati to'lgan, birozdan so'ng qayta urinib ko'ring",
+            "retry_after": retry_after
+        })
+        response.headers['Retry-After'] = str(retry_after)
+        return response, 503
+    
+    response = jsonify({
+        "scan_id": scan_id,
+        "status": status['status'] if status else 'queued',
+        "message": "Hisobot tayyorlanmoqda"
+    })
+    response.headers['Retry-After'] = '2'
+    return response, 202
+
+def iter_bulk_results(user_id, url=None, since=None, until=None):
+    """
+    Yield the full results of a user's completed scans, newest first.
+
+    Scans are read page by page with the (created_at, id) keyset, so only
+    BULK_EXPORT_PAGE_SIZE results are in memory at a time.
+    """
+    # until is exclusive; an empty id makes the keyset exclude created_at == until too
+    before = (until, '') if until else None
+    while True:
+        page = store.list_scans(
+            user_id=user_id, url=url, status='completed', limit=BULK_EXPORT_PAGE_SIZE, before=before
+        )
+        scans = [scan for scan in page if not since or scan['created_at'] >= since]
+        results = {result['scan_id']: result for result in store.get_results([scan['id'] for scan in scans])}
+        for scan in scans:
+            if scan['id'] in results:
+                yield results.pop(scan['id'])
+        
+        if len(page) < BULK_EXPORT_PAGE_SIZE or len(scans) < len(page):
+            return
+        before = (page[-1]['created_at'], page[-1]['id'])
+
+def bulk_zip_entries(results, report_type):
+    """Turn results into stream_zip() entries: one HTML report or JSON file per scan."""
+    for result in results:
+        created_at = datetime.fromisoformat(result.get('created_at', datetime.now().isoformat()))
+        safe_url = (result.get('url') or 'scan').replace('://', '_').replace('/', '_').replace('.', '_')
+        name = f"{created_at.strftime('%Y%m%d%H%M%S')}_{safe_url[:40]}_{result['scan_id']}.{report_type}"
+        if report_type == 'json':
+            chunks = [json.dumps(result, indent=2, ensure_ascii=False)]
+        else:
+            chunks = stream_report_html(result)
+        yield name, created_at.timetuple()[:6], chunks
+
@@ -1,5 +1,5 @@
 # scan routes
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 import uuid
 import re
@@ -7,22 +7,68 @@ import random
 from datetime import datetime
 import time
 import threading
-import redis
 import json
 import os
+import queue
 from utils.openai_helper import analyze_scan_with_chatgpt
-import subprocess
+from utils.job_queue import JobQueue, create_redis_client
+from utils.zap_client import zap_client, ZapError
+from utils.docker_client import scanner_exec, ScannerExecError
+from utils.artifacts import wait_for_artifact
+from core.scan import parse_nmap_report, collapse_zap_alerts, diff_findings
+from utils.db import store, encode_cursor, decode_cursor
+from utils.validators import parse_page_args, normalize_target
+from utils.single_flight import InFlightRegistry
+from utils.events import ScanEvents, sse_event, FINAL_EVENTS
+from utils.cancellation import CancelRegistry, ScanCancelled
+from utils.metrics import Trace, ERRORS, SCANS_FINISHED, QUEUE_DEPTH, SCANS_RUNNING, cache_lookup
+from concurrent.futures import ThreadPoolExecutor, wait
 
 # Redis connection for job queue
-redis_client = redis.Redis(
-    host=os.getenv('REDIS_HOST', 'redis'),
-    port=int(os.getenv('REDIS_PORT', 6379)),
-    db=0
+redis_client = create_redis_client()
+
+# Shared deadline (seconds) for all stages of one scan
+SCAN_DEADLINE = int(os.getenv('SCAN_DEADLINE', 330))
+
+# Maximum time (seconds) the ZAP spider may crawl a target
+ZAP_SPIDER_DURATION = int(os.getenv('ZAP_SPIDER_DURATION', 60))
+
+# ZAP alerts are read in pages; each finding keeps at most this many example instances
+ZAP_ALERT_PAGE_SIZE = int(os.getenv('ZAP_ALERT_PAGE_SIZE', 500))
+ZAP_MAX_INSTANCES = int(os.getenv('ZAP_MAX_INSTANCES', 20))
+
+# A completed scan of the same target younger than this (seconds) is reused; 0 disables reuse
+SCAN_RESULT_TTL = int(os.getenv('SCAN_RESULT_TTL', 3600))
+
+# Scans that have not reached a final status yet
+ACTIVE_STATUSES = ('queued', 'in_progress')
+
+# Reports written by the scanner containers (mounted there as /reports) are read from here
+SCANNER_REPORTS_DIR = os.getenv(
+    'SCANNER_REPORTS_DIR',
+    os.path.abspath(os.path.join(os.path.dirname(__file__), '../../reports'))
 )
 
-# In a real application, these would be database collections
-scans = {}
-scan_results = {}
+# Container that runs Nmap
+NMAP_CONTAINER = os.getenv('NMAP_SERVICE', 'nmap_scanner')
+
+# Seconds to wait for a report file to show up after its scanner exited successfully
+ARTIFACT_GRACE = float(os.getenv('ARTIFACT_GRACE', 2))
+
+# Scan event streams: keepalive interval and longest time one stream stays open (seconds)
+SCAN_EVENTS_KEEPALIVE = 15
+SCAN_EVENTS_MAX_DURATION = int(os.getenv('SCAN_EVENTS_MAX_DURATION', 1800))
+
+# Stages reported on scan event streams, in order
+SCAN_STAGES = ('queued', 'server_info', 'zap', 'nmap', 'scoring', 'ai')
+
+# Progress of running scans, pushed to /events/<scan_id> streams in every backend process
+scan_events = ScanEvents(redis_client)
+
+# Cancel requests, delivered to whichever backend process runs the scan
+cancellations = CancelRegistry(redis_client)
+SCANS_RUNNING.set_function(cancellations.running)
+
 
 scan_bp = Blueprint('scan', __name__)
 
@@ -62,13 +108,211 @@ def generate_mock_vulnerabilities():
         for vuln in selected_vulns
     ]
 
+def run_zap_stage(url, scan_id, deadline, cancel_token=None, trace=None):
+    """Scan the URL through the shared ZAP daemon and return its findings."""
+    zap_vulnerabilities = []
+    trace = trace or Trace('zap')
+    try:
+        print(f"Starting ZAP scan for {url}")
+        
+        # Extract the hostname from URL
+        if '://' in url:
+            target = url
+        else:
+            target = 'http://' + url
+        
+        # Only this scan's alerts for the target are in the session inside the block
+        with zap_client.isolated(target):
+            zap_client.scan(
+                target,
+                scan_id,
+                deadline,
+                spider_duration=ZAP_SPIDER_DURATION,
+                cancel_token=cancel_token,
+                trace=trace
+            )
+            if cancel_token is not None and cancel_token.is_cancelled():
+                return []
+            
+            # Page through the alerts and fold every instance into one finding per rule
+            with trace.span('zap.alerts') as span:
+                zap_vulnerabilities = collapse_zap_alerts(
+                    zap_client.iter_alerts(target, page_size=ZAP_ALERT_PAGE_SIZE),
+                    max_instances=ZAP_MAX_INSTANCES
+                )
+                span['findings'] = len(zap_vulnerabilities)
+        print(f"ZAP scan completed for {url} with {len(zap_vulnerabilities)} distinct issue(s)")
+    except ZapError as e:
+        print(f"ZAP scan error for {url}: {str(e)}")
+        ERRORS.labels('zap').inc()
+        # Continue with mock data if ZAP scan fails
+    except Exception as e:
+        print(f"Error in ZAP scan process: {str(e)}")
+        ERRORS.labels('zap').inc()
+        # Continue with mock data if ZAP scan fails
+    
+    return zap_vulnerabilities
+
+def run_nmap_stage(url, safe_url, nmap_dir, deadline, cancel_token=None, trace=None):
+    """Run the Nmap service/vulners scan and return its findings."""
+    nmap_vulnerabilities = []
+    trace = trace or Trace('nmap')
+    try:
+        print(f"Starting Nmap scan for {url}")
+        # Extract hostname without protocol
+        if '://' in url:
+            target = url.split('://')[1]
+        else:
+            target = url
+            
+        # Remove path if exists
+        if '/' in target:
+            target = target.split('/')[0]
+            
+        print(f"Nmap target: {target}")
+        nmap_report_path = os.path.join(nmap_dir, f'{safe_url}-nmap-report.xml')
+        
+        nmap_succeeded = False
+        try:
+            # Run Nmap scan in the scanner container through the Engine API
+            nmap_cmd = [
+                'nmap', '-sV', '--script=vulners', target,
+                '-oX', f'/reports/{safe_url}-nmap-report.xml'
+            ]
+            
+            print(f"Executing Nmap command in {NMAP_CONTAINER}: {' '.join(nmap_cmd)}")
+            with trace.span('nmap.exec') as span:
+                nmap_process = scanner_exec.run(
+                    NMAP_CONTAINER,
+                    nmap_cmd,
+                    timeout=max(1, deadline - time.monotonic()),
+                    on_output=lambda stream, text: print(f"[nmap {stream}] {text.rstrip()}"),
+                    cancel_token=cancel_token
+                )
+                span['exit_code'] = nmap_process['exit_code']
+            
+            if nmap_process['cancelled']:
+                print(f"Nmap scan for {url} cancelled")
+                return nmap_vulnerabilities
+            elif nmap_process['timed_out']:
+                print(f"Nmap scan timeout for {url}, continuing with available data")
+            elif nmap_process['exit_code'] != 0:
+                print(f"Nmap command exited with code {nmap_process['exit_code']}")
+            else:
+                nmap_succeeded = True
+                print(f"Nmap scan completed successfully for {target}")
+            
+        except ScannerExecError as e:
+            print(f"Nmap scan command error: {str(e)}")
+            ERRORS.labels('nmap').inc()
+        
+        if nmap_succeeded:
+            # Fix permissions so the backend can read the report
+            try:
+                scanner_exec.run(
+                    NMAP_CONTAINER,
+                    ['chmod', '777', f'/reports/{safe_url}-nmap-report.xml'],
+                    timeout=10
+                )
+            except ScannerExecError as e:
+                print(f"Error setting permissions on Nmap report: {str(e)}")
+        
+        # Nmap has exited, so the report is either written already or not coming; only a
+        # successful run gets a short grace period for the bind mount to show the file
+        grace = min(ARTIFACT_GRACE, max(0, deadline - time.monotonic())) if nmap_succeeded else 0
+        with trace.span('nmap.report_wait'):
+            report_found = wait_for_artifact(nmap_report_path, grace)
+        if report_found:
+            print(f"Nmap report file found at {nmap_report_path}")
+            with trace.span('nmap.parse'):
+                nmap_vulnerabilities = parse_nmap_report(nmap_report_path)
+            print(f"Parsed {len(nmap_vulnerabilities)} finding(s) from Nmap report")
+        else:
+            print(f"Nmap report file not found at {nmap_report_path}")
+        
+    except Exception as e:
+        print(f"Error in Nmap scan process: {str(e)}")
+        ERRORS.labels('nmap').inc()
+    
+    return nmap_vulnerabilities
+
+def publish_stage(scan_id, stage, state, **data):
+    """Tell event stream listeners that a scan stage started or finished."""
+    scan_events.publish(scan_id, 'stage', dict(data, stage=stage, state=state))
+
+def tracked_stage(scan_id, stage, func, trace):
+    """Wrap a scan stage so it is timed into trace and its start and number of findings are published."""
+    def run():
+        publish_stage(scan_id, stage, 'started')
+        with trace.span(stage) as span:
+            result = func()
+            if isinstance(result, list):
+                span['findings'] = len(result)
+        if isinstance(result, list):
+            publish_stage(scan_id, stage, 'done', findings=len(result))
+        else:
+            publish_stage(scan_id, stage, 'done')
+        return result
+    return run
+
+def run_scan_stages(stages, deadline, cancel_token=None):
+    """
+    Run independent scan stages in parallel under a shared deadline.
+    
+    Args:
+        stages: Dict of stage name -> (callable, default result)
+        deadline: time.monotonic() value by which all stages must finish
+        cancel_token: Optional CancelToken; a cancel stops waiting for the stages
+        
+    Returns:
+        Dict of stage name -> result (the default for stages that failed or ran out of time)
+    """
+    executor = ThreadPoolExecutor(max_workers=len(stages), thread_name_prefix='scan-stage')
+    futures = {name: executor.submit(func) for name, (func, _) in stages.items()}
+    
+    # Wait in short slices so a cancel is noticed even while a stage is blocked
+    not_done = set(futures.values())
+    while not_done and time.monotonic() < deadline:
+        if cancel_token is not None and cancel_token.is_cancelled():
+            break
+        _, not_done = wait(not_done, timeout=min(0.5, max(0, deadline - time.monotonic())))
+    # Stages still running are bounded by their own timeouts; don't block on them here
+    executor.shutdown(wait=False)
+    
+    results = {}
+    for name, future in futures.items():
+        default = stages[name][1]
+        if future in not_done:
+            print(f"Scan stage '{name}' missed the deadline, using default result")
+            ERRORS.labels('scan_deadline').inc()
+            results[name] = default
+            continue
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            print(f"Scan stage '{name}' failed: {str(e)}")
+            ERRORS.labels('scan_stage').inc()
+            results[name] = default
+    
+    return results
+
 def process_scan(scan_id, url):
     """Background process for scanning a URL."""
+    # Cancelling the scan stops its scanners and waits instead of letting them run out
+    token = cancellations.register(scan_id)
+    trace = Trace('scan')
+    outcome = 'failed'
     try:
-        # Update scan status
-        scan = scans[scan_id]
-        scan['status'] = 'in_progress'
-        scan['updated_at'] = datetime.now().isoformat()
+        # Update scan status; a scan cancelled while it waited in the queue is not started
+        started = store.update_scan(
+            scan_id,
+            unless={'status': ('cancelled',)},
+            status='in_progress',
+            updated_at=datetime.now().isoformat()
+        )
+        if started is None:
+            raise ScanCancelled(f"Scan {scan_id} was cancelled")
+        publish_stage(scan_id, 'queued', 'done')
         
         print(f"Starting scan process for {url} with scan_id: {scan_id}")
         
@@ -76,179 +320,40 @@ def process_scan(scan_id, url):
         os.environ['TARGET_URL'] = url
         
         # Create directories for reports if they don't exist
-        reports_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../reports'))
-        zap_dir = os.path.join(reports_dir, 'zap')
+        reports_dir = SCANNER_REPORTS_DIR
         nmap_dir = os.path.join(reports_dir, 'nmap')
         
-        for directory in [reports_dir, zap_dir, nmap_dir]:
+        for directory in [reports_dir, nmap_dir]:
             os.makedirs(directory, exist_ok=True)
             print(f"Created directory: {directory}")
         
-        # Get server info
-        server_info = get_server_info(url)
-        
         # Prepare safe filename (no special characters)
         safe_url = url.replace(":", "_").replace("/", "_").replace(".", "_")
         
-        # Run ZAP scan
-        zap_vulnerabilities = []
-        try:
-            print(f"Starting ZAP scan for {url}")
-            zap_report_path = os.path.join(zap_dir, f'{safe_url}-zap-report.json')
-            
-            # Extract the hostname from URL
-            if '://' in url:
-                target = url
-            else:
-                target = 'http://' + url
-                
-            try:
-                # Run ZAP scan using Docker exec command
-                zap_cmd = [
-                    'docker', 'exec', 'zap_scanner',
-                    'python3', '/zap/zap-baseline.py', 
-                    '-t', target, 
-                    '-J', f'/zap/wrk/{safe_url}-zap-report.json', 
-                    '-r', f'/zap/wrk/{safe_url}-zap-scanning-report.html'
-                ]
-                
-                print(f"Executing ZAP command: {' '.join(zap_cmd)}")
-                zap_process = subprocess.run(
-                    zap_cmd, 
-                    check=False, 
-                    capture_output=True,
-                    timeout=300  # 5 minute timeout
-                )
-                
-                if zap_process.returncode != 0:
-                    print(f"ZAP command exited with code {zap_process.returncode}")
-                    print(f"ZAP stderr: {zap_process.stderr.decode('utf-8', errors='ignore')}")
-                else:
-                    print(f"ZAP scan completed successfully for {url}")
-                    print(f"ZAP stdout: {zap_process.stdout.decode('utf-8', errors='ignore')[:200]}...")
-                
-            except subprocess.TimeoutExpired:
-                print(f"ZAP scan timeout for {url}, continuing with available data")
-            except Exception as e:
-                print(f"ZAP scan command error: {str(e)}")
-                # Continue with mock data if ZAP scan fails
-            
-            print(f"Checking for ZAP report at {zap_report_path}")
-            # Wait for ZAP report to be available (max 10 seconds)
-            for _ in range(10):
-                if os.path.exists(zap_report_path):
-                    print(f"ZAP report found at {zap_report_path}")
-                    break
-                print("Waiting for ZAP report...")
-                time.sleep(2)
-            
-            # Try to read the report
-            if os.path.exists(zap_report_path):
-                with open(zap_report_path, 'r') as f:
-                    try:
-                        zap_data = json.load(f)
-                        print(f"Successfully loaded ZAP report for {url}")
-                        
-                        # Extract data from ZAP report
-                        if isinstance(zap_data, dict) and 'site' in zap_data and zap_data['site']:
-                            for site in zap_data.get('site', []):
-                                for alert in site.get('alerts', []):
-                                    zap_vulnerabilities.append({
-                                        "id": str(uuid.uuid4()),
-                                        "name": alert.get('name', 'Unknown Vulnerability'),
-                                        "severity": map_zap_risk_to_severity(alert.get('riskdesc', 'Low')),
-                                        "description": alert.get('desc', 'No description available'),
-                                        "location": alert.get('url', 'Unknown'),
-                                        "detected_at": datetime.now().isoformat(),
-                                        "status": "open",
-                                        "remediation": alert.get('solution', 'No remediation available'),
-                                        "references": alert.get('reference', '').split('\n') if alert.get('reference') else []
-                                    })
-                        else:
-                            print(f"ZAP report has unexpected format: {zap_data}")
-                    except json.JSONDecodeError as e:
-                        print(f"Error decoding ZAP JSON report: {str(e)}")
-            else:
-                print(f"ZAP report file not found at {zap_report_path}, using mock data")
-                            
-        except Exception as e:
-            print(f"Error in ZAP scan process: {str(e)}")
-            # Continue with mock data if ZAP scan fails
+        # Server info, ZAP and Nmap hit different services, so run them side by side
+        deadline = time.monotonic() + SCAN_DEADLINE
+        stage_results = run_scan_stages({
+            'server_info': (
+                tracked_stage(scan_id, 'server_info', lambda: get_server_info(url), trace),
+                {'server': 'Unknown', 'technologies': 'Unknown'}
+            ),
+            'zap': (
+                tracked_stage(scan_id, 'zap', lambda: run_zap_stage(url, scan_id, deadline, token, trace), trace),
+                []
+            ),
+            'nmap': (
+                tracked_stage(
+                    scan_id, 'nmap',
+                    lambda: run_nmap_stage(url, safe_url, nmap_dir, deadline, token, trace),
+                    trace
+                ),
+                []
+            ),
+        }, deadline, token)
+        token.raise_if_cancelled()
         
-        # Run Nmap scan
-        nmap_vulnerabilities = []
-        try:
-            print(f"Starting Nmap scan for {url}")
-            # Extract hostname without protocol
-            if '://' in url:
-                target = url.split('://')[1]
-            else:
-                target = url
-                
-            # Remove path if exists
-            if '/' in target:
-                target = target.split('/')[0]
-                
-            print(f"Nmap target: {target}")
-            nmap_report_path = os.path.join(nmap_dir, f'{safe_url}-nmap-report.xml')
-            
-            try:
-                # Run Nmap scan using Docker exec command
-                nmap_cmd = [
-                    'docker', 'exec', 'nmap_scanner',
-                    'nmap', '-sV', '--script=vulners', target,
-                    '-oX', f'/reports/{safe_url}-nmap-report.xml'
-                ]
-                
-                print(f"Executing Nmap command: {' '.join(nmap_cmd)}")
-                nmap_process = subprocess.run(
-                    nmap_cmd, 
-                    check=False,
-                    capture_output=True,
-                    timeout=300  # 5 minute timeout
-                )
-                
-                if nmap_process.returncode != 0:
-                    print(f"Nmap command exited with code {nmap_process.returncode}")
-                    print(f"Nmap stderr: {nmap_process.stderr.decode('utf-8', errors='ignore')}")
-                else:
-                    print(f"Nmap scan completed successfully for {target}")
-                    print(f"Nmap stdout: {nmap_process.stdout.decode('utf-8', errors='ignore')[:200]}...")
-                
-            except subprocess.TimeoutExpired:
-                print(f"Nmap scan timeout for {url}, continuing with available data")
-            except Exception as e:
-                print(f"Nmap scan command error: {str(e)}")
-            
-            # Fix permissions and wait for report file
-            try:
-                chmod_cmd = [
-                    'docker', 'exec', 'nmap_scanner',
-                    'chmod', '777', f'/reports/{safe_url}-nmap-report.xml'
-                ]
-                subprocess.run(chmod_cmd, check=False, timeout=10)
-            except Exception as e:
-                print(f"Error setting permissions on Nmap report: {str(e)}")
-            
-            print(f"Checking for Nmap report at {nmap_report_path}")
-            # Wait for Nmap report to be available (max 10 seconds)
-            for i in range(5):
-                if os.path.exists(nmap_report_path):
-                    print(f"Nmap report found at {nmap_report_path}")
-                    break
-                print(f"Waiting for Nmap report... (attempt {i+1}/5)")
-                time.sleep(2)
-            
-            # Try to read and parse Nmap results if file exists
-            if os.path.exists(nmap_report_path):
-                print(f"Nmap report file found at {nmap_report_path}")
-                # Here we could parse the XML file to extract vulnerabilities
-                # For simplicity, we'll use ZAP results or mock data
-            else:
-                print(f"Nmap report file not found at {nmap_report_path}")
-            
-        except Exception as e:
-            print(f"Error in Nmap scan process: {str(e)}")
+        server_info = stage_results['server_info']
+        zap_vulnerabilities = stage_results['zap']
         
         # If no ZAP vulnerabilities were found, use mock data
         if not zap_vulnerabilities:
@@ -256,21 +361,28 @@ def process_scan(scan_id, url):
             zap_vulnerabilities = generate_mock_vulnerabilities()
         
         # Combine all vulnerabilities
-        vulnerabilities = zap_vulnerabilities
-        
-        # Count vulnerabilities by severity
-        severity_counts = {"high": 0, "medium": 0, "low": 0}
-        for vuln in vulnerabilities:
-            severity = vuln['severity'].lower()
-            if severity in severity_counts:
-                severity_counts[severity] += 1
-        
-        # Calculate security score (0-100)
-        # Higher weights for more severe vulnerabilities
-        total_score = 100 - (severity_counts['high'] * 15 + 
-                          severity_counts['medium'] * 8 + 
-                          severity_counts['low'] * 3)
-        security_score = max(0, min(100, total_score))
+        vulnerabilities = zap_vulnerabilities + stage_results['nmap']
+        
+        publish_stage(scan_id, 'scoring', 'started', findings=len(vulnerabilities))
+        
+        with trace.span('scoring', findings=len(vulnerabilities)):
+            # Compare with the previous scan of this target so unchanged findings keep their identity
+            previous = find_previous_result(url)
+            delta = diff_findings(vulnerabilities, previous['vulnerabilities'] if previous else [])
+        
+            # Count vulnerabilities by severity
+            severity_counts = {"high": 0, "medium": 0, "low": 0}
+            for vuln in vulnerabilities:
+                severity = vuln['severity'].lower()
+                if severity in severity_counts:
+                    severity_counts[severity] += 1
+        
+            # Calculate security score (0-100)
+            # Higher weights for more severe vulnerabilities
+            total_score = 100 - (severity_counts['high'] * 15 + 
+                              severity_counts['medium'] * 8 + 
+                              severity_counts['low'] * 3)
+            security_score = max(0, min(100, total_score))
         
         # Create scan result
         result = {
@@ -282,51 +394,252 @@ def process_scan(scan_id, url):
             'severity_counts': severity_counts,
             'created_at': datetime.now().isoformat(),
             'server_info': server_info,
-            'recommendations': []
+            'recommendations': [],
+            'previous_scan_id': previous['scan_id'] if previous else None,
+            'delta': delta
         }
         
+        # Nothing changed since an analyzed scan: its analysis still describes this one
+        reuse_analysis = bool(
+            previous and previous.get('is_analyzed')
+            and not delta['new'] and not delta['fixed']
+        )
+        if reuse_analysis:
+            result['summary'] = previous.get('summary', '')
+            result['recommendations'] = previous.get('recommendations', [])
+            result['is_analyzed'] = True
+            result['analysis_status'] = 'done'
+            result['analysis_reused_from'] = previous['scan_id']
+        else:
+            result['analysis_status'] = 'queued'
+        
+        token.raise_if_cancelled()
         print(f"Saving scan result for scan_id: {scan_id}")
-        # Store result
-        scan_results[scan_id] = result
+        with trace.span('save'):
+            # Mark scan as completed, unless a cancel got in since the check above
+            completed = store.update_scan(
+                scan_id,
+                unless={'status': ('cancelled',)},
+                status='completed',
+                has_result=True,
+                completed_at=datetime.now().isoformat(),
+                updated_at=datetime.now().isoformat(),
+                previous_scan_id=result['previous_scan_id']
+            )
+            if completed is None:
+                raise ScanCancelled(f"Scan {scan_id} was cancelled")
+            
+            # Store result
+            store.save_result(result)
+        outcome = 'completed'
         
-        # Mark scan as completed
-        scan['status'] = 'completed'
-        scan['completed_at'] = datetime.now().isoformat()
-        scan['updated_at'] = datetime.now().isoformat()
+        print(f"Findings for {url}: {len(delta['new'])} new, "
+              f"{len(delta['unchanged'])} unchanged, {len(delta['fixed'])} fixed")
         
-        # Analyze with Gemini in another thread to not block
-        threading.Thread(
-            target=analyze_with_chatgpt,
-            args=(scan_id,),
-            daemon=True
-        ).start()
+        publish_stage(
+            scan_id, 'scoring', 'done',
+            findings=len(vulnerabilities),
+            severity_counts=severity_counts,
+            security_score=security_score
+        )
+        scan_events.publish(scan_id, 'completed', completed_event_data(result))
+        
+        # Analyze with Gemini on the analysis workers to not block
+        if reuse_analysis:
+            publish_stage(scan_id, 'ai', 'done', reused_from=previous['scan_id'])
+            scan_events.publish(scan_id, 'done', {'analysis_status': 'done'})
+        else:
+            publish_stage(scan_id, 'ai', 'queued')
+            analysis_queue.enqueue({'scan_id': scan_id})
         
         print(f"Scan process completed successfully for {url}")
         
+    except ScanCancelled:
+        # cancel_scan already set the status and told the watchers
+        print(f"Scan {scan_id} for {url} cancelled, worker released")
+        outcome = 'cancelled'
     except Exception as e:
         print(f"Error processing scan {scan_id}: {str(e)}")
+        ERRORS.labels('scan').inc()
         import traceback
         traceback.print_exc()
-        scan = scans.get(scan_id)
-        if scan:
-            scan['status'] = 'failed'
-            scan['error'] = str(e)
-            scan['updated_at'] = datetime.now().isoformat()
-
-def map_zap_risk_to_severity(risk_desc):
-    """Map ZAP risk descriptions to our severity levels."""
-    risk_map = {
-        "High": "high",
-        "Medium": "medium",
-        "Low": "low",
-        "Informational": "info"
+        # A scan that was cancelled stays cancelled, whatever its scanners did after that
+        if store.update_scan(
+            scan_id,
+            unless={'status': ('cancelled',)},
+            status='failed',
+            error=str(e),
+            updated_at=datetime.now().isoformat()
+        ) is not None:
+            scan_events.publish(scan_id, 'failed', {'error': str(e)})
+    finally:
+        cancellations.unregister(scan_id)
+        SCANS_FINISHED.labels(outcome).inc()
+        # Stages that missed the deadline are still running and not in the stored spans
+        try:
+            store.update_scan(scan_id, spans=trace.finish('ok' if outcome == 'completed' else outcome))
+        except Exception as e:
+            print(f"Could not store timing spans of scan {scan_id}: {str(e)}")
+
+def completed_event_data(result):
+    """Data of the 'completed' event of a scan result."""
+    return {
+        'security_score': result.get('security_score', 0),
+        'severity_counts': result.get('severity_counts', {}),
+        'total_vulnerabilities': len(result.get('vulnerabilities', []))
     }
+
+def find_previous_result(url):
+    """Return the result of the latest completed scan of url, or None."""
+    for scan in store.list_scans(url=url, status='completed', limit=5):
+        result = store.get_result(scan['id'])
+        if result:
+            return result
+    return None
+
+def copy_result_to_scan(source_result, scan_id, **scan_fields):
+    """Give scan_id its own copy of another scan's result and mark it completed."""
+    # created_at is kept from the source so the copy ages like the original scan
+    result = dict(source_result, id=str(uuid.uuid4()), scan_id=scan_id)
+    store.save_result(result)
+    store.update_scan(
+        scan_id,
+        status='completed',
+        has_result=True,
+        completed_at=datetime.now().isoformat(),
+        updated_at=datetime.now().isoformat(),
+        **scan_fields
+    )
+
+def find_recent_result(url):
+    """Return the latest completed result for url if it is younger than SCAN_RESULT_TTL."""
+    if SCAN_RESULT_TTL <= 0:
+        return None
+    
+    latest = store.list_scans(url=url, status='completed', limit=1)
+    if not latest:
+        return None
     
-    for risk, severity in risk_map.items():
-        if risk in risk_desc:
-            return severity
+    result = store.get_result(latest[0]['id'])
+    if not result:
+        return None
     
-    return "low"  # Default to low severity
+    age = (datetime.now() - datetime.fromisoformat(result['created_at'])).total_seconds()
+    return result if age < SCAN_RESULT_TTL else None
+
+def settle_followers(scan_id):
+    """
+    Hand the outcome of a finished scan to the duplicate requests attached to it.
+    
+    Followers of a completed scan get its result and followers of a failed scan
+    fail with it. A cancel only applies to the scan it was made for, so the
+    followers of a cancelled scan get a scan of their own (see promote_followers).
+    """
+    scan = store.get_scan(scan_id)
+    result = store.get_result(scan_id) if scan and scan['status'] == 'completed' else None
+    
+    followers = []
+    for follower_id in inflight.pop_followers(scan_id):
+        follower = store.get_scan(follower_id)
+        if follower and follower['status'] in ACTIVE_STATUSES:
+            followers.append(follower_id)
+    if not followers:
+        return
+    
+    if scan and scan['status'] == 'cancelled':
+        promote_followers(scan['url'], followers)
+        return
+    
+    for follower_id in followers:
+        if result:
+            copy_result_to_scan(result, follower_id)
+            scan_events.publish(follower_id, 'completed', completed_event_data(result))
+            scan_events.publish(follower_id, 'done', {'analysis_status': result.get('analysis_status')})
+        else:
+            error = (scan or {}).get('error', "Asosiy skanerlash yakunlanmadi")
+            if store.update_scan(
+                follower_id,
+                unless={'status': ('cancelled',)},
+                status='failed',
+                error=error,
+                updated_at=datetime.now().isoformat()
+            ) is not None:
+                scan_events.publish(follower_id, 'failed', {'error': error})
+
+def promote_followers(url, followers):
+    """
+    Run the scan the followers of a cancelled scan of url were waiting for.
+    
+    The first follower becomes the owner of the target and is queued, the
+    others attach to it. If another scan of the target has started in the
+    meantime, all of them attach to that one instead.
+    """
+    new_owner = followers[0]
+    owner_id = inflight.claim(url, new_owner)
+    if owner_id is not None and owner_id != new_owner:
+        for follower_id in followers:
+            store.update_scan(follower_id, unless={'status': ('cancelled',)}, attached_to=owner_id)
+            inflight.attach(owner_id, follower_id)
+        
+        # The other scan may have finished while we were attaching
+        owner = store.get_scan(owner_id)
+        if not owner or owner['status'] not in ACTIVE_STATUSES:
+            settle_followers(owner_id)
+        return
+    
+    for follower_id in followers[1:]:
+        store.update_scan(follower_id, unless={'status': ('cancelled',)}, attached_to=new_owner)
+        inflight.attach(new_owner, follower_id)
+    
+    scan = store.update_scan(
+        new_owner,
+        unless={'status': ('cancelled',)},
+        status='queued',
+        attached_to=None,
+        updated_at=datetime.now().isoformat()
+    )
+    # A scan cancelled just now is skipped by the worker, which then settles the rest
+    scan = scan or store.get_scan(new_owner)
+    publish_stage(new_owner, 'queued', 'started')
+    scan_queue.enqueue({
+        'scan_id': new_owner,
+        'url': url,
+        'scan': scan
+    })
+    print(f"Scan {new_owner} took over {url} from a cancelled scan with {len(followers) - 1} follower(s)")
+
+def run_scan_job(job):
+    """Queue handler: restore the scan record if needed and run process_scan."""
+    scan_id = job['scan_id']
+    
+    # The job carries the scan record so it can still run if the store lost it
+    scan = store.get_scan(scan_id)
+    if scan is None:
+        scan = job['scan']
+        store.insert_scan(scan)
+    
+    try:
+        if scan['status'] == 'cancelled':
+            print(f"Skipping cancelled scan {scan_id}")
+            return
+        
+        process_scan(scan_id, job['url'])
+    finally:
+        # Let the next request for this target start a new scan, and share the outcome
+        inflight.release(normalize_target(job['url']), scan_id)
+        settle_followers(scan_id)
+
+# Requests for a target that is already being scanned attach to that scan
+inflight = InFlightRegistry(redis_client, ttl=int(os.getenv('SCAN_INFLIGHT_TTL', 3600)))
+
+# Scan jobs are drained by a fixed pool so the scanner containers are not overloaded
+scan_queue = JobQueue(
+    'scan_jobs',
+    run_scan_job,
+    redis_client,
+    workers=int(os.getenv('SCAN_WORKERS', 2))
+)
+QUEUE_DEPTH.labels('scan').set_function(scan_queue.depth)
 
 def get_server_info(url):
     """Get server information for a URL."""
@@ -359,31 +672,65 @@ def get_technologies_from_headers(headers):
 
 def analyze_with_chatgpt(scan_id):
     """Analyze scan results using ChatGPT."""
+    trace = Trace('analysis')
     try:
         print(f"Starting AI analysis for scan {scan_id}")
         # Get scan result
-        result = scan_results.get(scan_id)
+        result = store.get_result(scan_id)
         if not result:
             print(f"No scan results found for scan {scan_id}")
             return
+        
+        if result.get('is_analyzed'):
+            print(f"Scan {scan_id} is already analyzed")
+            scan_events.publish(scan_id, 'done', {'analysis_status': 'done'})
+            return
+        
+        store.update_result(scan_id, analysis_status='running')
+        publish_stage(scan_id, 'ai', 'started')
             
-        # Get analysis from Gemini
+        # Get analysis from Gemini; a rescan only sends what changed since the analyzed previous scan
         from utils.openai_helper import analyze_scan_with_chatgpt as analyze_with_gemini
-        analysis = analyze_with_gemini(result)
+        from utils.openai_helper import analyze_scan_delta_with_gemini
+        previous = store.get_result(result['previous_scan_id']) if result.get('previous_scan_id') else None
+        if previous and previous.get('is_analyzed'):
+            analysis = analyze_scan_delta_with_gemini(result, previous, trace)
+        else:
+            analysis = analyze_with_gemini(result, trace)
         
         # Update result with analysis
-        result['summary'] = analysis.get('summary', '')
-        result['recommendations'] = analysis.get('recommendations', [])
-        result['is_analyzed'] = True
+        store.update_result(
+            scan_id,
+            summary=analysis.get('summary', ''),
+            recommendations=analysis.get('recommendations', []),
+            is_analyzed=True,
+            analysis_status='done'
+        )
         
         print(f"AI analysis completed for scan {scan_id}")
+        store.update_scan(scan_id, analysis_spans=trace.finish())
+        publish_stage(scan_id, 'ai', 'done')
+        scan_events.publish(scan_id, 'done', {'analysis_status': 'done'})
         
     except Exception as e:
         print(f"Error analyzing scan {scan_id} with AI: {str(e)}")
+        ERRORS.labels('analysis').inc()
         # Don't fail the scan if analysis fails
-        result = scan_results.get(scan_id)
-        if result:
-            result['analysis_error'] = str(e)
+        store.update_result(scan_id, analysis_error=str(e), analysis_status='failed')
+        scan_events.publish(scan_id, 'done', {'analysis_status': 'failed', 'error': str(e)})
+
+def run_analysis_job(job):
+    """Queue handler: run the AI analysis of a finished scan."""
+    analyze_with_chatgpt(job['scan_id'])
+
+# AI analyses run here instead of on request threads; the LLM client bounds the API calls
+analysis_queue = JobQueue(
+    'analysis_jobs',
+    run_analysis_job,
+    redis_client,
+    workers=int(os.getenv('ANALYSIS_WORKERS', 2))
+)
+QUEUE_DEPTH.labels('analysis').set_function(analysis_queue.depth)
 
 @scan_bp.route('/start', methods=['POST'])
 def start_scan():
@@ -400,6 +747,10 @@ def start_scan():
         if not is_valid_url(url):
             return jsonify({"error": "Noto'g'ri URL formati. Misol: https://example.uz"}), 400
         
+        # Scans of the same site share one canonical URL
+        url = normalize_target(url)
+        force = bool(data.get('force'))
+        
         # Create scan ID
         scan_id = str(uuid.uuid4())
         
@@ -413,16 +764,71 @@ def start_scan():
             'user_id': request.headers.get('X-User-ID', 'anonymous'),  # Authenticated user if available
         }
         
-        scans[scan_id] = scan
+        # Serve a recent result for the same target straight away unless a fresh scan is forced
+        recent = None if force else find_recent_result(url)
+        if not force:
+            cache_lookup('scan_result', recent is not None)
+        if recent:
+            store.insert_scan(scan)
+            copy_result_to_scan(recent, scan_id, reused_from=recent['scan_id'])
+            print(f"Reusing result of scan {recent['scan_id']} for {url} as {scan_id}")
+            
+            return jsonify({
+                "message": "Yaqinda o'tkazilgan skanerlash natijasi qaytarildi",
+                "scan": {
+                    "id": scan_id,
+                    "url": url,
+                    "status": 'completed',
+                    "reused_from": recent['scan_id']
+                }
+            }), 200
+        
+        # Attach to a scan of the same target that is already queued or running
+        for _ in range(2):
+            owner_id = inflight.claim(url, scan_id)
+            if owner_id is None:
+                break
+            
+            owner = store.get_scan(owner_id)
+            if owner and owner['status'] in ACTIVE_STATUSES:
+                scan['status'] = owner['status']
+                scan['attached_to'] = owner_id
+                store.insert_scan(scan)
+                inflight.attach(owner_id, scan_id)
+                
+                # The owner may have finished while we were attaching
+                owner = store.get_scan(owner_id)
+                if not owner or owner['status'] not in ACTIVE_STATUSES:
+                    settle_followers(owner_id)
+                
+                print(f"Scan {scan_id} attached to in-flight scan {owner_id} for {url}")
+                cache_lookup('inflight_scan', True)
+                
+                return jsonify({
+                    "message": "Bu manzil allaqachon skanerlanmoqda, natija ulashiladi",
+                    "scan": {
+                        "id": scan_id,
+                        "url": url,
+                        "status": scan['status'],
+                        "attached_to": owner_id
+                    }
+                }), 202
+            
+            # Stale claim left by a scan that finished or was lost
+            inflight.release(url, owner_id)
+        
+        cache_lookup('inflight_scan', False)
+        store.insert_scan(scan)
+        publish_stage(scan_id, 'queued', 'started')
         
         # Add to queue for async processing
-        threading.Thread(
-            target=process_scan,
-            args=(scan_id, url),
-            daemon=True
-        ).start()
+        scan_queue.enqueue({
+            'scan_id': scan_id,
+            'url': url,
+            'scan': scan
+        })
         
-        print(f"Scan started with ID: {scan_id} for URL: {url}")
+        print(f"Scan queued with ID: {scan_id} for URL: {url}")
         
         return jsonify({
             "message": "Skanerlash boshlandi",
@@ -439,11 +845,10 @@ def start_scan():
 @scan_bp.route('/status/<scan_id>', methods=['GET'])
 def scan_status(scan_id):
     # Check if scan exists
-    if scan_id not in scans:
+    scan = store.get_scan(scan_id)
+    if scan is None:
         return jsonify({"error": "Skanerlash topilmadi"}), 404
     
-    scan = scans[scan_id]
-    
     return jsonify({
         "scan": {
             "id": scan_id,
@@ -455,24 +860,94 @@ def scan_status(scan_id):
         }
     }), 200
 
+@scan_bp.route('/events/<scan_id>', methods=['GET'])
+def scan_event_stream(scan_id):
+    """
+    Stream a scan's progress as Server-Sent Events.
+
+    The stream opens with a 'status' event for the scan's current state and
+    then forwards 'stage' events (queued, server_info, zap, nmap, scoring, ai;
+    started/done with finding counts), 'completed' once the result is saved
+    and finally 'done' (analysis finished), 'failed' or 'cancelled', after
+    which it ends.
+    """
+    scan = store.get_scan(scan_id)
+    if scan is None:
+        return jsonify({"error": "Skanerlash topilmadi"}), 404
+    
+    def generate():
+        # Subscribe (confirmed) before reading the current state so no event falls in between
+        events = scan_events.subscribe(scan_id)
+        try:
+            for event, data in scan_snapshot(scan_id):
+                yield sse_event(event, data)
+                if event in FINAL_EVENTS:
+                    return
+            
+            deadline = time.monotonic() + SCAN_EVENTS_MAX_DURATION
+            while time.monotonic() < deadline:
+                try:
+                    event, data = events.get(timeout=SCAN_EVENTS_KEEPALIVE)
+                except queue.Empty:
+                    # Events published while this process's subscription was down are lost,
+                    # so look at the stored state before waiting on
+                    snapshot = scan_snapshot(scan_id)
+                    if snapshot[-1][0] in FINAL_EVENTS:
+                        for event, data in snapshot[1:]:
+                            yield sse_event(event, data)
+                        return
+                    # Comment line; keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+                yield sse_event(event, data)
+                if event in FINAL_EVENTS:
+                    return
+        finally:
+            scan_events.unsubscribe(scan_id, events)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def scan_snapshot(scan_id):
+    """Events that bring a newly connected stream up to the scan's current state."""
+    scan = store.get_scan(scan_id)
+    snapshot = [('status', {'status': scan['status']})]
+    
+    if scan['status'] in ('failed', 'cancelled'):
+        final = 'failed' if scan['status'] == 'failed' else 'cancelled'
+        snapshot.append((final, {'error': scan.get('error')} if final == 'failed' else {}))
+    elif scan['status'] == 'completed':
+        result = store.get_result(scan_id) or {}
+        snapshot.append(('completed', completed_event_data(result)))
+        if result.get('is_analyzed') or result.get('analysis_status') in (None, 'done', 'failed'):
+            snapshot.append(('done', {'analysis_status': result.get('analysis_status')}))
+        else:
+            snapshot.append(('stage', {'stage': 'ai', 'state': result.get('analysis_status')}))
+    else:
+        stages = scan_events.stage_events(scan_id)
+        snapshot.extend(('stage', stages[stage]) for stage in SCAN_STAGES if stage in stages)
+    
+    return snapshot
+
 @scan_bp.route('/result/<scan_id>', methods=['GET'])
 def scan_result(scan_id):
     # Check if scan exists
-    if scan_id not in scans:
+    scan = store.get_scan(scan_id)
+    if scan is None:
         return jsonify({"error": "Skanerlash topilmadi"}), 404
     
-    scan = scans[scan_id]
-    
     # Check if scan is completed
     if scan['status'] != 'completed':
         return jsonify({"error": "Skanerlash hali yakunlanmagan"}), 400
     
     # Check if result exists
-    if scan_id not in scan_results:
+    result = store.get_result(scan_id)
+    if result is None:
         return jsonify({"error": "Skanerlash natijasi topilmadi"}), 404
     
-    result = scan_results[scan_id]
-    
     return jsonify({
         "result": result
     }), 200
@@ -486,11 +961,10 @@ def get_scan_by_id(scan_id):
             return jsonify({"error": "Noto'g'ri scan ID"}), 400
             
         # Check if scan exists
-        if scan_id not in scans:
+        scan = store.get_scan(scan_id)
+        if scan is None:
             return jsonify({"error": "Skanerlash topilmadi"}), 404
         
-        scan = scans[scan_id]
-        
         # Create response object
         response = {
             "id": scan['id'],
@@ -505,8 +979,8 @@ def get_scan_by_id(scan_id):
             response["completedAt"] = scan['completed_at']
         
         # If scan is completed and result exists, include summary information
-        if scan['status'] == 'completed' and scan_id in scan_results:
-            result = scan_results[scan_id]
+        result = store.get_result(scan_id) if scan['status'] == 'completed' else None
+        if result:
             response["securityScore"] = result.get('security_score')
             response["summary"] = result.get('summary', '')
             response["recommendations"] = result.get('recommendations', [])
@@ -520,23 +994,36 @@ def get_scan_by_id(scan_id):
 def get_vulnerabilities(scan_id):
     """Get vulnerabilities for a specific scan."""
     # Check if scan exists
-    if scan_id not in scans:
+    scan = store.get_scan(scan_id)
+    if scan is None:
         return jsonify({"error": "Skanerlash topilmadi"}), 404
     
-    scan = scans[scan_id]
-    
     # Check if scan is completed
     if scan['status'] != 'completed':
         return jsonify({"error": "Skanerlash hali yakunlanmagan"}), 400
     
     # Check if result exists
-    if scan_id not in scan_results:
+    result = store.get_result(scan_id)
+    if result is None:
         return jsonify({"error": "Skanerlash natijasi topilmadi"}), 404
     
-    result = scan_results[scan_id]
-    
     return jsonify(result.get('vulnerabilities', [])), 200
 
+@scan_bp.route('/<scan_id>/timings', methods=['GET'])
+def get_scan_timings(scan_id):
+    """Get the timing spans of a scan's stages, its AI analysis and its last PDF report."""
+    scan = store.get_scan(scan_id)
+    if scan is None:
+        return jsonify({"error": "Skanerlash topilmadi"}), 404
+    
+    return jsonify({
+        "scan_id": scan_id,
+        "status": scan['status'],
+        "scan": scan.get('spans', []),
+        "analysis": scan.get('analysis_spans', []),
+        "report": scan.get('report_spans', [])
+    }), 200
+
 @scan_bp.route('/history', methods=['GET'])
 @jwt_required(optional=True)
 def scan_history():
@@ -550,25 +1037,32 @@ def scan_history():
             "scans": []
         }), 200
     
-    # Get user's scan history
+    try:
+        limit, cursor, _ = parse_page_args(request.args)
+        before = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return jsonify({"error": f"Noto'g'ri sahifalash parametri: {str(e)}"}), 400
+    
+    # Get one page of the user's scan history (newest first, read from the user index)
+    page = store.list_scans(user_id=user_id, limit=limit + 1, before=before)
+    has_more = len(page) > limit
+    page = page[:limit]
+    
     user_scans = [
         {
             "id": scan['id'],
             "url": scan['url'],
             "status": scan['status'],
             "created_at": scan['created_at'],
-            "has_result": scan['id'] in scan_results,
+            "has_result": scan.get('has_result', False),
             "completed_at": scan.get('completed_at')
         }
-        for scan in scans.values()
-        if scan['user_id'] == user_id
+        for scan in page
     ]
     
-    # Sort by created_at (newest first)
-    user_scans.sort(key=lambda x: x["created_at"], reverse=True)
-    
     return jsonify({
-        "scans": user_scans
+        "scans": user_scans,
+        "next_cursor": encode_cursor(page[-1]) if has_more else None
     }), 200
 
 @scan_bp.route('/stats', methods=['GET'])
@@ -583,34 +1077,18 @@ def dashboard_stats():
             "stats": None
         }), 401
     
-    # Filter user's scans
-    user_scans = [scan for scan in scans.values() if scan['user_id'] == user_id]
-    
-    # Calculate statistics
-    total_scans = len(user_scans)
-    completed_scans = sum(1 for scan in user_scans if scan['status'] == 'completed')
-    
-    # Get security scores
-    security_scores = []
-    vulnerability_counts = {"high": 0, "medium": 0, "low": 0}
-    
-    for scan in user_scans:
-        if scan['status'] == 'completed' and scan['id'] in scan_results:
-            result = scan_results[scan['id']]
-            security_scores.append(result.get('security_score', 0))
-            
-            # Count vulnerabilities
-            for severity, count in result.get('severity_counts', {}).items():
-                vulnerability_counts[severity] += count
+    # Running per-user aggregates, maintained by the store as scans change status
+    stats = store.get_user_stats(user_id)
+    vulnerability_counts = stats['vulnerability_counts']
     
     # Calculate average security score
-    avg_security_score = sum(security_scores) / len(security_scores) if security_scores else 0
+    avg_security_score = stats['score_sum'] / stats['scored_scans'] if stats['scored_scans'] else 0
     
     return jsonify({
         "stats": {
-            "total_scans": total_scans,
-            "completed_scans": completed_scans,
-            "in_progress_scans": sum(1 for scan in user_scans if scan['status'] == 'in_progress'),
+            "total_scans": stats['total_scans'],
+            "completed_scans": stats['completed_scans'],
+            "in_progress_scans": stats['in_progress_scans'],
             "average_security_score": round(avg_security_score, 1),
             "vulnerability_counts": vulnerability_counts,
             "total_vulnerabilities": sum(vulnerability_counts.values())
@@ -621,18 +1099,26 @@ def dashboard_stats():
 def cancel_scan(scan_id):
     """Cancel an in-progress scan."""
     # Check if scan exists
-    if scan_id not in scans:
+    scan = store.get_scan(scan_id)
+    if scan is None:
         return jsonify({"error": "Skanerlash topilmadi"}), 404
     
-    scan = scans[scan_id]
-    
     # Check if scan can be cancelled
     if scan['status'] not in ['queued', 'in_progress']:
         return jsonify({"error": "Faqat navbatda turgan yoki ishlayotgan skanerlashni bekor qilish mumkin"}), 400
     
-    # Update scan status
-    scan['status'] = 'cancelled'
-    scan['updated_at'] = datetime.now().isoformat()
+    # Update scan status, unless the scan finished since it was read
+    scan = store.update_scan(
+        scan_id,
+        unless={'status': ('completed', 'failed', 'cancelled')},
+        status='cancelled',
+        updated_at=datetime.now().isoformat()
+    )
+    if scan is None:
+        return jsonify({"error": "Faqat navbatda turgan yoki ishlayotgan skanerlashni bekor qilish mumkin"}), 400
+    scan_events.publish(scan_id, 'cancelled')
+    # Stop the scanners of a running scan, in whichever worker process has it
+    cancellations.cancel(scan_id)
     
     return jsonify({
         "message": "Skanerlash bekor qilindi",
@@ -1,8 +1,10 @@
-from flask import Flask, render_template
+from flask import Flask, render_template, request, g, Response
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from dotenv import load_dotenv
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 import os
+import time
 
 # Load environment variables
 load_dotenv()
@@ -24,15 +26,48 @@ CORS(app,
 
 # Import and register blueprints
 from api.auth import auth_bp
-from api.scan_api import scan_bp
+from api.scan_api import scan_bp, scan_queue, analysis_queue
 from api.report_api import report_bp
+from utils.metrics import REQUEST_SECONDS
 
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(scan_bp, url_prefix='/api/scan')
 app.register_blueprint(report_bp, url_prefix='/api/report')
 
+def start_workers():
+    """Start this process's scan and analysis workers; calls after the first do nothing."""
+    scan_queue.start()
+    analysis_queue.start()
+
+def in_reloader_watcher():
+    """
+    Whether this may be the debug reloader's watcher process.
+    
+    With the reloader, the app is loaded in a watcher process that only restarts
+    the server and in a child (WERKZEUG_RUN_MAIN=true) that serves requests.
+    """
+    return (__name__ == '__main__' or app.debug) and os.environ.get('WERKZEUG_RUN_MAIN') != 'true'
+
+# Workers run in every serving process (gunicorn workers, flask run, python app.py)
+if not in_reloader_watcher():
+    start_workers()
+
+@app.before_request
+def start_request_timer():
+    # Covers debug runs without the reloader, which look like a watcher above
+    start_workers()
+    g.request_started = time.perf_counter()
+
 @app.after_request
 def after_request(response):
+    # Latency per route pattern, so scan IDs in the path don't each become a series
+    if request.url_rule is not None and request.endpoint != 'metrics':
+        REQUEST_SECONDS.labels(
+            request.method,
+            request.url_rule.rule,
+            str(response.status_code)
+        ).observe(time.perf_counter() - g.get('request_started', time.perf_counter()))
+    
     # Allow requests from all origins in development
     response.headers.add('Access-Control-Allow-Origin', '*')
     response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,X-User-ID')
@@ -47,6 +82,11 @@ def index():
 def view_report(report_id):
     return render_template('report.html', report_id=report_id)
 
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics: stage and request latencies, queue depths, running scans, cache hits, errors."""
+    return Response(generate_latest(), content_type=CONTENT_TYPE_LATEST)
+
 if __name__ == '__main__':
     # Use port 5000 which maps to 5001 in docker-compose
     print(f"Starting Flask server on http://0.0.0.0:5000")
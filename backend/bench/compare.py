@@ -0,0 +1,114 @@
+"""
+Compare two benchmark result files.
+
+    python -m bench.compare bench/results/<old>.json bench/results/<new>.json [--threshold 20]
+
+Prints every metric of the two runs side by side with its change and exits
+with status 1 if any metric got worse by more than the threshold (percent).
+"""
+import argparse
+import json
+import sys
+
+# Metric name suffixes for which a higher value is better; for all others lower is better
+HIGHER_IS_BETTER = ('per_min',)
+
+# Metric name suffixes that are compared; counters such as 'n' and the noisy max_ms are not
+COMPARED = ('mean_ms', 'p50_ms', 'p99_ms', '_mb', 'per_min', 'errors')
+
+
+def flatten(results, prefix=''):
+    """Turn nested result dicts into {'a / b / c': number} for the compared metrics."""
+    metrics = {}
+    for key, value in results.items():
+        if key == 'meta':
+            continue
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            metrics.update(flatten(value, f'{name} / '))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and key.endswith(COMPARED):
+            metrics[name] = value
+    return metrics
+
+
+def change(old, new, name):
+    """
+    Relative change of a metric in percent, positive when it got worse.
+
+    Returns:
+        Percent change, or None if it cannot be expressed as a ratio
+    """
+    if old == new:
+        return 0.0
+    if old == 0:
+        return None
+    percent = (new - old) / abs(old) * 100
+    return -percent if name.endswith(HIGHER_IS_BETTER) else percent
+
+
+def compare(old_results, new_results, threshold=20.0, out=None):
+    """
+    Print the metrics of two runs side by side.
+
+    Args:
+        old_results: Results dict of the baseline run
+        new_results: Results dict of the run to check
+        threshold: Percent by which a metric may get worse before it is flagged
+        out: Stream to print to (default: stdout)
+
+    Returns:
+        List of names of the metrics flagged as regressions
+    """
+    out = out or sys.stdout
+    old_metrics = flatten(old_results)
+    new_metrics = flatten(new_results)
+    old_meta = old_results.get('meta', {})
+    new_meta = new_results.get('meta', {})
+    print(f"baseline: {old_meta.get('commit')} ({old_meta.get('timestamp')})", file=out)
+    print(f"current:  {new_meta.get('commit')} ({new_meta.get('timestamp')})", file=out)
+    if old_meta.get('settings') != new_meta.get('settings'):
+        print("warning: the runs used different settings, numbers may not be comparable", file=out)
+
+    regressions = []
+    width = max([len(name) for name in new_metrics] + [10])
+    for name in sorted(set(old_metrics) | set(new_metrics)):
+        old = old_metrics.get(name)
+        new = new_metrics.get(name)
+        if old is None or new is None:
+            print(f"{name:<{width}}  {old!s:>10}  {new!s:>10}  (only in one run)", file=out)
+            continue
+        worse = change(old, new, name)
+        flag = ''
+        if worse is None:
+            # From zero errors to some, for example
+            flag = 'REGRESSION' if new > old and not name.endswith(HIGHER_IS_BETTER) else ''
+            shown = 'n/a'
+        else:
+            shown = f'{-worse:+.1f}%' if name.endswith(HIGHER_IS_BETTER) else f'{worse:+.1f}%'
+            if worse > threshold:
+                flag = 'REGRESSION'
+        if flag:
+            regressions.append(name)
+        print(f"{name:<{width}}  {old:>10.4g}  {new:>10.4g}  {shown:>8}  {flag}", file=out)
+
+    print(f"{len(regressions)} regression(s) above {threshold:g}%", file=out)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument('old', help="Baseline results JSON")
+    parser.add_argument('new', help="Results JSON to check")
+    parser.add_argument('--threshold', type=float, default=20.0,
+                        help="Percent by which a metric may get worse (default: 20)")
+    args = parser.parse_args(argv)
+
+    with open(args.old, encoding='utf-8') as f:
+        old_results = json.load(f)
+    with open(args.new, encoding='utf-8') as f:
+        new_results = json.load(f)
+    return 1 if compare(old_results, new_results, args.threshold) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+# offline stand-ins for the scanners used by the benchmarks
+import os
+import random
+import shutil
+import time
+import zlib
+from contextlib import contextmanager
+
+from utils.metrics import Trace
+from utils.zap_client import pause
+
+# Nmap report shipped with the repo, returned by every fake Nmap run
+NMAP_SAMPLE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'reports', 'nmap', 'example.com-nmap-report.xml')
+
+# Rules the fake ZAP picks from; each target gets its own subset, so analyses
+# of different targets do not all come from the analysis cache
+RULE_POOL_SIZE = 60
+
+ZAP_RISKS = ('High', 'Medium', 'Low', 'Informational')
+
+
+def zap_alerts(target, count=200, rules=12):
+    """
+    Generate ZAP API alert instances for a target.
+
+    The same target always gets the same alerts.
+
+    Args:
+        target: Scanned URL
+        count: Number of alert instances (the size of the ZAP report)
+        rules: Number of distinct rules the instances are spread over
+
+    Yields:
+        Alert dicts shaped like the ones the ZAP API returns
+    """
+    rng = random.Random(zlib.crc32(target.encode('utf-8')))
+    picked = rng.sample(range(RULE_POOL_SIZE), min(rules, RULE_POOL_SIZE))
+    base = target.rstrip('/')
+    for i in range(count):
+        rule = picked[i % len(picked)]
+        yield {
+            'pluginId': str(90000 + rule),
+            'alertRef': str(90000 + rule),
+            'name': f'Benchmark rule {rule}',
+            'risk': ZAP_RISKS[rule % len(ZAP_RISKS)],
+            'description': f'Synthetic finding {rule} used by the benchmarks. ' * 4,
+            'solution': f'Apply the fix for synthetic finding {rule}.',
+            'reference': f'https://example.test/rules/{rule}\nhttps://example.test/cwe/{rule}',
+            'url': f'{base}/page/{i}?id={i}',
+            'method': 'GET',
+            'param': f'param{i % 7}',
+            'evidence': f'<input name="param{i % 7}">'
+        }
+
+
+class FakeZapClient:
+    """ZapClient replacement: spidering takes a fixed time and alerts come from zap_alerts()."""
+
+    def __init__(self, latency=2.0, alerts=200, rules=12):
+        self.latency = latency
+        self.alerts = alerts
+        self.rules = rules
+
+    @contextmanager
+    def isolated(self, target):
+        yield
+
+    def scan(self, target, scan_id, deadline, spider_duration=60, poll_interval=1, cancel_token=None, trace=None):
+        trace = trace or Trace('zap')
+        with trace.span('zap.spider'):
+            if pause(self.latency / 2, cancel_token):
+                return
+        with trace.span('zap.passive_scan'):
+            pause(self.latency / 2, cancel_token)
+
+    def iter_alerts(self, base_url, page_size=500):
+        return zap_alerts(base_url, self.alerts, self.rules)
+
+
+class FakeScannerExec:
+    """ScannerExecutor replacement: an Nmap run takes a fixed time and writes the sample report."""
+
+    def __init__(self, report_dir, latency=1.0):
+        self.report_dir = report_dir
+        self.latency = latency
+
+    def run(self, container, cmd, timeout, on_output=None, cancel_token=None):
+        # Only the scan itself is slow; helper commands such as chmod return at once
+        cancelled = pause(self.latency if cmd[:1] == ['nmap'] else 0, cancel_token)
+        if not cancelled and '-oX' in cmd:
+            # The real scanner writes to /reports in its container, which is report_dir here
+            report = os.path.basename(cmd[cmd.index('-oX') + 1])
+            os.makedirs(self.report_dir, exist_ok=True)
+            shutil.copyfile(NMAP_SAMPLE, os.path.join(self.report_dir, report))
+        return {
+            'exit_code': None if cancelled else 0,
+            'stdout': '',
+            'stderr': '',
+            'timed_out': False,
+            'cancelled': cancelled
+        }
+
+
+def fake_server_info(latency=0.1):
+    """get_server_info replacement that answers after latency seconds."""
+    def get_server_info(url):
+        time.sleep(latency)
+        return {'server': 'nginx/1.24.0', 'technologies': 'nginx/1.24.0'}
+    return get_server_info
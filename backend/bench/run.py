@@ -0,0 +1,421 @@
+"""
+Offline load test and benchmark of the CyberShield API.
+
+The Flask app is driven through its test client. ZAP, Nmap and Gemini are
+replaced by the local fakes in bench/fakes.py and Redis by fakeredis, so no
+containers, network or API quota are needed:
+
+    cd backend
+    pip install -r bench/requirements.txt
+    python -m bench.run                                   # full run
+    python -m bench.run --sizes 1000 --scans 20           # quick run
+    python -m bench.run --compare bench/results/<old>.json
+
+Measured:
+    - throughput: scans/min through the scan workers and analyses/min
+      through the analysis workers, per-scan latency from /start until the
+      result is saved and the time spent in each stage (from the scan spans)
+    - p50/p99 latency of /start, /status, /history, /stats, /latest and
+      /export with 1k, 10k and 100k scans in the store
+    - process memory (RSS) and database size at each of those store sizes
+
+Results are saved as JSON in bench/results/ together with the git commit and
+the settings of the run. Compare two runs with bench/compare.py, or pass
+--compare to compare the new run with an earlier one right away.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+
+# User the seeded scans and the authenticated requests belong to
+BENCH_USER = 'bench@cybershield.test'
+
+
+def log(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of the CyberShield API.")
+    parser.add_argument('--scans', type=int, default=50, help="Scans for the throughput run (default: 50)")
+    parser.add_argument('--scan-workers', type=int, default=2, help="Scan queue workers (default: 2)")
+    parser.add_argument('--analysis-workers', type=int, default=2, help="Analysis queue workers (default: 2)")
+    parser.add_argument('--zap-latency', type=float, default=2.0, help="Seconds a fake ZAP scan takes (default: 2)")
+    parser.add_argument('--zap-alerts', type=int, default=200, help="Alert instances per fake ZAP report (default: 200)")
+    parser.add_argument('--zap-rules', type=int, default=12, help="Distinct rules per fake ZAP report (default: 12)")
+    parser.add_argument('--nmap-latency', type=float, default=1.0, help="Seconds a fake Nmap run takes (default: 1)")
+    parser.add_argument('--llm-latency', type=float, default=0.5, help="Seconds a fake Gemini call takes (default: 0.5)")
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help="Comma-separated numbers of stored scans to measure at (default: 1000,10000,100000)")
+    parser.add_argument('--users', type=int, default=10, help="Users the stored scans are spread over (default: 10)")
+    parser.add_argument('--requests', type=int, default=200, help="Requests per endpoint and size (default: 200)")
+    parser.add_argument('--timeout', type=float, default=900, help="Longest the throughput run may take (default: 900)")
+    parser.add_argument('--seed', type=int, default=1, help="Seed for picking scans to request (default: 1)")
+    parser.add_argument('--output', default=os.path.join(BENCH_DIR, 'results'), help="Directory for the results file")
+    parser.add_argument('--compare', metavar='RESULTS', help="Earlier results file to compare this run with")
+    parser.add_argument('--threshold', type=float, default=20.0,
+                        help="Percent a metric may get worse before --compare flags it (default: 20)")
+    parser.add_argument('--verbose', action='store_true', help="Show the backend's own output")
+    args = parser.parse_args(argv)
+    args.sizes = sorted(int(size) for size in args.sizes.split(',') if size.strip())
+    return args
+
+
+def configure_environment(args, data_dir):
+    """Point the backend at a scratch database and the fakes; must run before the app is imported."""
+    os.environ.pop('MONGODB_URI', None)
+    os.environ.update({
+        'DB_BACKEND': 'sqlite',
+        'SQLITE_PATH': os.path.join(data_dir, 'bench.db'),
+        'TEMPLATE_CACHE_DIR': os.path.join(data_dir, 'template_cache'),
+        # Fake Nmap reports and rendered exports stay out of the repository
+        'SCANNER_REPORTS_DIR': os.path.join(data_dir, 'reports'),
+        'EXPORT_CACHE_DIR': os.path.join(data_dir, 'exports'),
+        'JWT_SECRET': 'cybershield-benchmark-only-signing-key',
+        'LLM_BACKEND': 'fake',
+        'LLM_FAKE_LATENCY': str(args.llm_latency),
+        'SCAN_WORKERS': str(args.scan_workers),
+        'ANALYSIS_WORKERS': str(args.analysis_workers),
+        # Every benchmark scan must really run instead of reusing a recent result
+        'SCAN_RESULT_TTL': '0',
+        'ARTIFACT_GRACE': '0.5',
+    })
+
+    try:
+        import fakeredis
+    except ImportError:
+        sys.exit("The benchmarks need fakeredis: pip install -r bench/requirements.txt")
+
+    # Every module creates its client through create_redis_client() at import time
+    from utils import job_queue
+    server = fakeredis.FakeServer()
+    job_queue.create_redis_client = lambda: fakeredis.FakeRedis(server=server)
+
+
+def install_fakes(args):
+    """Replace the scanners used by the scan pipeline with the offline fakes."""
+    from api import scan_api
+    from bench.fakes import FakeZapClient, FakeScannerExec, fake_server_info
+
+    # process_scan reads Nmap reports from here; the real scanner writes them through a bind mount
+    nmap_dir = os.path.join(scan_api.SCANNER_REPORTS_DIR, 'nmap')
+    scan_api.zap_client = FakeZapClient(args.zap_latency, args.zap_alerts, args.zap_rules)
+    scan_api.scanner_exec = FakeScannerExec(nmap_dir, args.nmap_latency)
+    scan_api.get_server_info = fake_server_info()
+
+
+def summarize(samples):
+    """Count, mean, p50, p99 and max of durations given in seconds, in milliseconds."""
+    if not samples:
+        return {'n': 0}
+    ordered = sorted(samples)
+
+    def percentile(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] * 1000
+
+    return {
+        'n': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 2),
+        'p50_ms': round(percentile(0.50), 2),
+        'p99_ms': round(percentile(0.99), 2),
+        'max_ms': round(ordered[-1] * 1000, 2)
+    }
+
+
+def memory_usage(db_path):
+    """Current and peak RSS of this process and the size of the database, in MB."""
+    rss = 0
+    try:
+        with open('/proc/self/statm') as f:
+            rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        pass
+    # ru_maxrss is in kilobytes on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    db_size = sum(
+        os.path.getsize(path) for path in (db_path, db_path + '-wal') if os.path.exists(path)
+    )
+    return {
+        'rss_mb': round(rss / 1024 / 1024, 1),
+        'peak_rss_mb': round(peak / 1024 / 1024, 1),
+        'db_mb': round(db_size / 1024 / 1024, 1)
+    }
+
+
+def seconds_between(start, end):
+    return (datetime.fromisoformat(end) - datetime.fromisoformat(start)).total_seconds()
+
+
+def run_throughput(client, args):
+    """
+    Push args.scans scans through the queues and time them until analyzed.
+
+    Returns:
+        Dict with scans/min, analyses/min, per-scan latencies and per-stage durations
+    """
+    from api.scan_api import scan_queue, analysis_queue
+    from utils.db import store
+
+    scan_queue.start()
+    analysis_queue.start()
+
+    run_id = int(time.time())
+    started = time.perf_counter()
+    scan_ids = []
+    for i in range(args.scans):
+        response = client.post(
+            '/api/scan/start',
+            json={'url': f'https://throughput-{run_id}-{i}.bench.test', 'force': True},
+            headers={'X-User-ID': BENCH_USER}
+        )
+        scan_ids.append(response.get_json()['scan']['id'])
+
+    pending = set(scan_ids)
+    scans_done_at = analyses_done_at = None
+    deadline = started + args.timeout
+    while pending and time.perf_counter() < deadline:
+        time.sleep(0.1)
+        for scan_id in list(pending):
+            scan = store.get_scan(scan_id)
+            if scan['status'] == 'failed':
+                pending.discard(scan_id)
+            elif scan['status'] == 'completed':
+                result = store.get_result(scan_id)
+                if result and result.get('analysis_status') in ('done', 'failed'):
+                    pending.discard(scan_id)
+        if scans_done_at is None and all(
+            store.get_scan(scan_id)['status'] in ('completed', 'failed') for scan_id in scan_ids
+        ):
+            scans_done_at = time.perf_counter()
+    analyses_done_at = time.perf_counter()
+    if pending:
+        log(f"  {len(pending)} scan(s) did not finish within {args.timeout:g}s")
+
+    scan_latencies = []
+    stage_durations = {}
+    completed = failed = 0
+    for scan_id in scan_ids:
+        scan = store.get_scan(scan_id)
+        if scan['status'] == 'completed':
+            completed += 1
+            scan_latencies.append(seconds_between(scan['created_at'], scan['completed_at']))
+        elif scan['status'] == 'failed':
+            failed += 1
+        for span in scan.get('spans', []) + scan.get('analysis_spans', []):
+            stage_durations.setdefault(span['name'], []).append(span['duration_ms'] / 1000)
+
+    scan_time = (scans_done_at or analyses_done_at) - started
+    analysis_time = analyses_done_at - started
+    return {
+        'scans': args.scans,
+        'completed': completed,
+        'failed': failed,
+        'unfinished': len(pending),
+        'scans_per_min': round(completed / scan_time * 60, 2),
+        'analyses_per_min': round((args.scans - len(pending)) / analysis_time * 60, 2),
+        'scan_latency': summarize(scan_latencies),
+        'stages': {name: summarize(durations) for name, durations in sorted(stage_durations.items())}
+    }
+
+
+def result_template(args):
+    """A realistic analyzed scan result built from the fake scanner output."""
+    from core.scan import collapse_zap_alerts, parse_nmap_report, diff_findings
+    from bench.fakes import zap_alerts, NMAP_SAMPLE
+
+    vulnerabilities = collapse_zap_alerts(zap_alerts('https://seed.bench.test', args.zap_alerts, args.zap_rules))
+    vulnerabilities += parse_nmap_report(NMAP_SAMPLE)
+    delta = diff_findings(vulnerabilities, [])
+    severity_counts = {'high': 0, 'medium': 0, 'low': 0}
+    for vuln in vulnerabilities:
+        severity = vuln['severity'].lower()
+        if severity in severity_counts:
+            severity_counts[severity] += 1
+    return {
+        'vulnerabilities': vulnerabilities,
+        'security_score': max(0, 100 - (severity_counts['high'] * 15 + severity_counts['medium'] * 8 +
+                                        severity_counts['low'] * 3)),
+        'severity_counts': severity_counts,
+        'server_info': {'server': 'nginx/1.24.0', 'technologies': 'nginx/1.24.0'},
+        'summary': "Benchmark natijasi: aniqlangan zaifliklar ustuvorlik bo'yicha ko'rib chiqilishi kerak.",
+        'recommendations': ["Yuqori darajadagi zaifliklarni birinchi navbatda bartaraf eting"],
+        'is_analyzed': True,
+        'analysis_status': 'done',
+        'previous_scan_id': None,
+        'delta': delta
+    }
+
+
+def seed_store(start, end, users, template):
+    """Store completed, analyzed scans number start..end-1, spread over users, oldest first."""
+    from utils.db import store
+
+    base = datetime(2024, 1, 1)
+    for i in range(start, end):
+        scan_id = f'bench-{i:07d}'
+        user_id = BENCH_USER if i % users == 0 else f'bench-{i % users}@cybershield.test'
+        created_at = (base + timedelta(minutes=i)).isoformat()
+        url = f'https://site-{i % 500}.bench.test'
+        store.insert_scan({
+            'id': scan_id,
+            'url': url,
+            'status': 'completed',
+            'created_at': created_at,
+            'updated_at': created_at,
+            'completed_at': created_at,
+            'has_result': True,
+            'user_id': user_id
+        })
+        store.save_result(dict(template, id=f'result-{i:07d}', scan_id=scan_id, url=url, created_at=created_at))
+
+
+def time_requests(count, send):
+    """Send count requests with send(i) and summarize their latencies, response body included."""
+    samples = []
+    errors = 0
+    for i in range(count):
+        start = time.perf_counter()
+        response = send(i)
+        response.get_data()
+        samples.append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            errors += 1
+        response.close()
+    return dict(summarize(samples), errors=errors)
+
+
+def run_endpoints(client, args, size, token):
+    """Measure every endpoint with size scans stored."""
+    rng = random.Random(args.seed + size)
+    seeded = [f'bench-{i:07d}' for i in range(size)]
+    picks = [rng.choice(seeded) for _ in range(args.requests)]
+    auth = {'Authorization': f'Bearer {token}'}
+
+    endpoints = {
+        'POST /start': lambda i: client.post(
+            '/api/scan/start',
+            json={'url': f'https://start-{size}-{i}.bench.test'},
+            headers={'X-User-ID': BENCH_USER}
+        ),
+        'GET /status': lambda i: client.get(f'/api/scan/status/{picks[i]}'),
+        'GET /history': lambda i: client.get('/api/scan/history?limit=20', headers=auth),
+        'GET /stats': lambda i: client.get('/api/scan/stats', headers=auth),
+        'GET /latest': lambda i: client.get('/api/report/latest', headers=auth),
+        'GET /latest summary': lambda i: client.get('/api/report/latest?view=summary', headers=auth),
+        'GET /export json': lambda i: client.get(f'/api/report/export/{picks[i]}?format=json'),
+        'GET /export html': lambda i: client.get(f'/api/report/export/{picks[i]}?format=html'),
+    }
+    return {name: time_requests(args.requests, send) for name, send in endpoints.items()}
+
+
+def git_commit():
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+        dirty = subprocess.check_output(
+            ['git', 'status', '--porcelain', '--untracked-files=no'], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+        return f'{commit}-dirty' if dirty else commit
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    data_dir = tempfile.mkdtemp(prefix='cybershield-bench-')
+    real_stdout = sys.stdout
+    if not args.verbose:
+        # The backend reports progress with print(), also from worker threads that
+        # outlive the measurements; keep it out of the benchmark output
+        sys.stdout = open(os.devnull, 'w')
+
+    try:
+        configure_environment(args, data_dir)
+        from app import app
+        from flask_jwt_extended import create_access_token
+        install_fakes(args)
+        client = app.test_client()
+        with app.app_context():
+            token = create_access_token(identity=BENCH_USER)
+
+        results = {
+            'meta': {
+                'commit': git_commit(),
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpus': os.cpu_count(),
+                'settings': {
+                    key: value for key, value in vars(args).items()
+                    if key not in ('output', 'compare', 'threshold', 'verbose')
+                }
+            }
+        }
+
+        log(f"Throughput: {args.scans} scans, {args.scan_workers} scan / {args.analysis_workers} analysis worker(s)")
+        results['throughput'] = run_throughput(client, args)
+        log(f"  {results['throughput']['scans_per_min']} scans/min, "
+            f"{results['throughput']['analyses_per_min']} analyses/min")
+
+        # Queued jobs from the endpoint runs below would otherwise compete with the measurements
+        from api.scan_api import scan_queue, analysis_queue
+        scan_queue.stop()
+        analysis_queue.stop()
+
+        template = result_template(args)
+        db_path = os.environ['SQLITE_PATH']
+        results['sizes'] = {}
+        seeded = 0
+        for size in args.sizes:
+            log(f"Store with {size} scans: seeding")
+            start = time.perf_counter()
+            seed_store(seeded, size, args.users, template)
+            seed_seconds = time.perf_counter() - start
+            seeded = max(seeded, size)
+
+            log(f"Store with {size} scans: {args.requests} request(s) per endpoint")
+            endpoints = run_endpoints(client, args, size, token)
+            results['sizes'][str(size)] = dict(
+                memory_usage(db_path),
+                seed_seconds=round(seed_seconds, 1),
+                endpoints=endpoints
+            )
+            for name, stats in endpoints.items():
+                log(f"  {name:<20} p50 {stats['p50_ms']:>8.2f} ms  p99 {stats['p99_ms']:>8.2f} ms"
+                    f"{'  errors: %d' % stats['errors'] if stats['errors'] else ''}")
+            log(f"  rss {results['sizes'][str(size)]['rss_mb']} MB, db {results['sizes'][str(size)]['db_mb']} MB")
+    except Exception:
+        sys.stdout = real_stdout
+        raise
+
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(
+        args.output,
+        f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{results['meta']['commit']}.json"
+    )
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    log(f"Results saved to {path}")
+
+    if args.compare:
+        from bench.compare import compare
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        return 1 if compare(baseline, results, args.threshold, out=real_stdout) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,213 @@
+# offline remediation knowledge base
+
+# Precomputed explanations for the findings we see on almost every site, keyed by
+# "zap:<pluginId>" or the finding's "nmap:..." rule. Findings listed here are
+# explained locally; only the rest are sent to the model.
+REMEDIATIONS = {
+    "zap:10020": {
+        "title": "Clickjacking himoyasi yo'q",
+        "summary": "Sahifa boshqa saytlarda iframe ichida ochilishi mumkin, bu clickjacking hujumlariga yo'l ochadi.",
+        "remediation": "X-Frame-Options: DENY (yoki SAMEORIGIN) sarlavhasini yoki CSP frame-ancestors direktivasini o'rnating."
+    },
+    "zap:10021": {
+        "title": "X-Content-Type-Options sarlavhasi yo'q",
+        "summary": "Brauzer javob turini o'zi taxmin qilishi (MIME sniffing) mumkin.",
+        "remediation": "Barcha javoblarga X-Content-Type-Options: nosniff sarlavhasini qo'shing."
+    },
+    "zap:10038": {
+        "title": "Content-Security-Policy o'rnatilmagan",
+        "summary": "CSP yo'qligi XSS va kontent in'ektsiyasi hujumlarining ta'sirini kuchaytiradi.",
+        "remediation": "Faqat ishonchli manbalarga ruxsat beruvchi Content-Security-Policy sarlavhasini sozlang."
+    },
+    "zap:10055": {
+        "title": "Content-Security-Policy sozlamalari zaif",
+        "summary": "CSP juda keng yoki xavfli direktivalarni (unsafe-inline, unsafe-eval, *) o'z ichiga oladi.",
+        "remediation": "CSP'dan unsafe-inline, unsafe-eval va * manbalarini olib tashlang, nonce yoki hash'lardan foydalaning."
+    },
+    "zap:10035": {
+        "title": "HSTS o'rnatilmagan",
+        "summary": "Strict-Transport-Security yo'qligi sababli ulanish HTTP'ga tushirilib, trafik ushlanishi mumkin.",
+        "remediation": "HTTPS javoblariga Strict-Transport-Security: max-age=31536000; includeSubDomains sarlavhasini qo'shing."
+    },
+    "zap:10036": {
+        "title": "Server versiyasi oshkor bo'lmoqda",
+        "summary": "Server sarlavhasi veb-server dasturi va versiyasini oshkor qiladi.",
+        "remediation": "Server sarlavhasidan versiya ma'lumotini olib tashlang (masalan, nginx: server_tokens off)."
+    },
+    "zap:10037": {
+        "title": "X-Powered-By sarlavhasi texnologiyani oshkor qiladi",
+        "summary": "X-Powered-By sarlavhasi ishlatilayotgan platforma va uning versiyasini ko'rsatadi.",
+        "remediation": "X-Powered-By sarlavhasini o'chiring (masalan, PHP: expose_php = Off, Express: app.disable('x-powered-by'))."
+    },
+    "zap:10010": {
+        "title": "Cookie'da HttpOnly bayrog'i yo'q",
+        "summary": "Cookie JavaScript orqali o'qilishi va XSS orqali o'g'irlanishi mumkin.",
+        "remediation": "Sessiya va boshqa maxfiy cookie'larga HttpOnly bayrog'ini qo'shing."
+    },
+    "zap:10011": {
+        "title": "Cookie'da Secure bayrog'i yo'q",
+        "summary": "Cookie shifrlanmagan HTTP ulanishi orqali ham yuborilishi mumkin.",
+        "remediation": "HTTPS orqali ishlatiladigan barcha cookie'larga Secure bayrog'ini qo'shing."
+    },
+    "zap:10054": {
+        "title": "Cookie'da SameSite atributi yo'q",
+        "summary": "Cookie boshqa saytlardan yuborilgan so'rovlarga ham qo'shiladi, bu CSRF xavfini oshiradi.",
+        "remediation": "Cookie'larga SameSite=Lax yoki SameSite=Strict atributini qo'shing."
+    },
+    "zap:90033": {
+        "title": "Cookie doirasi juda keng",
+        "summary": "Cookie ota domen uchun o'rnatilgan va boshqa subdomenlarga ham yuboriladi.",
+        "remediation": "Cookie Domain atributini kerakli subdomen bilan cheklang yoki umuman ko'rsatmang."
+    },
+    "zap:10015": {
+        "title": "Kesh sozlamalari qayta ko'rib chiqilishi kerak",
+        "summary": "Cache-Control sozlamalari maxfiy sahifalarning brauzer yoki proksida keshlanishiga yo'l qo'yishi mumkin.",
+        "remediation": "Maxfiy ma'lumotli sahifalar uchun Cache-Control: no-store sarlavhasini o'rnating."
+    },
+    "zap:10049": {
+        "title": "Keshlanadigan kontent",
+        "summary": "Javoblar umumiy proksi-serverlarda keshlanishi mumkin.",
+        "remediation": "Shaxsiy ma'lumotli sahifalar uchun Cache-Control: no-store, private sozlang."
+    },
+    "zap:10096": {
+        "title": "Vaqt belgisi oshkor bo'lmoqda",
+        "summary": "Javoblarda Unix vaqt belgilari uchraydi, ular ichki ma'lumotlarni oshkor qilishi mumkin.",
+        "remediation": "Javoblardagi vaqt belgilarining maxfiy emasligini tekshiring va keraksizlarini olib tashlang."
+    },
+    "zap:10027": {
+        "title": "Koddagi shubhali izohlar",
+        "summary": "Sahifa kodidagi izohlar ichki tuzilma yoki ishlab chiqish tafsilotlarini oshkor qilishi mumkin.",
+        "remediation": "Ishlab chiqarish kodidan izohlarni olib tashlang yoki fayllarni minifikatsiya qiling."
+    },
+    "zap:10063": {
+        "title": "Permissions-Policy sarlavhasi yo'q",
+        "summary": "Brauzer imkoniyatlari (kamera, geolokatsiya va h.k.) uchun cheklov o'rnatilmagan.",
+        "remediation": "Keraksiz brauzer funksiyalarini o'chiruvchi Permissions-Policy sarlavhasini qo'shing."
+    },
+    "zap:10098": {
+        "title": "CORS noto'g'ri sozlangan",
+        "summary": "CORS sozlamalari boshqa domenlarga javoblarni o'qishga ruxsat beradi.",
+        "remediation": "Access-Control-Allow-Origin qiymatini ishonchli domenlar ro'yxati bilan cheklang, * ishlatmang."
+    },
+    "zap:10202": {
+        "title": "CSRF tokeni yo'q",
+        "summary": "Formalar CSRF tokenisiz yuboriladi, foydalanuvchi nomidan soxta so'rovlar yuborish mumkin.",
+        "remediation": "Holatni o'zgartiruvchi barcha formalarga tasodifiy CSRF tokenini qo'shing va uni serverda tekshiring."
+    },
+    "zap:10017": {
+        "title": "Boshqa domendagi JavaScript fayllari",
+        "summary": "Sahifa tashqi domenlardan skript yuklaydi, ular o'zgartirilsa sayt ham zararlanadi.",
+        "remediation": "Tashqi skriptlarni faqat ishonchli manbalardan va integrity (SRI) atributi bilan yuklang."
+    },
+    "zap:10023": {
+        "title": "Debug xato xabarlari oshkor bo'lmoqda",
+        "summary": "Javoblarda debug xato xabarlari ko'rinadi, ular ichki tuzilmani oshkor qiladi.",
+        "remediation": "Ishlab chiqarishda debug rejimini o'chiring va umumiy xato sahifalaridan foydalaning."
+    },
+    "zap:90022": {
+        "title": "Ilova xatolari oshkor bo'lmoqda",
+        "summary": "Ilova xato tafsilotlarini (stack trace va h.k.) foydalanuvchiga ko'rsatadi.",
+        "remediation": "Xatolarni server jurnaliga yozing, foydalanuvchiga esa umumiy xabar qaytaring."
+    },
+    "zap:10024": {
+        "title": "URL'da maxfiy ma'lumotlar",
+        "summary": "URL parametrlari orqali parol, token kabi maxfiy ma'lumotlar uzatilmoqda.",
+        "remediation": "Maxfiy qiymatlarni URL o'rniga POST so'rov tanasida yoki sarlavhalarda yuboring."
+    },
+    "zap:10040": {
+        "title": "Aralash kontent",
+        "summary": "HTTPS sahifalari ba'zi resurslarni shifrlanmagan HTTP orqali yuklaydi.",
+        "remediation": "Barcha resurslarni HTTPS orqali yuklang."
+    },
+    "zap:10110": {
+        "title": "Xavfli JavaScript funksiyalari",
+        "summary": "Sahifada eval kabi xavfli JavaScript funksiyalari ishlatilmoqda.",
+        "remediation": "eval, document.write va shunga o'xshash funksiyalardan voz keching, foydalanuvchi ma'lumotini ularga uzatmang."
+    },
+    "zap:10109": {
+        "title": "Zamonaviy veb-ilova",
+        "summary": "Sayt JavaScript orqali yuklanadigan zamonaviy ilova sifatida aniqlandi.",
+        "remediation": "To'liqroq tekshiruv uchun AJAX Spider bilan qayta skanerlang."
+    },
+    "zap:10112": {
+        "title": "Sessiya boshqaruvi aniqlandi",
+        "summary": "Javoblarda sessiya identifikatorlari aniqlandi.",
+        "remediation": "Sessiya identifikatorlari Secure, HttpOnly va SameSite bayroqlari bilan uzatilishini tekshiring."
+    },
+    "nmap:open-port": {
+        "title": "Ochiq portlar",
+        "summary": "Tashqi tarmoqdan kirish mumkin bo'lgan xizmatlar aniqlandi.",
+        "remediation": "Keraksiz xizmatlarni o'chiring va portlarga kirishni firewall orqali cheklang."
+    },
+}
+
+SEVERITY_ORDER = {"high": 0, "medium": 1, "low": 2, "info": 3}
+
+
+def lookup_remediation(finding):
+    """Return the knowledge base entry for a finding, or None if it is not covered."""
+    rule = finding.get('rule') or ''
+    if rule.startswith('nmap:'):
+        return REMEDIATIONS.get(rule)
+
+    plugin_id = str(finding.get('plugin_id') or '')
+    return REMEDIATIONS.get(f"zap:{plugin_id}") if plugin_id else None
+
+
+def split_known_findings(findings):
+    """Split findings into (known, unknown) by whether the knowledge base covers them."""
+    known = []
+    unknown = []
+    for finding in findings:
+        (known if lookup_remediation(finding) else unknown).append(finding)
+    return known, unknown
+
+
+def local_analysis(scan_result, known_findings):
+    """
+    Build an analysis for knowledge base findings without calling the model.
+
+    Args:
+        scan_result: Dict with scan result data (url, severity_counts, security_score)
+        known_findings: Findings covered by the knowledge base
+
+    Returns:
+        Dict with summary and recommendations in the same shape as the model's analysis
+    """
+    ordered = sorted(known_findings, key=lambda finding: SEVERITY_ORDER.get(finding.get('severity'), 4))
+
+    entries = []
+    for finding in ordered:
+        entry = lookup_remediation(finding)
+        if entry not in entries:
+            entries.append(entry)
+
+    counts = scan_result.get('severity_counts') or {}
+    summary = (
+        f"{scan_result.get('url', 'Sayt')} manzilida xavfsizlik bali "
+        f"{scan_result.get('security_score', 0)}/100 (yuqori: {counts.get('high', 0)}, "
+        f"o'rta: {counts.get('medium', 0)}, past: {counts.get('low', 0)})."
+    )
+    if entries:
+        summary += " Asosiy aniqlangan muammolar: " + " ".join(
+            f"{entry['title']} - {entry['summary']}" for entry in entries[:3]
+        )
+
+    return {
+        "summary": summary,
+        "recommendations": [entry['remediation'] for entry in entries[:10]]
+    }
+
+
+def merge_analyses(analysis, local):
+    """Append the knowledge base summary and recommendations to a model analysis."""
+    recommendations = list(analysis.get('recommendations', []))
+    for recommendation in local.get('recommendations', []):
+        if recommendation not in recommendations:
+            recommendations.append(recommendation)
+
+    summary = analysis.get('summary', '')
+    if local.get('summary') and local.get('recommendations'):
+        summary = f"{summary}\n\n{local['summary']}" if summary else local['summary']
+
+    return {"summary": summary, "recommendations": recommendations}
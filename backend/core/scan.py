@@ -1 +1,302 @@
-# nikto/wapiti logic
\ No newline at end of file
+# scanner report parsing
+import hashlib
+import uuid
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+
+def map_zap_risk_to_severity(risk_desc):
+    """Map ZAP risk descriptions to our severity levels."""
+    risk_map = {
+        "High": "high",
+        "Medium": "medium",
+        "Low": "low",
+        "Informational": "info"
+    }
+
+    for risk, severity in risk_map.items():
+        if risk in risk_desc:
+            return severity
+
+    return "low"  # Default to low severity
+
+
+def cvss_to_severity(cvss):
+    """Map a CVSS base score to our severity levels."""
+    try:
+        score = float(cvss)
+    except (TypeError, ValueError):
+        return "low"
+
+    if score >= 7.0:
+        return "high"
+    if score >= 4.0:
+        return "medium"
+    return "low"
+
+
+def _elem_values(table):
+    """Return the <elem key="..."> children of an NSE <table> as a dict."""
+    return {elem.get('key'): (elem.text or '') for elem in table.findall('elem')}
+
+
+def _port_findings(port, host, detected_at):
+    """Build findings for one finished <port> element."""
+    state = port.find('state')
+    if state is None or state.get('state') != 'open':
+        return
+
+    protocol = port.get('protocol', 'tcp')
+    port_id = port.get('portid', '?')
+    location = f"{host}:{port_id}/{protocol}"
+
+    service = port.find('service')
+    service_name = 'unknown'
+    version = ''
+    if service is not None:
+        service_name = service.get('name', 'unknown')
+        version = ' '.join(
+            part for part in (service.get('product'), service.get('version'), service.get('extrainfo')) if part
+        )
+
+    service_label = f"{service_name} {version}".strip()
+
+    yield {
+        "id": str(uuid.uuid4()),
+        "rule": "nmap:open-port",
+        "name": f"Ochiq port {port_id}/{protocol} ({service_name})",
+        "severity": "info",
+        "description": f"{location} portida {service_name} xizmati ishlamoqda"
+                       + (f": {version}" if version else "."),
+        "location": location,
+        "detected_at": detected_at,
+        "status": "open",
+        "remediation": "Keraksiz xizmatlarni o'chiring yoki portga kirishni firewall orqali cheklang.",
+        "references": []
+    }
+
+    # vulners output: <table key="cpe:/..."><table><elem key="id">CVE-...</elem>...</table></table>
+    for script in port.findall('script'):
+        if script.get('id') != 'vulners':
+            continue
+        for cpe_table in script.findall('table'):
+            cpe = cpe_table.get('key', '')
+            for entry in cpe_table.findall('table'):
+                values = _elem_values(entry)
+                vuln_id = values.get('id')
+                if not vuln_id:
+                    continue
+                vuln_type = values.get('type', 'cve')
+                cvss = values.get('cvss', '')
+                exploit = values.get('is_exploit') == 'true'
+                yield {
+                    "id": str(uuid.uuid4()),
+                    "rule": f"nmap:vulners:{vuln_id}",
+                    "name": f"{vuln_id} ({service_label})",
+                    "severity": cvss_to_severity(cvss),
+                    "description": f"{cpe} uchun ma'lum zaiflik {vuln_id}, CVSS: {cvss or 'N/A'}"
+                                   + (". Ochiq exploit mavjud." if exploit else "."),
+                    "location": location,
+                    "detected_at": detected_at,
+                    "status": "open",
+                    "remediation": f"{service_name} xizmatini {vuln_id} tuzatilgan versiyaga yangilang.",
+                    "references": [f"https://vulners.com/{vuln_type}/{vuln_id}"]
+                }
+
+
+def iter_nmap_findings(report):
+    """
+    Stream findings out of an Nmap XML report in constant memory.
+
+    The report is read with iterparse and every <port> and <host> element is
+    cleared as soon as it has been handled, so large multi-host sweeps never
+    build a full DOM.
+
+    Args:
+        report: Path or binary file object of an `nmap -oX` report
+
+    Yields:
+        Vulnerability dicts in the same schema as the ZAP findings: one for each
+        open port (service/version) and one for each vulners script entry
+    """
+    detected_at = datetime.now().isoformat()
+    root = None
+    ports = None
+    host = 'unknown'
+
+    for event, elem in ET.iterparse(report, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+            elif elem.tag == 'host':
+                host = 'unknown'
+            elif elem.tag == 'ports':
+                ports = elem
+            continue
+
+        if elem.tag == 'address' and host == 'unknown':
+            host = elem.get('addr', host)
+        elif elem.tag == 'hostname' and elem.get('type') == 'user':
+            host = elem.get('name', host)
+        elif elem.tag == 'port':
+            yield from _port_findings(elem, host, detected_at)
+            # Detach the finished port so <ports> does not grow with the sweep
+            if ports is not None:
+                ports.remove(elem)
+        elif elem.tag == 'host':
+            # Drop the finished host from the tree so memory stays flat
+            elem.clear()
+            if root is not None:
+                root.clear()
+
+
+def parse_nmap_report(report):
+    """Parse an Nmap XML report into a list of findings (see iter_nmap_findings)."""
+    findings = []
+    try:
+        for finding in iter_nmap_findings(report):
+            findings.append(finding)
+    except ET.ParseError as e:
+        # A truncated report (e.g. Nmap stopped at the deadline) still yields its finished ports
+        print(f"Error parsing Nmap XML report {report}: {str(e)}")
+    return findings
+
+
+def collapse_zap_alerts(alerts, max_instances=20):
+    """
+    Fold a stream of ZAP alert instances into one finding per rule.
+
+    The ZAP API returns one alert per affected URL/parameter. Instances are
+    consumed one at a time and grouped by alertRef (or pluginId), so the long
+    description/solution/reference text is kept once per rule and memory grows
+    with the number of distinct issues rather than the number of hits (plus an
+    8-byte digest per distinct affected URL/parameter for the fingerprint).
+
+    Args:
+        alerts: Iterable of alert dicts from the ZAP API
+        max_instances: Maximum number of example instances kept per finding
+
+    Returns:
+        List of findings in the usual schema plus plugin_id, instances, count and
+        fingerprint
+    """
+    detected_at = datetime.now().isoformat()
+    findings = {}
+    locations = {}
+
+    for alert in alerts:
+        rule = alert.get('alertRef') or alert.get('pluginId') or alert.get('name', 'unknown')
+        finding = findings.get(rule)
+        if finding is None:
+            reference = alert.get('reference', '')
+            finding = findings[rule] = {
+                "id": str(uuid.uuid4()),
+                "rule": f"zap:{rule}",
+                "plugin_id": alert.get('pluginId', ''),
+                "name": alert.get('name') or alert.get('alert', 'Unknown Vulnerability'),
+                "severity": map_zap_risk_to_severity(alert.get('risk', 'Low')),
+                "description": alert.get('description', 'No description available'),
+                "location": alert.get('url', 'Unknown'),
+                "detected_at": detected_at,
+                "status": "open",
+                "remediation": alert.get('solution', 'No remediation available'),
+                "references": reference.split('\n') if reference else [],
+                "instances": [],
+                "count": 0
+            }
+
+        finding['count'] += 1
+        locations.setdefault(rule, set()).add(location_digest(alert.get('url', ''), alert.get('param', '')))
+        if len(finding['instances']) < max_instances:
+            finding['instances'].append({
+                "url": alert.get('url', ''),
+                "method": alert.get('method', ''),
+                "param": alert.get('param', ''),
+                "evidence": alert.get('evidence', '')
+            })
+
+    # ZAP returns alerts in no fixed order, so the fingerprint covers every affected
+    # location, not the first one or the kept examples
+    for rule, finding in findings.items():
+        finding['fingerprint'] = fingerprint_from_digests(finding['rule'], locations[rule])
+
+    return list(findings.values())
+
+
+def location_digest(url, param):
+    """8-byte digest of an affected URL and parameter."""
+    # Query strings carry cache busters and session tokens, so they are not part of the identity
+    path = (url or '').split('?')[0].split('#')[0]
+    return hashlib.sha1(f"{path}|{param or ''}".encode('utf-8')).digest()[:8]
+
+
+def fingerprint_from_digests(rule, digests):
+    """Fingerprint of a rule found at the locations with the given digests, in any order."""
+    return hashlib.sha1(rule.encode('utf-8') + b'|' + b''.join(sorted(digests))).hexdigest()
+
+
+def finding_fingerprint(finding):
+    """
+    Stable identity of a finding across scans: hash of its rule and the set of
+    locations (URL without query string, parameter) it was found at.
+
+    Findings from collapse_zap_alerts() already carry a fingerprint over all of
+    their instances; for other findings it is computed from the instances they
+    hold, or from their location if they have none.
+    """
+    if finding.get('fingerprint'):
+        return finding['fingerprint']
+    rule = finding.get('rule') or finding.get('plugin_id') or finding.get('name', '')
+    instances = finding.get('instances') or [{'url': finding.get('location'), 'param': ''}]
+    digests = {location_digest(instance.get('url'), instance.get('param')) for instance in instances}
+    return fingerprint_from_digests(rule, digests)
+
+
+def diff_findings(findings, previous_findings):
+    """
+    Fingerprint findings and compare them with the previous scan of the same target.
+
+    Every finding gets a fingerprint. Findings that were already present keep the
+    id and detected_at they had in the previous scan, so an issue has a single
+    identity for as long as it stays open.
+
+    Args:
+        findings: Findings of the current scan (updated in place)
+        previous_findings: Findings of the previous scan of the target
+
+    Returns:
+        Dict with the fingerprints of the new and unchanged findings and the
+        fingerprint, name and severity of the fixed ones
+    """
+    previous = {}
+    for finding in previous_findings:
+        previous.setdefault(finding_fingerprint(finding), finding)
+
+    delta = {"new": [], "unchanged": [], "fixed": []}
+    seen = set()
+    for finding in findings:
+        fingerprint = finding_fingerprint(finding)
+        finding['fingerprint'] = fingerprint
+        if fingerprint in seen:
+            # Same issue reported twice in this scan: only the first copy inherits the old id
+            continue
+        seen.add(fingerprint)
+
+        earlier = previous.get(fingerprint)
+        if earlier is None:
+            delta['new'].append(fingerprint)
+            continue
+
+        finding['id'] = earlier.get('id', finding['id'])
+        finding['detected_at'] = earlier.get('detected_at', finding['detected_at'])
+        delta['unchanged'].append(fingerprint)
+
+    for fingerprint, finding in previous.items():
+        if fingerprint not in seen:
+            delta['fixed'].append({
+                "fingerprint": fingerprint,
+                "name": finding.get('name', ''),
+                "severity": finding.get('severity', 'low')
+            })
+
+    return delta
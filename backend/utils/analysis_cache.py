@@ -0,0 +1,189 @@
+# content-addressed cache for AI analyses
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+
+from utils.metrics import cache_lookup
+
+
+def analysis_cache_key(kind, findings, severity_counts, prompt_version, extra=None):
+    """
+    Build a cache key from the content an analysis depends on.
+
+    Per-scan details (finding ids, detection times, the target's URL and query
+    strings) are left out, so the same set of issues always maps to the same key
+    no matter which scan or site produced it.
+
+    Args:
+        kind: Prompt family, e.g. 'full' or 'delta'
+        findings: Findings sent to the model
+        severity_counts: Severity counts of the scan
+        prompt_version: Version of the prompt template
+        extra: Any other JSON-serializable prompt input (e.g. a previous summary)
+
+    Returns:
+        Hex digest identifying the analysis
+    """
+    canonical = sorted(
+        [
+            finding.get('rule') or finding.get('plugin_id') or '',
+            finding.get('name', ''),
+            finding.get('severity', ''),
+            finding.get('description', ''),
+            finding.get('remediation', ''),
+        ]
+        for finding in findings
+    )
+    payload = json.dumps(
+        [kind, prompt_version, canonical, severity_counts or {}, extra],
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(',', ':')
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AnalysisCache:
+    """
+    Two-tier cache for AI analyses.
+
+    A small in-process LRU answers repeat lookups without a network hop; Redis
+    (``<prefix>:<key>`` with a TTL) shares analyses between backend processes and
+    restarts. Concurrent misses for one key are coalesced: inside a process the
+    other threads wait for the first one, and across processes a short Redis lock
+    (``<prefix>:lock:<key>``) makes the others poll for the value instead of
+    calling the API themselves. Without Redis only the local tier is used.
+    """
+
+    def __init__(self, redis_client, prefix='gemini_analysis', ttl=7 * 24 * 3600,
+                 local_size=256, lock_timeout=120, poll_interval=0.2):
+        self.redis = redis_client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.local_size = local_size
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._local = OrderedDict()
+        self._pending = {}
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._local[key] = value
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+    def _local_get(self, key):
+        with self._lock:
+            value = self._local.get(key)
+            if value is not None:
+                self._local.move_to_end(key)
+            return value
+
+    def _redis_get(self, key):
+        try:
+            raw = self.redis.get(f'{self.prefix}:{key}')
+        except redis.RedisError:
+            return None
+        return json.loads(raw) if raw else None
+
+    def _lookup(self, key):
+        value = self._local_get(key)
+        if value is None:
+            value = self._redis_get(key)
+            if value is not None:
+                self._remember(key, value)
+        return value
+
+    def get(self, key):
+        """Return the cached analysis for key, or None (counted as a cache hit or miss)."""
+        value = self._lookup(key)
+        cache_lookup('analysis', value is not None)
+        return value
+
+    def set(self, key, value):
+        """Store an analysis in both tiers."""
+        self._remember(key, value)
+        try:
+            self.redis.set(f'{self.prefix}:{key}', json.dumps(value, ensure_ascii=False), ex=self.ttl)
+        except redis.RedisError as e:
+            print(f"Could not store analysis {key[:12]} in Redis: {str(e)}")
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the analysis for key, calling compute() at most once per key at a time.
+
+        Args:
+            key: Cache key from analysis_cache_key()
+            compute: Callable returning the analysis dict, or None if it failed
+                (failures are not cached)
+
+        Returns:
+            The cached or computed analysis, or None if compute() failed
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            waiter = self._pending.get(key)
+            leader = waiter is None
+            if leader:
+                waiter = self._pending[key] = threading.Event()
+
+        if not leader:
+            # Already counted as a miss above; this re-read is not another lookup
+            waiter.wait()
+            return self._lookup(key)
+
+        try:
+            return self._compute_once(key, compute)
+        finally:
+            with self._lock:
+                del self._pending[key]
+            waiter.set()
+
+    def _compute_once(self, key, compute):
+        lock_key = f'{self.prefix}:lock:{key}'
+        redis_ok = True
+        try:
+            locked = bool(self.redis.set(lock_key, '1', nx=True, ex=self.lock_timeout))
+        except redis.RedisError:
+            locked = redis_ok = False
+
+        if redis_ok and not locked:
+            # Another process is computing this analysis; wait for its result
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(self.poll_interval)
+                value = self._redis_get(key)
+                if value is not None:
+                    self._remember(key, value)
+                    return value
+                try:
+                    if not self.redis.exists(lock_key):
+                        break
+                except redis.RedisError:
+                    break
+
+        try:
+            # The value may have landed between the first lookup and taking the lock
+            value = self._redis_get(key)
+            if value is None:
+                value = compute()
+                if value is not None:
+                    self.set(key, value)
+            else:
+                self._remember(key, value)
+            return value
+        finally:
+            if locked:
+                try:
+                    self.redis.delete(lock_key)
+                except redis.RedisError:
+                    pass
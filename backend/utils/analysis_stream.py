@@ -0,0 +1,112 @@
+# incremental parsing of streamed analyses
+import json
+import re
+
+SUMMARY_START = re.compile(r'"summary"\s*:\s*"')
+RECOMMENDATIONS_START = re.compile(r'"recommendations"\s*:\s*\[')
+
+
+def parse_analysis(content):
+    """Extract the {"summary", "recommendations"} JSON object from a model answer, or None."""
+    start_idx = content.find('{')
+    end_idx = content.rfind('}') + 1
+    if start_idx < 0 or end_idx <= start_idx:
+        return None
+    try:
+        return json.loads(content[start_idx:end_idx])
+    except json.JSONDecodeError:
+        return None
+
+
+def _string_prefix(text, start):
+    """
+    Scan a JSON string body starting at start.
+
+    Returns:
+        (raw, closed): the raw body up to the last complete character and whether
+        the closing quote has been reached
+    """
+    i = start
+    while i < len(text):
+        char = text[i]
+        if char == '"':
+            return text[start:i], True
+        if char == '\\':
+            # Wait for the rest of an escape sequence before decoding it
+            needed = 6 if text[i + 1:i + 2] == 'u' else 2
+            if i + needed > len(text):
+                break
+            i += needed
+            continue
+        i += 1
+    return text[start:i], False
+
+
+def _decode(raw):
+    try:
+        return json.loads(f'"{raw}"')
+    except json.JSONDecodeError:
+        return raw
+
+
+class AnalysisStreamParser:
+    """
+    Pulls the summary and recommendations out of a model answer while it streams in.
+
+    The model is asked for {"summary": "...", "recommendations": ["...", ...]}.
+    feed() is called with each chunk and returns the events that chunk completes:
+    ('summary', text) for every new piece of the summary and
+    ('recommendation', text) for every recommendation whose string has closed.
+    Text outside the JSON object (preambles, code fences) is ignored.
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.summary_start = None
+        self.summary_sent = 0
+        self.summary_done = False
+        self.list_pos = None
+        self.recommendations = []
+
+    def feed(self, chunk):
+        """Add a chunk of the answer and return the new (event, text) pairs."""
+        self.buffer += chunk
+        events = []
+
+        if not self.summary_done:
+            if self.summary_start is None:
+                match = SUMMARY_START.search(self.buffer)
+                if match:
+                    self.summary_start = match.end()
+            if self.summary_start is not None:
+                raw, closed = _string_prefix(self.buffer, self.summary_start)
+                text = _decode(raw)
+                if len(text) > self.summary_sent:
+                    events.append(('summary', text[self.summary_sent:]))
+                    self.summary_sent = len(text)
+                self.summary_done = closed
+
+        if self.list_pos is None:
+            match = RECOMMENDATIONS_START.search(self.buffer)
+            if match:
+                self.list_pos = match.end()
+        while self.list_pos is not None:
+            # Skip separators up to the next string (or the end of the list)
+            rest = self.buffer[self.list_pos:]
+            stripped = rest.lstrip(' \t\r\n,')
+            if not stripped.startswith('"'):
+                break
+            start = self.list_pos + len(rest) - len(stripped) + 1
+            raw, closed = _string_prefix(self.buffer, start)
+            if not closed:
+                break
+            text = _decode(raw)
+            self.recommendations.append(text)
+            events.append(('recommendation', text))
+            self.list_pos = start + len(raw) + 1
+
+        return events
+
+    def result(self):
+        """Return the complete analysis once the stream has ended, or None if it could not be parsed."""
+        return parse_analysis(self.buffer)
@@ -0,0 +1,111 @@
+# scanner report readiness
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+
+# inotify event flags (see inotify(7))
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+EVENT_HEADER = struct.Struct('iIII')
+
+_libc = None
+
+
+def _get_libc():
+    global _libc
+    if _libc is None:
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+            libc.inotify_init1
+            libc.inotify_add_watch
+            _libc = libc
+        except (OSError, AttributeError):
+            _libc = False
+    return _libc
+
+
+def _watch_directory(directory):
+    """Return an inotify fd watching the directory for finished files, or None if unsupported."""
+    libc = _get_libc()
+    if not libc:
+        return None
+
+    fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    if fd < 0:
+        return None
+
+    mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+    if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+        os.close(fd)
+        return None
+
+    return fd
+
+
+def _event_names(data):
+    offset = 0
+    while offset + EVENT_HEADER.size <= len(data):
+        _, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+        offset += EVENT_HEADER.size
+        name = data[offset:offset + length].rstrip(b'\0')
+        offset += length
+        yield os.fsdecode(name), mask
+
+
+def wait_for_artifact(path, timeout):
+    """
+    Wait until a scanner report file has been written.
+
+    Returns immediately if the file already exists or timeout is 0. Otherwise an
+    inotify watch on the report directory wakes us as soon as the file is closed
+    or moved into place, instead of sleep-polling for it.
+
+    Args:
+        path: Absolute path of the expected report
+        timeout: Maximum seconds to wait for the file to appear
+
+    Returns:
+        True if the file exists, False if it did not appear in time
+    """
+    if os.path.exists(path):
+        return True
+    if timeout <= 0:
+        return False
+
+    directory, filename = os.path.split(path)
+    fd = _watch_directory(directory)
+    if fd is None:
+        return os.path.exists(path)
+
+    try:
+        # The file may have appeared between the first check and adding the watch
+        if os.path.exists(path):
+            return True
+
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return os.path.exists(path)
+
+            readable, _, _ = select.select([fd], [], [], remaining)
+            if not readable:
+                continue
+
+            try:
+                data = os.read(fd, 4096)
+            except BlockingIOError:
+                continue
+
+            for name, mask in _event_names(data):
+                if name == filename and mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                    return True
+    finally:
+        os.close(fd)
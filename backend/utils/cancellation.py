@@ -0,0 +1,141 @@
+# cooperative scan cancellation
+import threading
+import time
+
+import redis
+
+
+class ScanCancelled(Exception):
+    """Raised inside a scan once it has been cancelled."""
+
+
+class CancelToken:
+    """
+    Cancellation flag of one running scan.
+
+    Long waits use wait() instead of time.sleep() so they end as soon as the
+    scan is cancelled, and code that blocks elsewhere (a docker exec stream, a
+    spider) registers an on_cancel() callback that interrupts it.
+    """
+
+    def __init__(self, scan_id):
+        self.scan_id = scan_id
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    def is_cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error in cancel callback of scan {self.scan_id}: {str(e)}")
+
+    def wait(self, timeout):
+        """Sleep up to timeout seconds; returns True (early) if the scan was cancelled."""
+        return self._event.wait(timeout)
+
+    def on_cancel(self, callback):
+        """
+        Call callback() when the scan is cancelled (right away if it already is).
+
+        Returns:
+            Function that removes the callback again
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove(callback)
+        callback()
+        return lambda: None
+
+    def _remove(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise ScanCancelled(f"Scan {self.scan_id} was cancelled")
+
+
+class CancelRegistry:
+    """
+    Delivers cancel requests to the process that is running the scan.
+
+    cancel() sets ``<prefix>:<scan_id>`` in Redis and cancels the token directly
+    if the scan runs in this process. A poller thread reads the flags of all
+    scans running here every poll_interval seconds, so a cancel made through
+    another backend process arrives within that time. If Redis is unreachable
+    only cancels made in this process are seen.
+    """
+
+    def __init__(self, redis_client, prefix='scan_cancel', ttl=3600, poll_interval=0.5, retry_interval=30):
+        self.redis = redis_client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()
+        self._tokens = {}
+        self._poller = None
+
+    def _key(self, scan_id):
+        return f'{self.prefix}:{scan_id}'
+
+    def register(self, scan_id):
+        """Return the cancel token of a scan that starts running in this process."""
+        token = CancelToken(scan_id)
+        with self._lock:
+            self._tokens[scan_id] = token
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll, name='scan-cancel', daemon=True)
+                self._poller.start()
+        return token
+
+    def unregister(self, scan_id):
+        with self._lock:
+            self._tokens.pop(scan_id, None)
+
+    def running(self):
+        """Number of scans registered in this process."""
+        with self._lock:
+            return len(self._tokens)
+
+    def cancel(self, scan_id):
+        """Cancel a scan wherever it is running."""
+        try:
+            self.redis.set(self._key(scan_id), 1, ex=self.ttl)
+        except redis.RedisError as e:
+            print(f"Redis unavailable for scan cancellation ({str(e)}), cancelling in this process only")
+        with self._lock:
+            token = self._tokens.get(scan_id)
+        if token is not None:
+            token.cancel()
+
+    def _poll(self):
+        while True:
+            with self._lock:
+                tokens = [token for token in self._tokens.values() if not token.is_cancelled()]
+            if not tokens:
+                time.sleep(self.poll_interval)
+                continue
+            try:
+                flags = self.redis.mget([self._key(token.scan_id) for token in tokens])
+            except redis.RedisError as e:
+                print(f"Cannot read scan cancel flags ({str(e)}), retrying in {self.retry_interval}s")
+                time.sleep(self.retry_interval)
+                continue
+            for token, flag in zip(tokens, flags):
+                if flag is not None:
+                    print(f"Cancel request received for scan {token.scan_id}")
+                    token.cancel()
+            time.sleep(self.poll_interval)
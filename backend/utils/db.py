@@ -1 +1,506 @@
-# init_db function
\ No newline at end of file
+# scan storage
+import base64
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Default location of the embedded database used when MongoDB is not configured
+DEFAULT_SQLITE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'cybershield.db')
+
+# Per-user running aggregates kept next to the scans
+STATS_FIELDS = (
+    'total_scans', 'completed_scans', 'in_progress_scans',
+    'scored_scans', 'score_sum', 'high', 'medium', 'low'
+)
+STATUS_FIELDS = {'completed': 'completed_scans', 'in_progress': 'in_progress_scans'}
+
+# Fields returned for scan results in summary (list view) mode
+RESULT_SUMMARY_FIELDS = ('id', 'scan_id', 'url', 'security_score', 'severity_counts', 'created_at', 'is_analyzed')
+
+
+def encode_cursor(doc):
+    """Opaque keyset cursor pointing just after doc in (created_at, id) DESC order."""
+    key = json.dumps([doc.get('created_at'), doc.get('id')])
+    return base64.urlsafe_b64encode(key.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError for malformed cursors."""
+    try:
+        created_at, scan_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return created_at, scan_id
+
+
+def status_deltas(old_status, new_status):
+    """Counter changes for a scan moving from old_status to new_status (None = no scan)."""
+    deltas = {}
+    if old_status == new_status:
+        return deltas
+    if old_status in STATUS_FIELDS:
+        deltas[STATUS_FIELDS[old_status]] = -1
+    if new_status in STATUS_FIELDS:
+        deltas[STATUS_FIELDS[new_status]] = deltas.get(STATUS_FIELDS[new_status], 0) + 1
+    return deltas
+
+
+def result_deltas(old_result, new_result):
+    """Counter changes for a scan result being replaced (None = no result)."""
+    deltas = {}
+    for sign, result in ((-1, old_result), (1, new_result)):
+        if not result:
+            continue
+        deltas['scored_scans'] = deltas.get('scored_scans', 0) + sign
+        deltas['score_sum'] = deltas.get('score_sum', 0) + sign * (result.get('security_score') or 0)
+        for severity in ('high', 'medium', 'low'):
+            count = (result.get('severity_counts') or {}).get(severity, 0)
+            deltas[severity] = deltas.get(severity, 0) + sign * count
+    return {field: value for field, value in deltas.items() if value}
+
+
+def json_field_sql(field):
+    """
+    SQL for a field of the JSON data column, as a value for json_object().
+
+    json_extract() alone returns objects and arrays as text and true/false as
+    1/0; here they stay JSON, so summaries match what MongoStore returns.
+    """
+    path = f"'$.{field}'"
+    return (
+        f"CASE json_type(data, {path}) "
+        f"WHEN 'true' THEN json('true') WHEN 'false' THEN json('false') "
+        f"WHEN 'object' THEN json(json_extract(data, {path})) WHEN 'array' THEN json(json_extract(data, {path})) "
+        f"ELSE json_extract(data, {path}) END"
+    )
+
+
+def format_user_stats(row):
+    """Turn a user_stats record (or None) into the dict returned by get_user_stats."""
+    row = row or {}
+    return {
+        'total_scans': int(row.get('total_scans', 0)),
+        'completed_scans': int(row.get('completed_scans', 0)),
+        'in_progress_scans': int(row.get('in_progress_scans', 0)),
+        'scored_scans': int(row.get('scored_scans', 0)),
+        'score_sum': row.get('score_sum', 0),
+        'vulnerability_counts': {
+            severity: int(row.get(severity, 0)) for severity in ('high', 'medium', 'low')
+        }
+    }
+
+
+class SQLiteStore:
+    """
+    Embedded scan store backed by SQLite.
+
+    Each record is kept as a JSON document next to the columns we filter and sort
+    on (user_id, url, status, created_at), which are indexed. Used for local
+    development and tests, and whenever MONGODB_URI is not set.
+    """
+
+    def __init__(self, path=DEFAULT_SQLITE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        self._init_schema()
+
+    @property
+    def conn(self):
+        # sqlite3 connections cannot be shared between threads, so keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        has_stats = self.conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'user_stats'"
+        ).fetchone()
+
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS scans (
+                id TEXT PRIMARY KEY,
+                user_id TEXT,
+                url TEXT,
+                status TEXT,
+                created_at TEXT,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_scans_user_id ON scans (user_id, created_at, id);
+            CREATE INDEX IF NOT EXISTS idx_scans_created_at ON scans (created_at, id);
+            CREATE INDEX IF NOT EXISTS idx_scans_url ON scans (url, created_at);
+            CREATE INDEX IF NOT EXISTS idx_scans_status ON scans (status);
+
+            CREATE TABLE IF NOT EXISTS scan_results (
+                scan_id TEXT PRIMARY KEY,
+                created_at TEXT,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_results_created_at ON scan_results (created_at);
+
+            CREATE TABLE IF NOT EXISTS user_stats (
+                user_id TEXT PRIMARY KEY,
+                total_scans INTEGER NOT NULL DEFAULT 0,
+                completed_scans INTEGER NOT NULL DEFAULT 0,
+                in_progress_scans INTEGER NOT NULL DEFAULT 0,
+                scored_scans INTEGER NOT NULL DEFAULT 0,
+                score_sum REAL NOT NULL DEFAULT 0,
+                high INTEGER NOT NULL DEFAULT 0,
+                medium INTEGER NOT NULL DEFAULT 0,
+                low INTEGER NOT NULL DEFAULT 0
+            );
+        """)
+
+        if not has_stats:
+            self.rebuild_user_stats()
+
+    @contextmanager
+    def _transaction(self):
+        conn = self.conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _bump_stats(self, conn, user_id, deltas):
+        if user_id is None or not deltas:
+            return
+        conn.execute('INSERT OR IGNORE INTO user_stats (user_id) VALUES (?)', (user_id,))
+        assignments = ', '.join(f'{field} = {field} + ?' for field in deltas)
+        conn.execute(
+            f'UPDATE user_stats SET {assignments} WHERE user_id = ?',
+            list(deltas.values()) + [user_id]
+        )
+
+    def _scan_user(self, conn, scan_id):
+        row = conn.execute('SELECT user_id FROM scans WHERE id = ?', (scan_id,)).fetchone()
+        return row[0] if row else None
+
+    def _update(self, conn, table, key_column, key, fields, columns, unless=None):
+        """
+        Merge fields into a JSON record and return (old, new), or (None, None) if missing.
+
+        unless maps field names to values; if the record's current value of any
+        of them is among those values, nothing is written and (old, None) is returned.
+        """
+        row = conn.execute(f'SELECT data FROM {table} WHERE {key_column} = ?', (key,)).fetchone()
+        if row is None:
+            return None, None
+        old = json.loads(row[0])
+        if unless and any(old.get(field) in values for field, values in unless.items()):
+            return old, None
+        doc = dict(old, **fields)
+        assignments = ', '.join(f'{column} = ?' for column in columns)
+        conn.execute(
+            f'UPDATE {table} SET {assignments}, data = ? WHERE {key_column} = ?',
+            [doc.get(column) for column in columns] + [json.dumps(doc), key]
+        )
+        return old, doc
+
+    # Scans
+
+    def insert_scan(self, scan):
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO scans (id, user_id, url, status, created_at, data) VALUES (?, ?, ?, ?, ?, ?)',
+                (scan['id'], scan.get('user_id'), scan.get('url'), scan.get('status'),
+                 scan.get('created_at'), json.dumps(scan))
+            )
+            if cursor.rowcount:
+                deltas = status_deltas(None, scan.get('status'))
+                deltas['total_scans'] = 1
+                self._bump_stats(conn, scan.get('user_id'), deltas)
+
+    def get_scan(self, scan_id):
+        row = self.conn.execute('SELECT data FROM scans WHERE id = ?', (scan_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update_scan(self, scan_id, unless=None, **fields):
+        """
+        Merge fields into a scan and return the updated scan.
+
+        unless works as in update_result(), e.g. {'status': ('cancelled',)}.
+
+        Returns:
+            The updated scan, or None if it does not exist or unless matched
+        """
+        with self._transaction() as conn:
+            old, doc = self._update(conn, 'scans', 'id', scan_id, fields, ('user_id', 'url', 'status', 'created_at'), unless)
+            if doc is not None:
+                self._bump_stats(conn, doc.get('user_id'), status_deltas(old.get('status'), doc.get('status')))
+        return doc
+
+    def list_scans(self, user_id=None, url=None, status=None, limit=None, before=None):
+        """
+        Return scans matching the filters, newest first.
+
+        before is a (created_at, id) key from decode_cursor; only scans after it in
+        (created_at, id) DESC order are returned, so pages are read from the index.
+        """
+        clauses = []
+        params = []
+        for column, value in (('user_id', user_id), ('url', url), ('status', status)):
+            if value is not None:
+                clauses.append(f'{column} = ?')
+                params.append(value)
+        if before is not None:
+            clauses.append('(created_at < ? OR (created_at = ? AND id < ?))')
+            params.extend([before[0], before[0], before[1]])
+
+        query = 'SELECT data FROM scans'
+        if clauses:
+            query += ' WHERE ' + ' AND '.join(clauses)
+        query += ' ORDER BY created_at DESC, id DESC'
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(int(limit))
+
+        return [json.loads(row[0]) for row in self.conn.execute(query, params)]
+
+    # Scan results
+
+    def save_result(self, result):
+        with self._transaction() as conn:
+            row = conn.execute('SELECT data FROM scan_results WHERE scan_id = ?', (result['scan_id'],)).fetchone()
+            conn.execute(
+                'INSERT OR REPLACE INTO scan_results (scan_id, created_at, data) VALUES (?, ?, ?)',
+                (result['scan_id'], result.get('created_at'), json.dumps(result))
+            )
+            old = json.loads(row[0]) if row else None
+            self._bump_stats(conn, self._scan_user(conn, result['scan_id']), result_deltas(old, result))
+
+    def get_result(self, scan_id):
+        row = self.conn.execute('SELECT data FROM scan_results WHERE scan_id = ?', (scan_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update_result(self, scan_id, unless=None, **fields):
+        """
+        Merge fields into a scan result and return it.
+
+        With unless ({field: values}) the update only happens if none of those
+        fields currently holds one of its values, so it can claim a state.
+
+        Returns:
+            The updated result, or None if it does not exist or unless matched
+        """
+        with self._transaction() as conn:
+            old, doc = self._update(conn, 'scan_results', 'scan_id', scan_id, fields, ('created_at',), unless)
+            if doc is not None:
+                self._bump_stats(conn, self._scan_user(conn, scan_id), result_deltas(old, doc))
+        return doc
+
+    def get_results(self, scan_ids, summary=False):
+        """
+        Return the results for the given scan IDs, newest first.
+
+        With summary=True only RESULT_SUMMARY_FIELDS are extracted (inside SQLite),
+        so list views never decode the vulnerability arrays.
+        """
+        scan_ids = list(scan_ids)
+        if summary:
+            columns = 'json_object({})'.format(', '.join(
+                f"'{field}', {json_field_sql(field)}" for field in RESULT_SUMMARY_FIELDS
+            ))
+        else:
+            columns = 'data'
+
+        results = []
+        # Stay under SQLite's bound-parameter limit
+        for i in range(0, len(scan_ids), 500):
+            chunk = scan_ids[i:i + 500]
+            placeholders = ', '.join('?' for _ in chunk)
+            results.extend(
+                json.loads(row[0]) for row in self.conn.execute(
+                    f'SELECT {columns} FROM scan_results WHERE scan_id IN ({placeholders})', chunk
+                )
+            )
+        results.sort(key=lambda x: x.get('created_at') or '', reverse=True)
+        return results
+
+    def latest_results(self, limit, summary=False):
+        rows = self.conn.execute(
+            'SELECT scan_id FROM scan_results ORDER BY created_at DESC LIMIT ?', (int(limit),)
+        )
+        return self.get_results([row[0] for row in rows], summary=summary)
+
+    # Per-user aggregates
+
+    def get_user_stats(self, user_id):
+        row = self.conn.execute(
+            f'SELECT {", ".join(STATS_FIELDS)} FROM user_stats WHERE user_id = ?', (user_id,)
+        ).fetchone()
+        return format_user_stats(dict(zip(STATS_FIELDS, row)) if row else None)
+
+    def rebuild_user_stats(self):
+        """Recompute every user's aggregates from the stored scans and results."""
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM user_stats')
+            for user_id, status in conn.execute('SELECT user_id, status FROM scans').fetchall():
+                deltas = status_deltas(None, status)
+                deltas['total_scans'] = 1
+                self._bump_stats(conn, user_id, deltas)
+            rows = conn.execute(
+                'SELECT scans.user_id, scan_results.data FROM scan_results '
+                'JOIN scans ON scans.id = scan_results.scan_id'
+            ).fetchall()
+            for user_id, data in rows:
+                self._bump_stats(conn, user_id, result_deltas(None, json.loads(data)))
+
+
+class MongoStore:
+    """Scan store backed by the MongoDB service from docker-compose (MONGODB_URI)."""
+
+    def __init__(self, uri):
+        from pymongo import MongoClient, ASCENDING, DESCENDING
+
+        self.client = MongoClient(uri)
+        self.db = self.client.get_default_database('cybershield')
+        self.scans = self.db['scans']
+        self.scan_results = self.db['scan_results']
+        self.user_stats = self.db['user_stats']
+        self._desc = DESCENDING
+
+        self.scans.create_index([('user_id', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)])
+        self.scans.create_index([('created_at', DESCENDING), ('_id', DESCENDING)])
+        self.scans.create_index([('url', ASCENDING), ('created_at', DESCENDING)])
+        self.scans.create_index([('status', ASCENDING)])
+        self.scan_results.create_index([('created_at', DESCENDING)])
+
+        if self.user_stats.estimated_document_count() == 0 and self.scans.estimated_document_count() > 0:
+            self.rebuild_user_stats()
+
+    @staticmethod
+    def _doc(doc):
+        if doc is not None:
+            doc.pop('_id', None)
+        return doc
+
+    @staticmethod
+    def _unless_filter(key, unless):
+        """Filter matching the document key unless a field holds one of the given values (see SQLiteStore._update)."""
+        query = {'_id': key}
+        for field, values in (unless or {}).items():
+            query[field] = {'$nin': list(values)}
+        return query
+
+    def _bump_stats(self, user_id, deltas):
+        if user_id is None or not deltas:
+            return
+        self.user_stats.update_one({'_id': user_id}, {'$inc': deltas}, upsert=True)
+
+    def _scan_user(self, scan_id):
+        scan = self.scans.find_one({'_id': scan_id}, {'user_id': 1})
+        return scan.get('user_id') if scan else None
+
+    # Scans
+
+    def insert_scan(self, scan):
+        outcome = self.scans.update_one({'_id': scan['id']}, {'$setOnInsert': dict(scan)}, upsert=True)
+        if outcome.upserted_id is not None:
+            deltas = status_deltas(None, scan.get('status'))
+            deltas['total_scans'] = 1
+            self._bump_stats(scan.get('user_id'), deltas)
+
+    def get_scan(self, scan_id):
+        return self._doc(self.scans.find_one({'_id': scan_id}))
+
+    def update_scan(self, scan_id, unless=None, **fields):
+        old = self._doc(self.scans.find_one_and_update(self._unless_filter(scan_id, unless), {'$set': fields}))
+        if old is None:
+            return None
+        doc = dict(old, **fields)
+        self._bump_stats(doc.get('user_id'), status_deltas(old.get('status'), doc.get('status')))
+        return doc
+
+    def list_scans(self, user_id=None, url=None, status=None, limit=None, before=None):
+        query = {}
+        for field, value in (('user_id', user_id), ('url', url), ('status', status)):
+            if value is not None:
+                query[field] = value
+        if before is not None:
+            query['$or'] = [
+                {'created_at': {'$lt': before[0]}},
+                {'created_at': before[0], '_id': {'$lt': before[1]}}
+            ]
+        cursor = self.scans.find(query).sort([('created_at', self._desc), ('_id', self._desc)])
+        if limit is not None:
+            cursor = cursor.limit(int(limit))
+        return [self._doc(doc) for doc in cursor]
+
+    # Scan results
+
+    def save_result(self, result):
+        old = self._doc(self.scan_results.find_one_and_replace(
+            {'_id': result['scan_id']}, dict(result), upsert=True
+        ))
+        self._bump_stats(self._scan_user(result['scan_id']), result_deltas(old, result))
+
+    def get_result(self, scan_id):
+        return self._doc(self.scan_results.find_one({'_id': scan_id}))
+
+    def update_result(self, scan_id, unless=None, **fields):
+        old = self._doc(self.scan_results.find_one_and_update(self._unless_filter(scan_id, unless), {'$set': fields}))
+        if old is None:
+            return None
+        doc = dict(old, **fields)
+        deltas = result_deltas(old, doc)
+        if deltas:
+            self._bump_stats(self._scan_user(scan_id), deltas)
+        return doc
+
+    def get_results(self, scan_ids, summary=False):
+        projection = {field: 1 for field in RESULT_SUMMARY_FIELDS} if summary else None
+        cursor = self.scan_results.find({'_id': {'$in': list(scan_ids)}}, projection).sort('created_at', self._desc)
+        return [self._doc(doc) for doc in cursor]
+
+    def latest_results(self, limit, summary=False):
+        projection = {field: 1 for field in RESULT_SUMMARY_FIELDS} if summary else None
+        cursor = self.scan_results.find({}, projection).sort('created_at', self._desc).limit(int(limit))
+        return [self._doc(doc) for doc in cursor]
+
+    # Per-user aggregates
+
+    def get_user_stats(self, user_id):
+        return format_user_stats(self.user_stats.find_one({'_id': user_id}))
+
+    def rebuild_user_stats(self):
+        """Recompute every user's aggregates from the stored scans and results."""
+        self.user_stats.delete_many({})
+        for scan in self.scans.find({}, {'user_id': 1, 'status': 1}):
+            deltas = status_deltas(None, scan.get('status'))
+            deltas['total_scans'] = 1
+            self._bump_stats(scan.get('user_id'), deltas)
+            result = self.scan_results.find_one({'_id': scan['_id']}, {'security_score': 1, 'severity_counts': 1})
+            self._bump_stats(scan.get('user_id'), result_deltas(None, result))
+
+
+def init_db():
+    """
+    Create the scan store.
+
+    DB_BACKEND selects 'mongo' or 'sqlite'. By default MongoDB is used when
+    MONGODB_URI is set and the embedded SQLite database (SQLITE_PATH) otherwise.
+    """
+    backend = os.getenv('DB_BACKEND', 'mongo' if os.getenv('MONGODB_URI') else 'sqlite').lower()
+
+    if backend == 'mongo':
+        uri = os.getenv('MONGODB_URI', 'mongodb://mongo:27017/cybershield')
+        print(f"Using MongoDB scan store at {uri}")
+        return MongoStore(uri)
+
+    path = os.getenv('SQLITE_PATH', DEFAULT_SQLITE_PATH)
+    print(f"Using SQLite scan store at {path}")
+    return SQLiteStore(path)
+
+
+# Shared store used by all blueprints
+store = init_db()
@@ -0,0 +1,174 @@
+# docker engine api exec layer
+import os
+import threading
+
+import docker
+from docker.errors import DockerException
+
+# Runs the command under sh so its PID inside the container is printed first;
+# exec keeps that PID, so the command can be killed later
+PID_WRAPPER = ['sh', '-c', 'echo "$$"; exec "$@"', 'sh']
+
+
+class ScannerExecError(Exception):
+    """Raised when an exec cannot be created or started in a scanner container."""
+
+
+class ScannerExecutor:
+    """
+    Runs commands inside the scanner containers through the Docker Engine API.
+
+    A single APIClient (one pooled HTTP session over /var/run/docker.sock) is
+    created on first use and shared by every scan, so running a scanner no longer
+    forks the docker CLI or opens a new socket connection per command.
+    """
+
+    def __init__(self, base_url=None):
+        self.base_url = base_url or os.getenv('DOCKER_HOST', 'unix:///var/run/docker.sock')
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    try:
+                        # No socket timeout: long silent execs are bounded by run()'s own timeout
+                        self._client = docker.APIClient(base_url=self.base_url, timeout=None)
+                    except DockerException as e:
+                        raise ScannerExecError(f"Cannot connect to Docker Engine at {self.base_url}: {str(e)}")
+        return self._client
+
+    def run(self, container, cmd, timeout, on_output=None, cancel_token=None):
+        """
+        Run a command in a container and stream its output as it is produced.
+
+        When the timeout expires or cancel_token is cancelled, the output stream
+        is closed and the command and its child processes are killed inside the
+        container, so they stop using the scanner.
+
+        Args:
+            container: Container name or ID
+            cmd: Command as a list of arguments
+            timeout: Seconds after which the command is stopped
+            on_output: Optional callback(stream_name, text) called for every
+                stdout/stderr chunk as it arrives
+            cancel_token: Optional CancelToken of the scan the command belongs to
+
+        Returns:
+            Dict with exit_code (None if it did not exit), stdout, stderr, timed_out
+            and cancelled
+        """
+        try:
+            exec_id = self.client.exec_create(container, PID_WRAPPER + list(cmd), stdout=True, stderr=True)['Id']
+            stream = self.client.exec_start(exec_id, stream=True, demux=True)
+        except DockerException as e:
+            raise ScannerExecError(f"Exec in {container} failed: {str(e)}")
+
+        stdout_chunks = []
+        stderr_chunks = []
+
+        def collect(name, chunk, chunks):
+            if not chunk:
+                return
+            text = chunk.decode('utf-8', errors='ignore') if isinstance(chunk, bytes) else chunk
+            chunks.append(text)
+            if on_output:
+                on_output(name, text)
+
+        state = {'pid': None, 'reason': None}
+        stop_lock = threading.Lock()
+
+        def stop(reason):
+            with stop_lock:
+                if state['reason'] is not None:
+                    return
+                state['reason'] = reason
+                pid = state['pid']
+            # Closing the stream unblocks the reads below
+            stream.close()
+            if pid is not None:
+                self.kill(container, pid)
+
+        # Armed before the first read, so a command that never prints its PID is stopped too
+        timer = threading.Timer(max(0, timeout), stop, args=('timeout',))
+        timer.daemon = True
+        timer.start()
+        remove_cancel_callback = cancel_token.on_cancel(lambda: stop('cancel')) if cancel_token else None
+
+        # The wrapper's first stdout line is the PID; sh prints it before anything else runs
+        header = ''
+        try:
+            while state['pid'] is None and state['reason'] is None:
+                out, err = next(stream)
+                collect('stderr', err, stderr_chunks)
+                if out:
+                    header += out.decode('utf-8', errors='ignore')
+                    if '\n' in header:
+                        line, rest = header.split('\n', 1)
+                        with stop_lock:
+                            if line.strip().isdigit():
+                                state['pid'] = int(line.strip())
+                            stopped_early = state['reason'] is not None
+                        collect('stdout', rest, stdout_chunks)
+                        if stopped_early and state['pid'] is not None:
+                            # Stopped while the PID was on its way; stop() could not kill it
+                            self.kill(container, state['pid'])
+                        break
+        except StopIteration:
+            pass
+        except Exception as e:
+            if state['reason'] is None:
+                print(f"Error reading exec output from {container}: {str(e)}")
+
+        try:
+            for out, err in stream:
+                collect('stdout', out, stdout_chunks)
+                collect('stderr', err, stderr_chunks)
+        except Exception as e:
+            if state['reason'] is None:
+                print(f"Error reading exec output from {container}: {str(e)}")
+        finally:
+            timer.cancel()
+            if remove_cancel_callback:
+                remove_cancel_callback()
+            stream.close()
+
+        exit_code = None
+        try:
+            info = self.client.exec_inspect(exec_id)
+            if not info.get('Running'):
+                exit_code = info.get('ExitCode')
+        except DockerException as e:
+            print(f"Error inspecting exec in {container}: {str(e)}")
+
+        return {
+            'exit_code': exit_code,
+            'stdout': ''.join(stdout_chunks),
+            'stderr': ''.join(stderr_chunks),
+            'timed_out': state['reason'] == 'timeout',
+            'cancelled': state['reason'] == 'cancel'
+        }
+
+    def kill(self, container, pid, grace=1):
+        """
+        Stop a process started by run() and its children inside a container.
+
+        Sends SIGTERM, then SIGKILL after grace seconds. The kill runs as a
+        detached exec, so this returns immediately.
+        """
+        script = (
+            f'pkill -TERM -P {pid} 2>/dev/null; kill -TERM {pid} 2>/dev/null; '
+            f'sleep {grace}; pkill -KILL -P {pid} 2>/dev/null; kill -KILL {pid} 2>/dev/null; true'
+        )
+        try:
+            exec_id = self.client.exec_create(container, ['sh', '-c', script])['Id']
+            self.client.exec_start(exec_id, detach=True)
+            print(f"Killing process {pid} in {container}")
+        except DockerException as e:
+            print(f"Error killing process {pid} in {container}: {str(e)}")
+
+
+# Shared executor for the scanner containers
+scanner_exec = ScannerExecutor()
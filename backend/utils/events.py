@@ -0,0 +1,159 @@
+# scan progress events
+import json
+import queue
+import threading
+import time
+
+import redis
+
+# Events after which nothing more is published for a scan
+FINAL_EVENTS = ('done', 'failed', 'cancelled')
+
+
+def sse_event(event, data):
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class ScanEvents:
+    """
+    Publish/subscribe hub for scan progress events.
+
+    Events are published on the Redis channel ``<prefix>:<scan_id>`` so that a
+    scan running in one backend process reaches event streams served by any
+    other. Each process holds a single pattern subscription (started with the
+    first subscriber) and fans the messages out to in-process queues, so open
+    streams do not each need a Redis connection. The latest 'stage' event of
+    every stage is also kept in the hash ``<prefix>:stages:<scan_id>`` for
+    clients that connect while the scan is running.
+
+    If Redis is unreachable, events are delivered to subscribers in this process
+    only, and Redis is not tried again for retry_interval seconds.
+    """
+
+    def __init__(self, redis_client, prefix='scan_events', stages_ttl=3600, retry_interval=30, subscribe_timeout=2):
+        self.redis = redis_client
+        self.prefix = prefix
+        self.stages_ttl = stages_ttl
+        self.retry_interval = retry_interval
+        self.subscribe_timeout = subscribe_timeout
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._stages = {}
+        self._listener = None
+        # Set while the pattern subscription is confirmed by Redis
+        self._listening = threading.Event()
+        self._redis_down_until = 0
+        self._no_wait_until = 0
+
+    def _redis_available(self):
+        return time.monotonic() >= self._redis_down_until
+
+    def _redis_failed(self, e):
+        print(f"Redis unavailable for scan events ({str(e)}), delivering them in this process only")
+        self._redis_down_until = time.monotonic() + self.retry_interval
+
+    def publish(self, scan_id, event, data=None):
+        """Send an event to everyone watching scan_id."""
+        data = data or {}
+        message = json.dumps({'scan_id': scan_id, 'event': event, 'data': data}, ensure_ascii=False)
+        stage = data.get('stage') if event == 'stage' else None
+        if self._redis_available():
+            try:
+                pipe = self.redis.pipeline()
+                stages_key = f'{self.prefix}:stages:{scan_id}'
+                if stage:
+                    pipe.hset(stages_key, stage, message)
+                    pipe.expire(stages_key, self.stages_ttl)
+                elif event in FINAL_EVENTS:
+                    pipe.delete(stages_key)
+                pipe.publish(f'{self.prefix}:{scan_id}', message)
+                pipe.execute()
+                return
+            except redis.RedisError as e:
+                self._redis_failed(e)
+        with self._lock:
+            if stage:
+                self._stages.setdefault(scan_id, {})[stage] = message
+            elif event in FINAL_EVENTS:
+                self._stages.pop(scan_id, None)
+        self._dispatch(scan_id, message)
+
+    def stage_events(self, scan_id):
+        """Return the latest 'stage' event data of each stage of scan_id, keyed by stage."""
+        messages = None
+        if self._redis_available():
+            try:
+                messages = [
+                    message.decode('utf-8')
+                    for message in self.redis.hgetall(f'{self.prefix}:stages:{scan_id}').values()
+                ]
+            except redis.RedisError as e:
+                self._redis_failed(e)
+        if not messages:
+            with self._lock:
+                messages = list(self._stages.get(scan_id, {}).values())
+        return {payload['data']['stage']: payload['data'] for payload in map(json.loads, messages)}
+
+    def subscribe(self, scan_id):
+        """
+        Return a queue that receives (event, data) tuples for scan_id; pass it to unsubscribe() when done.
+
+        Waits (up to subscribe_timeout seconds) until the process's Redis
+        subscription is confirmed, so every event published after this returns
+        is delivered.
+        """
+        self._ensure_listener()
+        events = queue.Queue()
+        with self._lock:
+            self._subscribers.setdefault(scan_id, set()).add(events)
+        if self._redis_available() and time.monotonic() >= self._no_wait_until:
+            if not self._listening.wait(self.subscribe_timeout):
+                # Do not hold up every new stream while the subscription is failing
+                print(f"Scan event subscription not confirmed within {self.subscribe_timeout}s")
+                self._no_wait_until = time.monotonic() + self.retry_interval
+        return events
+
+    def unsubscribe(self, scan_id, events):
+        with self._lock:
+            subscribers = self._subscribers.get(scan_id)
+            if subscribers is not None:
+                subscribers.discard(events)
+                if not subscribers:
+                    del self._subscribers[scan_id]
+
+    def _dispatch(self, scan_id, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(scan_id, ()))
+        if not subscribers:
+            return
+        payload = json.loads(message)
+        for events in subscribers:
+            events.put((payload['event'], payload['data']))
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='scan-events', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        channel_prefix = f'{self.prefix}:'
+        while True:
+            try:
+                pubsub = self.redis.pubsub()
+                # The stage hashes share the prefix but are never published to
+                pubsub.psubscribe(f'{self.prefix}:*')
+                for message in pubsub.listen():
+                    if message['type'] == 'psubscribe':
+                        self._listening.set()
+                    if message['type'] != 'pmessage':
+                        continue
+                    channel = message['channel'].decode('utf-8')
+                    data = message['data']
+                    self._dispatch(channel[len(channel_prefix):], data.decode('utf-8') if isinstance(data, bytes) else data)
+            except redis.RedisError as e:
+                self._listening.clear()
+                print(f"Scan event subscription lost ({str(e)}), retrying in {self.retry_interval}s")
+                self._redis_failed(e)
+                time.sleep(self.retry_interval)
@@ -0,0 +1,110 @@
+# report export artifact cache
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Result fields that change while a result is being processed but never show up in an export
+VOLATILE_RESULT_FIELDS = ('analysis_status', 'analysis_error')
+
+# Marks files that are still being rendered
+TEMP_MARKER = '.tmp.'
+
+
+def result_version(result):
+    """Content hash of a scan result; changes whenever anything an export shows changes."""
+    content = {key: value for key, value in result.items() if key not in VOLATILE_RESULT_FIELDS}
+    payload = json.dumps(content, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+class ExportCache:
+    """
+    Rendered report exports on disk, one file per (scan ID, result version, format).
+
+    Files are named ``<scan_id>-<version>-<format>.<ext>`` where ext is the type
+    that was actually produced (a PDF request can fall back to HTML or JSON).
+    Because the version is a hash of the result, a cached file is never stale:
+    older versions are simply left for eviction, which drops files older than
+    max_age and then the least recently used ones until the directory is below
+    max_bytes.
+    """
+
+    def __init__(self, directory, max_bytes=500 * 1024 * 1024, max_age=7 * 24 * 3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _prefix(self, scan_id, version, format_type):
+        return os.path.join(self.directory, f"{scan_id}-{version}-{format_type}")
+
+    def lookup(self, scan_id, version, format_type):
+        """Return the path of a cached export, or None."""
+        for path in glob.glob(glob.escape(self._prefix(scan_id, version, format_type)) + '.*'):
+            if TEMP_MARKER in os.path.basename(path):
+                continue
+            try:
+                # Mark as recently used for eviction
+                os.utime(path)
+            except OSError:
+                continue
+            return path
+        return None
+
+    def add(self, scan_id, version, format_type, rendered_path):
+        """
+        Move a freshly rendered file into the cache and return its cached path.
+
+        Args:
+            scan_id: Scan ID
+            version: result_version() of the rendered result
+            format_type: Requested format (pdf, html or json)
+            rendered_path: Path of the rendered file (removed by the move)
+        """
+        extension = os.path.splitext(rendered_path)[1] or f'.{format_type}'
+        path = self._prefix(scan_id, version, format_type) + extension
+        # Atomic on the same filesystem, so readers never see a partial file
+        os.replace(rendered_path, path)
+        self.evict()
+        return path
+
+    def temp_path(self, scan_id, format_type):
+        """Path to render a new export to before add()."""
+        return os.path.join(
+            self.directory, f"{scan_id}-{os.getpid()}-{threading.get_ident()}{TEMP_MARKER}{format_type}"
+        )
+
+    def evict(self):
+        """Remove expired exports, then least recently used ones until under max_bytes."""
+        with self._lock:
+            now = time.time()
+            entries = []
+            for entry in os.scandir(self.directory):
+                if not entry.is_file():
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                if now - stat.st_mtime > self.max_age:
+                    self._remove(entry.path)
+                elif TEMP_MARKER not in entry.name:
+                    # Renders in progress only expire by age
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"Could not remove cached export {path}: {str(e)}")
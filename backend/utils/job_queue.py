@@ -0,0 +1,163 @@
+# redis job queue
+import json
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+import traceback
+
+import redis
+
+
+class JobQueue:
+    """
+    Durable job queue backed by a Redis list and drained by a fixed-size worker pool.
+
+    Jobs are pushed onto ``<name>:pending``. A worker atomically moves a job into this
+    host's ``<name>:processing:<hostname>`` list while it runs it and removes it when the
+    handler returns, so jobs that were queued or running when the backend stopped are
+    picked up again on the next start. If Redis is unreachable the queue falls back to
+    an in-process queue with the same worker pool (jobs are then not durable); jobs
+    that cannot be pushed to Redis later on go to that in-process queue as well and
+    are run by the Redis workers.
+    """
+
+    def __init__(self, name, handler, redis_client, workers=2, poll_timeout=5):
+        self.name = name
+        self.handler = handler
+        self.redis = redis_client
+        self.workers = max(1, int(workers))
+        self.poll_timeout = poll_timeout
+        self.pending_key = f'{name}:pending'
+        self.processing_key = f'{name}:processing:{socket.gethostname()}'
+        self.local_queue = None
+        # Jobs that could not be pushed to Redis, run by whichever workers this process has
+        self.overflow = queue.Queue()
+        self.threads = []
+        self.stopping = threading.Event()
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Recover unfinished jobs and start the worker threads (once)."""
+        with self._start_lock:
+            if not self.threads:
+                self._start()
+
+    def _start(self):
+        try:
+            self.redis.ping()
+            recovered = 0
+            while self.redis.lmove(self.processing_key, self.pending_key, 'LEFT', 'RIGHT'):
+                recovered += 1
+            if recovered:
+                print(f"Requeued {recovered} unfinished job(s) from {self.processing_key}")
+            target = self._redis_worker
+        except redis.RedisError as e:
+            print(f"WARNING: Redis unavailable ({str(e)}), {self.name} jobs will not survive a restart")
+            self.local_queue = self.overflow
+            target = self._local_worker
+
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=target,
+                name=f'{self.name}-worker-{i + 1}',
+                daemon=True
+            )
+            thread.start()
+            self.threads.append(thread)
+
+        print(f"Started {self.workers} worker(s) for {self.name}")
+
+    def stop(self):
+        """Ask the workers to exit after their current job."""
+        self.stopping.set()
+
+    def enqueue(self, job):
+        """Add a job (a JSON-serialisable dict) to the end of the queue."""
+        if self.local_queue is not None:
+            self.local_queue.put(job)
+            return
+
+        try:
+            self.redis.lpush(self.pending_key, json.dumps(job))
+        except redis.RedisError as e:
+            print(f"Error enqueueing job on {self.pending_key} ({str(e)}), running it from this process")
+            self.overflow.put(job)
+
+    def depth(self):
+        """Number of jobs waiting to be picked up by a worker."""
+        if self.local_queue is not None:
+            return self.local_queue.qsize()
+        try:
+            return self.redis.llen(self.pending_key) + self.overflow.qsize()
+        except redis.RedisError:
+            return self.overflow.qsize()
+
+    def _run(self, job):
+        try:
+            self.handler(job)
+        except Exception as e:
+            print(f"Error running {self.name} job: {str(e)}")
+            traceback.print_exc(file=sys.stdout)
+
+    def _run_overflow(self, timeout=None):
+        """Run one job from the overflow queue; returns False if none came within timeout."""
+        try:
+            job = self.overflow.get(timeout=timeout) if timeout else self.overflow.get_nowait()
+        except queue.Empty:
+            return False
+        try:
+            self._run(job)
+        finally:
+            self.overflow.task_done()
+        return True
+
+    def _redis_worker(self):
+        while not self.stopping.is_set():
+            if self._run_overflow():
+                continue
+            try:
+                raw = self.redis.blmove(
+                    self.pending_key, self.processing_key,
+                    self.poll_timeout, 'RIGHT', 'LEFT'
+                )
+            except redis.RedisError as e:
+                print(f"Error reading from {self.pending_key}: {str(e)}")
+                # Keep running jobs that could not be pushed while Redis is away
+                self._run_overflow(self.poll_timeout)
+                continue
+
+            if raw is None:
+                continue
+
+            try:
+                self._run(json.loads(raw))
+            except ValueError as e:
+                print(f"Dropping malformed job on {self.pending_key}: {str(e)}")
+            finally:
+                try:
+                    self.redis.lrem(self.processing_key, 1, raw)
+                except redis.RedisError as e:
+                    print(f"Error acknowledging job on {self.processing_key}: {str(e)}")
+
+    def _local_worker(self):
+        while not self.stopping.is_set():
+            try:
+                job = self.local_queue.get(timeout=self.poll_timeout)
+            except queue.Empty:
+                continue
+            try:
+                self._run(job)
+            finally:
+                self.local_queue.task_done()
+
+
+def create_redis_client():
+    """Create a Redis client from the REDIS_HOST/REDIS_PORT environment variables."""
+    return redis.Redis(
+        host=os.getenv('REDIS_HOST', 'redis'),
+        port=int(os.getenv('REDIS_PORT', 6379)),
+        db=0
+    )
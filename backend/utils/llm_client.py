@@ -0,0 +1,229 @@
+# shared llm client
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+# Errors worth retrying: rate limits, overload and transient server failures
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+)
+
+
+class LLMError(Exception):
+    """Raised when the model could not produce an answer."""
+
+
+class LLMTimeout(LLMError):
+    """Raised when a model call did not finish within the request timeout."""
+
+
+class GeminiBackend:
+    """Gemini API backend sharing one GenerativeModel between all calls."""
+
+    def __init__(self, model_name='gemini-pro', api_key=None):
+        self.model_name = model_name
+        api_key = api_key or os.getenv('GEMINI_API_KEY', 'your-gemini-api-key')
+        if api_key == 'your-gemini-api-key':
+            print("WARNING: Using default Gemini API key. Set GEMINI_API_KEY environment variable.")
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt, timeout=None):
+        response = self.model.generate_content(prompt, request_options={'timeout': timeout} if timeout else None)
+        if not response or not hasattr(response, 'text'):
+            raise LLMError("Empty or invalid response from Gemini API")
+        return response.text
+
+    def stream(self, prompt, timeout=None):
+        # The timeout bounds the whole streamed call, including reads that stall
+        options = {'timeout': timeout} if timeout else None
+        for chunk in self.model.generate_content(prompt, stream=True, request_options=options):
+            text = chunk.text
+            if text:
+                yield text
+
+
+class FakeBackend:
+    """
+    Offline backend returning a canned analysis after a fixed latency.
+
+    Used for load and throughput tests without network access or API quota.
+    """
+
+    def __init__(self, latency=0.5):
+        self.model_name = 'fake'
+        self.latency = latency
+
+    def answer(self):
+        return json.dumps({
+            "summary": "Sinov tahlili: aniqlangan zaifliklar ustuvorlik bo'yicha ko'rib chiqilishi kerak.",
+            "recommendations": [
+                "Yuqori darajadagi zaifliklarni birinchi navbatda bartaraf eting",
+                "HTTP xavfsizlik sarlavhalarini sozlang"
+            ]
+        }, ensure_ascii=False)
+
+    def generate(self, prompt, timeout=None):
+        time.sleep(self.latency)
+        return self.answer()
+
+    def stream(self, prompt, timeout=None):
+        # The same answer in small pieces spread over the latency
+        text = self.answer()
+        pieces = [text[i:i + 16] for i in range(0, len(text), 16)]
+        for piece in pieces:
+            time.sleep(self.latency / len(pieces))
+            yield piece
+
+
+class LLMClient:
+    """
+    Process-wide entry point for model calls.
+
+    All calls go through one backend instance and a fixed pool of
+    max_concurrency workers, so no matter how many request threads and analysis
+    jobs want an answer at the same time only that many API calls are in flight.
+    Each attempt is bounded by timeout seconds (stream_timeout for streamed
+    calls); rate-limit and transient errors are retried with exponential
+    backoff and full jitter.
+    """
+
+    def __init__(self, backend=None, max_concurrency=None, timeout=None, max_retries=None, backoff_base=1.0,
+                 backoff_max=30.0, stream_timeout=None):
+        self.backend_name = backend or os.getenv('LLM_BACKEND', 'gemini')
+        self.max_concurrency = max(1, int(max_concurrency or os.getenv('LLM_MAX_CONCURRENCY', 4)))
+        self.timeout = float(timeout or os.getenv('LLM_TIMEOUT', 60))
+        self.stream_timeout = float(stream_timeout or os.getenv('LLM_STREAM_TIMEOUT', 180))
+        self.max_retries = int(max_retries if max_retries is not None else os.getenv('LLM_MAX_RETRIES', 3))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._backend = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='llm')
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    if self.backend_name == 'fake':
+                        self._backend = FakeBackend(float(os.getenv('LLM_FAKE_LATENCY', 0.5)))
+                    else:
+                        self._backend = GeminiBackend(os.getenv('GEMINI_MODEL', 'gemini-pro'))
+                    print(f"LLM client using {self.backend_name} backend ({self._backend.model_name}), "
+                          f"max {self.max_concurrency} concurrent call(s)")
+        return self._backend
+
+    def _call(self, prompt):
+        # The slot is held until the call really returns, even if we stop waiting for it
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(self.backend.generate, prompt, self.timeout)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise LLMTimeout(f"Model call did not finish within {self.timeout:g}s")
+
+    def _backoff(self, attempt):
+        # Full jitter keeps retries from many workers from hitting the API in lockstep
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def generate(self, prompt):
+        """
+        Send a prompt to the model and return the response text.
+
+        Args:
+            prompt: Prompt text
+
+        Returns:
+            Response text
+
+        Raises:
+            LLMError: If every attempt failed
+        """
+        attempt = 0
+        while True:
+            try:
+                return self._call(prompt)
+            except (LLMTimeout,) + RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise LLMError(f"Model call failed after {attempt + 1} attempt(s): {str(e)}")
+                delay = self._backoff(attempt)
+                print(f"Model call failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+            except LLMError:
+                raise
+            except Exception as e:
+                raise LLMError(str(e))
+
+    def stream(self, prompt):
+        """
+        Send a prompt to the model and yield the response text as it is generated.
+
+        The call holds one concurrency slot until the response ends, the caller
+        stops reading or stream_timeout passes, so a stalled response cannot keep
+        the slot. Failures before the first piece of text are retried like in
+        generate(); after that they are raised, since the caller has already
+        consumed part of the answer.
+
+        Args:
+            prompt: Prompt text
+
+        Yields:
+            Pieces of the response text
+
+        Raises:
+            LLMError: If the call failed
+        """
+        attempt = 0
+        while True:
+            started = False
+            self._slots.acquire()
+            chunks = None
+            try:
+                deadline = time.monotonic() + self.stream_timeout
+                chunks = self.backend.stream(prompt, self.stream_timeout)
+                for text in chunks:
+                    if time.monotonic() > deadline:
+                        raise LLMTimeout(f"Streaming model call did not finish within {self.stream_timeout:g}s")
+                    started = True
+                    yield text
+                return
+            except (LLMTimeout,) + RETRYABLE_ERRORS as e:
+                if started or attempt >= self.max_retries:
+                    raise LLMError(f"Streaming model call failed after {attempt + 1} attempt(s): {str(e)}")
+                error = e
+            except LLMError:
+                raise
+            except Exception as e:
+                raise LLMError(str(e))
+            finally:
+                if chunks is not None:
+                    chunks.close()
+                self._slots.release()
+
+            delay = self._backoff(attempt)
+            print(f"Streaming model call failed ({type(error).__name__}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
+
+
+# Shared client for every model call in this process
+llm_client = LLMClient()
@@ -0,0 +1,115 @@
+# timing spans and Prometheus metrics
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# From 10 ms (cache lookups) up to past the scan deadline (whole scans)
+DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+STAGE_SECONDS = Histogram(
+    'cybershield_stage_duration_seconds',
+    'Duration of scan, analysis and report stages',
+    ['stage', 'status'],
+    buckets=DURATION_BUCKETS
+)
+
+REQUEST_SECONDS = Histogram(
+    'cybershield_http_request_duration_seconds',
+    'Time until an API response was ready to send (streamed bodies not included)',
+    ['method', 'endpoint', 'status'],
+    buckets=DURATION_BUCKETS
+)
+
+SCANS_FINISHED = Counter(
+    'cybershield_scans_finished_total',
+    'Scans that ran to a final status in this process',
+    ['status']
+)
+
+CACHE_LOOKUPS = Counter(
+    'cybershield_cache_lookups_total',
+    'Cache lookups by cache and outcome (hit or miss)',
+    ['cache', 'result']
+)
+
+ERRORS = Counter(
+    'cybershield_errors_total',
+    'Errors by the component they happened in',
+    ['component']
+)
+
+QUEUE_DEPTH = Gauge(
+    'cybershield_queue_depth',
+    'Jobs waiting for a worker',
+    ['queue']
+)
+
+SCANS_RUNNING = Gauge(
+    'cybershield_scans_running',
+    'Scans currently running in this process'
+)
+
+
+def cache_lookup(cache, hit):
+    """Count a hit or miss of a cache."""
+    CACHE_LOOKUPS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+class Trace:
+    """
+    Timing spans of one run of a pipeline (a scan, an analysis, a report).
+
+    span() times a block; spans of stages running in parallel threads can be
+    recorded into the same trace. Every span is also observed in
+    STAGE_SECONDS, so the breakdown stored on a scan record and the /metrics
+    histograms come from the same measurements.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.spans = []
+        self._lock = threading.Lock()
+        self._started_at = time.time()
+        self._start = time.perf_counter()
+
+    def add(self, name, started_at, duration, status='ok', **attrs):
+        """Record a span measured elsewhere (started_at is a time.time() value)."""
+        STAGE_SECONDS.labels(name, status).observe(duration)
+        span = dict(
+            attrs,
+            name=name,
+            started_at=datetime.fromtimestamp(started_at).isoformat(),
+            duration_ms=round(duration * 1000, 1),
+            status=status
+        )
+        with self._lock:
+            self.spans.append(span)
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """
+        Time the enclosed block as a span called name.
+
+        Yields the span's attribute dict, so the block can attach details such
+        as a number of findings. A block that raises is recorded with status
+        'error' and the exception is passed on.
+        """
+        started_at = time.time()
+        start = time.perf_counter()
+        status = 'ok'
+        try:
+            yield attrs
+        except Exception:
+            status = 'error'
+            raise
+        finally:
+            self.add(name, started_at, time.perf_counter() - start, status, **attrs)
+
+    def finish(self, status='ok'):
+        """Record the whole run as a span named after the trace and return all spans, oldest first."""
+        self.add(self.name, self._started_at, time.perf_counter() - self._start, status)
+        with self._lock:
+            return sorted(self.spans, key=lambda span: span['started_at'])
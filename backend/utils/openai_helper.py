@@ -1,102 +1,330 @@
 import os
 import json
-import google.generativeai as genai
-from datetime import datetime
 import sys
 import traceback
+from utils.analysis_cache import AnalysisCache, analysis_cache_key
+from utils.job_queue import create_redis_client
+from utils.llm_client import llm_client, LLMError
+from core.remediation import split_known_findings, local_analysis, merge_analyses
+from utils.prompt_builder import compact_findings
+from utils.analysis_stream import AnalysisStreamParser, parse_analysis
+from utils.report_renderer import render_pdf
+from utils.metrics import Trace, ERRORS
 
-# Configure Gemini API
-api_key = os.getenv('GEMINI_API_KEY', 'your-gemini-api-key')
-if api_key == 'your-gemini-api-key':
-    print("WARNING: Using default Gemini API key. Set GEMINI_API_KEY environment variable.")
+# Bump when the prompts change so cached analyses from older prompts are not reused
+PROMPT_VERSION = 3
 
-genai.configure(api_key=api_key)
+# Analyses of identical finding sets are served from here instead of calling Gemini again
+analysis_cache = AnalysisCache(
+    create_redis_client(),
+    ttl=int(os.getenv('ANALYSIS_CACHE_TTL', 7 * 24 * 3600)),
+    local_size=int(os.getenv('ANALYSIS_CACHE_SIZE', 256))
+)
 
-def analyze_scan_with_gemini(scan_result):
+def prepare_full_analysis(scan_result):
+    """
+    Plan the analysis of a scan from scratch.
+    
+    Common issues are explained from the local knowledge base; only the rest go
+    to Gemini, listed compactly within the prompt token budget.
+    
+    Args:
+        scan_result: Dict with scan result data including vulnerabilities
+        
+    Returns:
+        Dict with 'analysis' if no model call is needed, otherwise with the
+        'prompt', its cache 'key', the knowledge base part ('local') to merge into
+        the model's answer and the 'fallback' to use if the call fails
+    """
+    # Extract relevant information for the prompt
+    vulnerabilities = scan_result.get('vulnerabilities', [])
+    url = scan_result.get('url', 'Unknown URL')
+    severity_counts = scan_result.get('severity_counts', {})
+    security_score = scan_result.get('security_score', 0)
+    
+    known, unknown = split_known_findings(vulnerabilities)
+    local = local_analysis(scan_result, known)
+    if not unknown:
+        print(f"All {len(known)} finding(s) covered by the remediation knowledge base, skipping Gemini")
+        return {"analysis": local}
+    known_names = sorted({vuln.get('name', '') for vuln in known})
+    listing = compact_findings(unknown)
+    
+    # Create a prompt for Gemini. Analyses are shared between scans with the same
+    # cache key, so the prompt must not name the target or anything else the key
+    # does not cover
+    prompt = f"""
+    Analyze the following web security scan result and provide:
+    1. A concise executive summary (maximum 2 paragraphs)
+    2. Specific, actionable recommendations to fix the issues (ordered by priority)
+    
+    Scan details:
+    - Security Score: {security_score}/100
+    - Severity Counts: {json.dumps(severity_counts)}
+    
+    Vulnerabilities, grouped by type as [severity] name (xhits): description | at: example paths:
+    {listing}
+    
+    Also found, already explained separately (do not repeat them):
+    {json.dumps(known_names, ensure_ascii=False)}
+    
+    Focus on explaining the security implications and practical steps to fix the issues.
+    Provide your response in the exact JSON format below:
+    {{
+      "summary": "Executive summary here...",
+      "recommendations": ["Recommendation 1", "Recommendation 2", ...]
+    }}
+    """
+    
+    return {
+        "url": url,
+        "prompt": prompt,
+        "key": analysis_cache_key('full', unknown, severity_counts, PROMPT_VERSION, extra=[known_names, security_score, listing]),
+        "local": local,
+        "fallback": local if known else default_analysis()
+    }
+
+def prepare_delta_analysis(scan_result, previous_result):
+    """
+    Plan an update of the previous scan's analysis using only what changed since then.
+    
+    Instead of sending every finding again, the prompt carries the previous
+    summary and recommendations plus the new and fixed findings, so the cost of
+    a rescan grows with the size of the change rather than the size of the site.
+    
+    Args:
+        scan_result: Dict with scan result data including vulnerabilities and delta
+        previous_result: Analyzed result of the previous scan of the same target
+        
+    Returns:
+        Analysis plan, see prepare_full_analysis()
+    """
+    url = scan_result.get('url', 'Unknown URL')
+    delta = scan_result.get('delta', {})
+    new_fingerprints = set(delta.get('new', []))
+    new_vulnerabilities = [
+        vuln for vuln in scan_result.get('vulnerabilities', [])
+        if vuln.get('fingerprint') in new_fingerprints
+    ]
+    
+    # New findings from the knowledge base do not need the model either
+    known_new, unknown_new = split_known_findings(new_vulnerabilities)
+    local = dict(local_analysis(scan_result, known_new), summary='')
+    if not unknown_new:
+        known, unknown = split_known_findings(scan_result.get('vulnerabilities', []))
+        if not unknown:
+            print("All findings covered by the remediation knowledge base, skipping Gemini")
+            return {"analysis": local_analysis(scan_result, known)}
+        # Keep the model's earlier explanation of the unusual findings and add the known ones
+        previous = {
+            "summary": previous_result.get('summary', ''),
+            "recommendations": previous_result.get('recommendations', [])
+        }
+        return {"analysis": merge_analyses(previous, local)}
+    
+    # No target-specific text beyond what the cache key covers, see prepare_full_analysis()
+    listing = compact_findings(unknown_new)
+    fixed = [{"name": item.get('name', ''), "severity": item.get('severity', 'low')} for item in delta.get('fixed', [])[:20]]
+    prompt = f"""
+    The web application below was scanned before and analyzed. Update the previous
+    analysis using only the changes since that scan and provide:
+    1. A concise executive summary of the current state (maximum 2 paragraphs)
+    2. Specific, actionable recommendations to fix the remaining issues (ordered by priority)
+    
+    Scan details:
+    - Security Score: {scan_result.get('security_score', 0)}/100 (previously {previous_result.get('security_score', 0)}/100)
+    - Severity Counts: {json.dumps(scan_result.get('severity_counts', {}))}
+    - Unchanged findings: {len(delta.get('unchanged', []))}
+    
+    Previous summary:
+    {previous_result.get('summary', '')}
+    
+    Previous recommendations:
+    {json.dumps(previous_result.get('recommendations', []), ensure_ascii=False)}
+    
+    New vulnerabilities, grouped by type as [severity] name (xhits): description | at: example paths:
+    {listing}
+    
+    Fixed vulnerabilities:
+    {json.dumps(fixed, ensure_ascii=False)}
+    
+    Provide your response in the exact JSON format below:
+    {{
+      "summary": "Executive summary here...",
+      "recommendations": ["Recommendation 1", "Recommendation 2", ...]
+    }}
+    """
+    
+    key = analysis_cache_key(
+        'delta',
+        unknown_new,
+        scan_result.get('severity_counts', {}),
+        PROMPT_VERSION,
+        extra=[
+            previous_result.get('summary', ''),
+            previous_result.get('recommendations', []),
+            fixed,
+            scan_result.get('security_score', 0),
+            previous_result.get('security_score', 0),
+            len(delta.get('unchanged', [])),
+            listing
+        ]
+    )
+    return {
+        "url": url,
+        "prompt": prompt,
+        "key": key,
+        "local": local,
+        "fallback": default_analysis()
+    }
+
+def prepare_scan_analysis(scan_result, previous_result=None):
+    """Plan a scan's analysis: incremental if the previous scan was analyzed, otherwise from scratch."""
+    if previous_result and previous_result.get('is_analyzed'):
+        return prepare_delta_analysis(scan_result, previous_result)
+    return prepare_full_analysis(scan_result)
+
+def run_analysis_plan(plan, trace=None):
+    """Answer an analysis plan from the cache or with one (coalesced) Gemini call."""
+    if 'analysis' in plan:
+        return plan['analysis']
+    
+    analysis = analysis_cache.get_or_compute(
+        plan['key'],
+        lambda: request_analysis(plan['prompt'], plan['url'], trace)
+    )
+    if analysis is None:
+        return plan['fallback']
+    return merge_analyses(analysis, plan['local'])
+
+def stream_analysis_plan(plan):
+    """
+    Answer an analysis plan while Gemini is still writing it.
+    
+    Args:
+        plan: Analysis plan from prepare_scan_analysis()
+        
+    Yields:
+        (event, data) tuples: ('summary', text) for each new piece of the summary,
+        ('recommendation', text) for each finished recommendation and finally
+        ('done', analysis) with the complete analysis
+    """
+    analysis = plan.get('analysis')
+    if analysis is None:
+        cached = analysis_cache.get(plan['key'])
+        if cached is not None:
+            analysis = merge_analyses(cached, plan['local'])
+    
+    if analysis is not None:
+        # Nothing to wait for: send the whole answer at once
+        yield 'summary', analysis.get('summary', '')
+        for recommendation in analysis.get('recommendations', []):
+            yield 'recommendation', recommendation
+        yield 'done', analysis
+        return
+    
+    print(f"Streaming Gemini analysis for URL: {plan['url']}")
+    parser = AnalysisStreamParser()
+    try:
+        for text in llm_client.stream(plan['prompt']):
+            for event in parser.feed(text):
+                yield event
+        analysis = parser.result()
+    except LLMError as api_error:
+        print(f"Error streaming from Gemini API: {str(api_error)}")
+        ERRORS.labels('llm').inc()
+    
+    if analysis is None:
+        yield 'done', plan['fallback']
+        return
+    
+    analysis_cache.set(plan['key'], analysis)
+    yield 'done', merge_analyses(analysis, plan['local'])
+
+def analyze_scan_with_gemini(scan_result, trace=None):
     """
     Use Gemini API to analyze scan results and provide recommendations.
     
     Args:
         scan_result: Dict with scan result data including vulnerabilities
+        trace: Optional Trace to record the analysis spans in
         
     Returns:
         Dict with summary and recommendations
     """
+    trace = trace or Trace('analysis')
     try:
         print("Starting Gemini AI analysis...")
-        # Extract relevant information for the prompt
-        vulnerabilities = scan_result.get('vulnerabilities', [])
-        url = scan_result.get('url', 'Unknown URL')
-        severity_counts = scan_result.get('severity_counts', {})
-        security_score = scan_result.get('security_score', 0)
-        
-        # Create a prompt for Gemini
-        prompt = f"""
-        Analyze the following web security scan result and provide:
-        1. A concise executive summary (maximum 2 paragraphs)
-        2. Specific, actionable recommendations to fix the issues (ordered by priority)
+        with trace.span('analysis.prompt'):
+            plan = prepare_full_analysis(scan_result)
+        with trace.span('analysis.answer'):
+            return run_analysis_plan(plan, trace)
         
-        Scan details:
-        - Target URL: {url}
-        - Security Score: {security_score}/100
-        - Severity Counts: {json.dumps(severity_counts)}
-        - Scan Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-        
-        Vulnerabilities:
-        {json.dumps(vulnerabilities[:10], indent=2, ensure_ascii=False)}  # Limit to first 10 vulns to avoid token limits
-        
-        Focus on explaining the security implications and practical steps to fix the issues.
-        Provide your response in the exact JSON format below:
-        {{
-          "summary": "Executive summary here...",
-          "recommendations": ["Recommendation 1", "Recommendation 2", ...]
-        }}
-        """
-        
-        # Call Gemini API
-        try:
-            print(f"Calling Gemini API for URL: {url}")
-            model = genai.GenerativeModel('gemini-pro')
-            response = model.generate_content(prompt)
-            
-            # Extract and parse response
-            if response and hasattr(response, 'text'):
-                content = response.text.strip()
-                print("Received response from Gemini API")
-            else:
-                print("Empty or invalid response from Gemini API")
-                return default_analysis()
-                
-        except Exception as api_error:
-            print(f"Error calling Gemini API: {str(api_error)}")
-            traceback.print_exc(file=sys.stdout)
-            return default_analysis()
-        
-        # Try to extract JSON from the response
-        try:
-            # Find the JSON part in the response
-            start_idx = content.find('{')
-            end_idx = content.rfind('}') + 1
-            
-            if start_idx >= 0 and end_idx > start_idx:
-                json_str = content[start_idx:end_idx]
-                analysis = json.loads(json_str)
-                print("Successfully parsed Gemini analysis")
-            else:
-                print("Could not find JSON in Gemini response")
-                return default_analysis()
-                
-        except json.JSONDecodeError as json_error:
-            print(f"JSON parsing error: {str(json_error)}")
-            return default_analysis()
+    except Exception as e:
+        print(f"Error in Gemini analysis: {str(e)}")
+        ERRORS.labels('analysis').inc()
+        traceback.print_exc(file=sys.stdout)
+        return default_analysis()
+
+def analyze_scan_delta_with_gemini(scan_result, previous_result, trace=None):
+    """
+    Update the previous scan's analysis using only what changed since then (see prepare_delta_analysis).
+    
+    Args:
+        scan_result: Dict with scan result data including vulnerabilities and delta
+        previous_result: Analyzed result of the previous scan of the same target
+        trace: Optional Trace to record the analysis spans in
         
-        return analysis
+    Returns:
+        Dict with summary and recommendations
+    """
+    trace = trace or Trace('analysis')
+    try:
+        print("Starting incremental Gemini AI analysis...")
+        with trace.span('analysis.prompt', kind='delta'):
+            plan = prepare_delta_analysis(scan_result, previous_result)
+        with trace.span('analysis.answer'):
+            return run_analysis_plan(plan, trace)
         
     except Exception as e:
-        print(f"Error in Gemini analysis: {str(e)}")
+        print(f"Error in incremental Gemini analysis: {str(e)}")
+        ERRORS.labels('analysis').inc()
         traceback.print_exc(file=sys.stdout)
         return default_analysis()
 
+def request_analysis(prompt, url, trace=None):
+    """
+    Send an analysis prompt to Gemini and parse the JSON answer.
+    
+    Args:
+        prompt: Prompt asking for the summary/recommendations JSON
+        url: Target URL, used for logging
+        trace: Optional Trace to record the analysis.llm span in
+        
+    Returns:
+        Dict with summary and recommendations, or None if the call failed
+    """
+    trace = trace or Trace('analysis')
+    # Call Gemini API through the shared client (concurrency limit, timeout, retries)
+    try:
+        print(f"Calling Gemini API for URL: {url}")
+        with trace.span('analysis.llm', prompt_chars=len(prompt)):
+            content = llm_client.generate(prompt).strip()
+        print("Received response from Gemini API")
+            
+    except LLMError as api_error:
+        print(f"Error calling Gemini API: {str(api_error)}")
+        ERRORS.labels('llm').inc()
+        return None
+    
+    analysis = parse_analysis(content)
+    if analysis is None:
+        print("Could not parse JSON in Gemini response")
+        return None
+    
+    print("Successfully parsed Gemini analysis")
+    return analysis
+
 def default_analysis():
     """Return a default analysis when Gemini API fails"""
     return {
@@ -112,112 +340,36 @@ def default_analysis():
 # For backwards compatibility
 analyze_scan_with_chatgpt = analyze_scan_with_gemini
 
-def generate_pdf_report(scan_result, output_path):
+def generate_pdf_report(scan_result, output_path, trace=None):
     """
     Generate a PDF report from scan results.
     
     Args:
         scan_result: Dict with scan result data
         output_path: Path to save the PDF report
+        trace: Optional Trace to record the report spans in
         
     Returns:
         Path to the generated PDF file
     """
+    trace = trace or Trace('report')
     try:
         print(f"Generating PDF report for scan_id: {scan_result.get('scan_id')}")
         
-        # Standard Python libraries for PDF generation
-        import pdfkit
-        from jinja2 import Environment, FileSystemLoader
-        import os
-        
         # Get analysis if not already done
         if not scan_result.get('summary'):
             print("No summary found, running AI analysis...")
-            analysis = analyze_scan_with_gemini(scan_result)
+            with trace.span('report.analysis'):
+                analysis = analyze_scan_with_gemini(scan_result, trace)
             scan_result['summary'] = analysis.get('summary', '')
             scan_result['recommendations'] = analysis.get('recommendations', [])
         
-        # Setup templates
-        template_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'templates')
-        print(f"Template directory: {template_dir}")
-        
-        if not os.path.exists(template_dir):
-            print(f"Template directory does not exist. Creating it...")
-            os.makedirs(template_dir, exist_ok=True)
-        
-        # Check if template exists
-        template_path = os.path.join(template_dir, 'report_template.html')
-        if not os.path.exists(template_path):
-            print(f"Template file not found at: {template_path}")
-            # Use a default template
-            create_default_template(template_path)
-        
-        env = Environment(loader=FileSystemLoader(template_dir))
-        template = env.get_template('report_template.html')
-        
-        # Format data for template
-        formatted_data = {
-            'url': scan_result.get('url', 'N/A'),
-            'scan_date': datetime.fromisoformat(scan_result.get('created_at', datetime.now().isoformat())).strftime('%Y-%m-%d %H:%M'),
-            'security_score': scan_result.get('security_score', 0),
-            'severity_counts': scan_result.get('severity_counts', {'high': 0, 'medium': 0, 'low': 0}),
-            'summary': scan_result.get('summary', 'No summary available'),
-            'recommendations': scan_result.get('recommendations', []),
-            'vulnerabilities': scan_result.get('vulnerabilities', []),
-            'server_info': scan_result.get('server_info', {'server': 'Unknown', 'technologies': 'Unknown'})
-        }
-        
-        # Render HTML
-        html_content = template.render(**formatted_data)
-        
-        # Create directory for temp files if it doesn't exist
-        temp_dir = os.path.dirname(output_path)
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        # Save HTML to temporary file
-        html_path = f"{output_path}.html"
-        with open(html_path, 'w', encoding='utf-8') as f:
-            f.write(html_content)
-        
-        print(f"HTML report saved to: {html_path}")
-        
-        try:
-            # Try to convert HTML to PDF
-            print("Converting HTML to PDF...")
-            pdfkit_config = None
-            
-            # Check if wkhtmltopdf is in PATH or specify the path
-            wkhtmltopdf_path = '/usr/bin/wkhtmltopdf'
-            if os.path.exists(wkhtmltopdf_path):
-                from pdfkit.configuration import Configuration
-                pdfkit_config = Configuration(wkhtmltopdf=wkhtmltopdf_path)
-            
-            pdfkit.from_file(html_path, output_path, options={
-                'page-size': 'A4',
-                'encoding': 'UTF-8',
-                'margin-top': '1cm',
-                'margin-right': '1cm',
-                'margin-bottom': '1cm',
-                'margin-left': '1cm',
-                'title': f'Security Scan Report - {formatted_data["url"]}'
-            }, configuration=pdfkit_config)
-            
-            print(f"PDF report successfully generated: {output_path}")
-            
-            # Remove temporary HTML file
-            os.remove(html_path)
-            
-            return output_path
-        except Exception as pdf_error:
-            print(f"Error converting to PDF: {str(pdf_error)}")
-            traceback.print_exc(file=sys.stdout)
-            print("Returning HTML file as fallback")
-            # If PDF conversion fails, return the HTML file as fallback
-            return html_path
+        with trace.span('report.render'):
+            return render_pdf(scan_result, output_path)
             
     except Exception as e:
         print(f"Error generating PDF report: {str(e)}")
+        ERRORS.labels('report').inc()
         traceback.print_exc(file=sys.stdout)
         # Fallback to JSON file
         json_path = output_path.replace('.pdf', '.json')
@@ -225,102 +377,3 @@ def generate_pdf_report(scan_result, output_path):
             json.dump(scan_result, f, indent=2, ensure_ascii=False)
         print(f"Fallback JSON report saved to: {json_path}")
         return json_path
-
-def create_default_template(template_path):
-    """Create a default HTML template for reports if the template is missing"""
-    print("Creating default template...")
-    default_template = """<!DOCTYPE html>
-<html lang="uz">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>CyberShield - Xavfsizlik Tekshiruvi Hisoboti</title>
-    <style>
-        body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
-        .container { max-width: 1000px; margin: 0 auto; padding: 20px; }
-        .header { text-align: center; padding: 20px 0; border-bottom: 2px solid #eaeaea; }
-        .logo { font-size: 28px; font-weight: 700; color: #2563eb; }
-        .section { margin: 20px 0; padding: 10px; border-bottom: 1px solid #eaeaea; }
-        .vulnerability { margin-bottom: 10px; padding: 10px; background-color: #f8f9fa; }
-        .severity-high { color: #dc3545; }
-        .severity-medium { color: #fd7e14; }
-        .severity-low { color: #0d6efd; }
-        table { width: 100%; border-collapse: collapse; margin-top: 20px; }
-        th, td { padding: 10px; border-bottom: 1px solid #ddd; text-align: left; }
-        th { background-color: #f2f2f2; }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <div class="logo">CyberShield</div>
-            <div>Xavfsizlik Tekshiruvi Hisoboti</div>
-        </div>
-        
-        <div class="section">
-            <h2>Asosiy ma'lumotlar</h2>
-            <p><strong>URL:</strong> {{ url }}</p>
-            <p><strong>Sana:</strong> {{ scan_date }}</p>
-            <p><strong>Xavfsizlik bali:</strong> {{ security_score }}</p>
-            <p><strong>Zaifliklar:</strong> Yuqori: {{ severity_counts.high }}, O'rta: {{ severity_counts.medium }}, Past: {{ severity_counts.low }}</p>
-        </div>
-        
-        <div class="section">
-            <h2>Qisqacha ma'lumot</h2>
-            <p>{{ summary }}</p>
-        </div>
-        
-        <div class="section">
-            <h2>Tavsiyalar</h2>
-            <ul>
-                {% for recommendation in recommendations %}
-                <li>{{ recommendation }}</li>
-                {% endfor %}
-            </ul>
-        </div>
-        
-        <div class="section">
-            <h2>Aniqlangan zaifliklar</h2>
-            <table>
-                <thead>
-                    <tr>
-                        <th>Zaiflik nomi</th>
-                        <th>Jiddiylik</th>
-                        <th>Ta'rif</th>
-                    </tr>
-                </thead>
-                <tbody>
-                    {% for vuln in vulnerabilities %}
-                    <tr>
-                        <td>{{ vuln.name }}</td>
-                        <td class="severity-{{ vuln.severity }}">{{ vuln.severity }}</td>
-                        <td>{{ vuln.description }}</td>
-                    </tr>
-                    {% endfor %}
-                </tbody>
-            </table>
-        </div>
-        
-        <div class="section">
-            <h2>Server ma'lumotlari</h2>
-            <p><strong>Server:</strong> {{ server_info.server }}</p>
-            {% if server_info.technologies %}
-            <p><strong>Texnologiyalar:</strong> {{ server_info.technologies }}</p>
-            {% endif %}
-        </div>
-        
-        <div style="text-align: center; margin-top: 30px; color: #666;">
-            <p>© {{ scan_date.split(' ')[0] }} CyberShield. Barcha huquqlar himoyalangan.</p>
-        </div>
-    </div>
-</body>
-</html>"""
-    
-    # Create directory if it doesn't exist
-    os.makedirs(os.path.dirname(template_path), exist_ok=True)
-    
-    # Write template to file
-    with open(template_path, 'w', encoding='utf-8') as f:
-        f.write(default_template)
-    
-    print(f"Default template created at: {template_path}") 
\ No newline at end of file
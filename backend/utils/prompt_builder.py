@@ -0,0 +1,129 @@
+# compact finding listings for llm prompts
+import math
+import os
+from urllib.parse import urlsplit
+
+# Rough size of a token for English/JSON-like text; good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+DEFAULT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', 1500))
+
+SEVERITY_ORDER = ("high", "medium", "low", "info")
+
+# Longest description kept per group, in characters
+DESCRIPTION_CHARS = 240
+
+# Example locations listed per group
+MAX_LOCATIONS = 3
+
+
+def estimate_tokens(text):
+    """Estimate how many tokens text takes in a prompt."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _short_location(location):
+    """Drop scheme, host and query from URLs; other locations (host:port/proto) are kept."""
+    if '://' not in location:
+        return location
+    parts = urlsplit(location)
+    return parts.path or '/'
+
+
+def group_findings(findings):
+    """
+    Collapse findings into one entry per (rule, severity), most severe and frequent first.
+
+    Ids, timestamps, fingerprints and per-instance evidence are dropped; what is
+    left is the rule's name and description, how many times it was hit and a few
+    example locations.
+    """
+    groups = {}
+    for finding in findings:
+        severity = (finding.get('severity') or 'low').lower()
+        rule = finding.get('rule') or finding.get('plugin_id') or finding.get('name', '')
+        group = groups.get((rule, severity))
+        if group is None:
+            group = groups[(rule, severity)] = {
+                "name": finding.get('name', 'Unknown'),
+                "severity": severity,
+                "description": ' '.join((finding.get('description') or '').split()),
+                "count": 0,
+                "locations": []
+            }
+
+        group['count'] += finding.get('count') or 1
+        urls = [instance.get('url') for instance in finding.get('instances') or []] or [finding.get('location')]
+        for url in urls:
+            location = _short_location(url or '')
+            if location and location not in group['locations'] and len(group['locations']) < MAX_LOCATIONS:
+                group['locations'].append(location)
+
+    rank = {severity: i for i, severity in enumerate(SEVERITY_ORDER)}
+    return sorted(groups.values(), key=lambda group: (rank.get(group['severity'], len(rank)), -group['count']))
+
+
+def _full_line(group):
+    description = group['description']
+    if len(description) > DESCRIPTION_CHARS:
+        description = description[:DESCRIPTION_CHARS].rsplit(' ', 1)[0] + '...'
+    line = f"- [{group['severity']}] {group['name']} (x{group['count']})"
+    if description:
+        line += f": {description}"
+    if group['locations']:
+        line += f" | at: {', '.join(group['locations'])}"
+    return line
+
+
+def _short_line(group):
+    return f"- [{group['severity']}] {group['name']} (x{group['count']})"
+
+
+def compact_findings(findings, token_budget=None):
+    """
+    Render findings as a compact, budgeted list for a prompt.
+
+    Every issue type first gets a name-and-count line, so the whole scan is
+    covered; the remaining budget then upgrades the most severe and frequent
+    types to full lines with description and example locations. If even the
+    short lines do not fit, the types that are left out are summarized in a
+    final line with their counts per severity.
+
+    Args:
+        findings: Findings to describe
+        token_budget: Maximum estimated tokens for the listing (default PROMPT_TOKEN_BUDGET)
+
+    Returns:
+        Listing as a string, one line per issue type
+    """
+    budget = DEFAULT_TOKEN_BUDGET if token_budget is None else token_budget
+    groups = group_findings(findings)
+    if not groups:
+        return "- (none)"
+
+    lines = [_short_line(group) for group in groups]
+    costs = [estimate_tokens(line) + 1 for line in lines]
+
+    if sum(costs) > budget:
+        # Keep room for the line that summarizes the types left out
+        available = budget - 40
+        kept = 0
+        while kept < len(lines) and costs[kept] <= available:
+            available -= costs[kept]
+            kept += 1
+
+        counts = {}
+        for group in groups[kept:]:
+            counts[group['severity']] = counts.get(group['severity'], 0) + group['count']
+        by_severity = ', '.join(f"{severity} {counts[severity]}" for severity in SEVERITY_ORDER if severity in counts)
+        return '\n'.join(lines[:kept] + [f"- ... and {len(groups) - kept} more issue type(s) ({by_severity})"])
+
+    available = budget - sum(costs)
+    for i, group in enumerate(groups):
+        full = _full_line(group)
+        extra = estimate_tokens(full) + 1 - costs[i]
+        if extra <= available:
+            lines[i] = full
+            available -= extra
+
+    return '\n'.join(lines)
@@ -0,0 +1,141 @@
+# bounded process pool for report rendering
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from utils.metrics import ERRORS
+
+
+class RenderPoolFull(Exception):
+    """Raised when the pool already has as many jobs as it accepts."""
+
+
+class RenderPool:
+    """
+    Runs report renders (wkhtmltopdf) in worker processes instead of request threads.
+
+    At most ``workers`` renders run at a time and at most ``max_queued`` more wait
+    for a worker; submit() raises RenderPoolFull beyond that, so a burst of exports
+    is turned away instead of piling up. Jobs are identified by a key (the export
+    they produce) and a key that is already queued or running is joined rather
+    than rendered again. Outcomes of recent jobs are kept for status polling.
+
+    Workers are started with the spawn method: forking the threaded API process
+    could copy locks held by other threads.
+    """
+
+    def __init__(self, workers=2, max_queued=8, keep_finished=256):
+        self.workers = max(1, int(workers))
+        self.max_queued = max(0, int(max_queued))
+        self.keep_finished = keep_finished
+        self._executor = None
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._finished = OrderedDict()
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            print(f"Render pool started with {self.workers} worker process(es)")
+        return self._executor
+
+    def submit(self, key, fn, *args, on_done=None):
+        """
+        Queue fn(*args) in a worker process unless key is already queued or running.
+
+        Args:
+            key: Job key
+            fn: Module-level function to run (it is pickled to the worker)
+            *args: Picklable arguments
+            on_done: Called in this process as on_done(result) after fn returned;
+                the job only counts as done once it has returned
+
+        Returns:
+            Status dict of the job (see status())
+
+        Raises:
+            RenderPoolFull: If workers + max_queued jobs are already queued or running
+        """
+        with self._lock:
+            if key in self._jobs:
+                return self._status(key)
+            if len(self._jobs) >= self.workers + self.max_queued:
+                raise RenderPoolFull(f"{len(self._jobs)} render job(s) already queued or running")
+
+            self._finished.pop(key, None)
+            try:
+                future = self._get_executor().submit(fn, *args)
+            except BrokenProcessPool:
+                # A worker died (e.g. killed by the OOM killer); start a fresh pool
+                print("Render pool is broken, restarting it")
+                self._executor = None
+                future = self._get_executor().submit(fn, *args)
+            self._jobs[key] = {'future': future, 'queued_at': time.time(), 'finished': threading.Event()}
+
+        future.add_done_callback(lambda f: self._complete(key, f, on_done))
+        return self.status(key)
+
+    def _complete(self, key, future, on_done):
+        error = None
+        try:
+            result = future.result()
+            if on_done is not None:
+                on_done(result)
+        except Exception as e:
+            print(f"Render job {key} failed: {str(e)}")
+            ERRORS.labels('render').inc()
+            error = str(e) or type(e).__name__
+
+        with self._lock:
+            job = self._jobs.pop(key, None)
+            self._finished[key] = {
+                'status': 'failed' if error else 'done',
+                'error': error,
+                'finished_at': time.time(),
+                'duration': time.time() - job['queued_at'] if job else None
+            }
+            while len(self._finished) > self.keep_finished:
+                self._finished.popitem(last=False)
+        if job is not None:
+            job['finished'].set()
+
+    def _status(self, key):
+        job = self._jobs.get(key)
+        if job is not None:
+            return {'status': 'running' if job['future'].running() else 'queued'}
+        finished = self._finished.get(key)
+        if finished is not None:
+            return dict(finished)
+        return None
+
+    def status(self, key):
+        """Return {'status': queued|running|done|failed, ...} for a job, or None if it is unknown."""
+        with self._lock:
+            return self._status(key)
+
+    def wait(self, key, timeout):
+        """Wait up to timeout seconds for a queued or running job to finish and return its status."""
+        with self._lock:
+            job = self._jobs.get(key)
+        if job is not None:
+            job['finished'].wait(timeout)
+        return self.status(key)
+
+    def retry_after(self):
+        """Rough number of seconds until the pool accepts new jobs again."""
+        with self._lock:
+            durations = [job['duration'] for job in self._finished.values() if job.get('duration')]
+        average = sum(durations[-20:]) / len(durations[-20:]) if durations else 10
+        return max(1, int(average))
+
+    def stats(self):
+        """Return the number of queued and running jobs."""
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job['future'].running())
+            return {'running': running, 'queued': len(self._jobs) - running, 'workers': self.workers}
@@ -0,0 +1,248 @@
+# report template rendering
+import os
+import threading
+from datetime import datetime
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'templates')
+REPORT_TEMPLATE = 'report_template.html'
+
+# Compiled templates are kept here so new processes skip the Jinja compile step
+TEMPLATE_CACHE_DIR = os.getenv(
+    'TEMPLATE_CACHE_DIR',
+    os.path.abspath(os.path.join(os.path.dirname(__file__), '../../reports/template_cache'))
+)
+
+# Streamed HTML is sent in pieces of about this many characters
+STREAM_CHUNK_SIZE = int(os.getenv('REPORT_STREAM_CHUNK_SIZE', 16 * 1024))
+
+os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+
+# Shared by every export; templates are compiled once per process (auto_reload is off,
+# restart the backend after editing a template)
+report_env = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    bytecode_cache=FileSystemBytecodeCache(TEMPLATE_CACHE_DIR),
+    auto_reload=False
+)
+
+_template_lock = threading.Lock()
+_template_checked = False
+
+
+def get_report_template():
+    """Return the compiled report template, creating the default one the first time if it is missing."""
+    global _template_checked
+    if not _template_checked:
+        with _template_lock:
+            if not _template_checked:
+                template_path = os.path.join(TEMPLATE_DIR, REPORT_TEMPLATE)
+                if not os.path.exists(template_path):
+                    print(f"Template file not found at: {template_path}")
+                    create_default_template(template_path)
+                _template_checked = True
+    return report_env.get_template(REPORT_TEMPLATE)
+
+
+def report_context(scan_result):
+    """Format a scan result for the report template."""
+    return {
+        'url': scan_result.get('url', 'N/A'),
+        'scan_date': datetime.fromisoformat(scan_result.get('created_at', datetime.now().isoformat())).strftime('%Y-%m-%d %H:%M'),
+        'security_score': scan_result.get('security_score', 0),
+        'severity_counts': scan_result.get('severity_counts', {'high': 0, 'medium': 0, 'low': 0}),
+        'summary': scan_result.get('summary', 'No summary available'),
+        'recommendations': scan_result.get('recommendations', []),
+        'vulnerabilities': scan_result.get('vulnerabilities', []),
+        'server_info': scan_result.get('server_info', {'server': 'Unknown', 'technologies': 'Unknown'})
+    }
+
+
+def render_report_html(scan_result):
+    """Render the whole report as one HTML string."""
+    return get_report_template().render(**report_context(scan_result))
+
+
+def stream_report_html(scan_result, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Render the report as HTML piece by piece.
+
+    Jinja yields many tiny strings; they are joined into chunks of about
+    chunk_size characters so the response is not written one tag at a time.
+
+    Args:
+        scan_result: Dict with scan result data (analysis included)
+        chunk_size: Approximate size of each yielded chunk in characters
+
+    Yields:
+        Chunks of the HTML document
+    """
+    buffer = []
+    size = 0
+    for piece in get_report_template().generate(**report_context(scan_result)):
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def render_pdf(scan_result, output_path):
+    """
+    Render the report to a PDF file with wkhtmltopdf.
+
+    Runs in the render pool's worker processes, so it only needs the template
+    and the scan result (the analysis must already be in it).
+
+    Args:
+        scan_result: Dict with scan result data
+        output_path: Path to save the PDF report
+
+    Returns:
+        Path of the written file: output_path, or output_path + '.html' if the
+        PDF conversion failed and the HTML is returned as fallback
+    """
+    import pdfkit
+
+    html_content = render_report_html(scan_result)
+
+    # Create directory for output files if it doesn't exist
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    try:
+        # Try to convert HTML to PDF
+        print("Converting HTML to PDF...")
+        pdfkit_config = None
+
+        # Check if wkhtmltopdf is in PATH or specify the path
+        wkhtmltopdf_path = '/usr/bin/wkhtmltopdf'
+        if os.path.exists(wkhtmltopdf_path):
+            from pdfkit.configuration import Configuration
+            pdfkit_config = Configuration(wkhtmltopdf=wkhtmltopdf_path)
+
+        # wkhtmltopdf reads the HTML from stdin, so no intermediate file is written
+        pdfkit.from_string(html_content, output_path, options={
+            'page-size': 'A4',
+            'encoding': 'UTF-8',
+            'margin-top': '1cm',
+            'margin-right': '1cm',
+            'margin-bottom': '1cm',
+            'margin-left': '1cm',
+            'title': f'Security Scan Report - {scan_result.get("url", "N/A")}'
+        }, configuration=pdfkit_config)
+
+        print(f"PDF report successfully generated: {output_path}")
+        return output_path
+    except Exception as pdf_error:
+        print(f"Error converting to PDF: {str(pdf_error)}")
+        print("Returning HTML file as fallback")
+        # If PDF conversion fails, return the HTML file as fallback
+        html_path = f"{output_path}.html"
+        with open(html_path, 'w', encoding='utf-8') as f:
+            f.write(html_content)
+        print(f"HTML report saved to: {html_path}")
+        return html_path
+
+
+def create_default_template(template_path):
+    """Create a default HTML template for reports if the template is missing"""
+    print("Creating default template...")
+    default_template = """<!DOCTYPE html>
+<html lang="uz">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>CyberShield - Xavfsizlik Tekshiruvi Hisoboti</title>
+    <style>
+        body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
+        .container { max-width: 1000px; margin: 0 auto; padding: 20px; }
+        .header { text-align: center; padding: 20px 0; border-bottom: 2px solid #eaeaea; }
+        .logo { font-size: 28px; font-weight: 700; color: #2563eb; }
+        .section { margin: 20px 0; padding: 10px; border-bottom: 1px solid #eaeaea; }
+        .vulnerability { margin-bottom: 10px; padding: 10px; background-color: #f8f9fa; }
+        .severity-high { color: #dc3545; }
+        .severity-medium { color: #fd7e14; }
+        .severity-low { color: #0d6efd; }
+        table { width: 100%; border-collapse: collapse; margin-top: 20px; }
+        th, td { padding: 10px; border-bottom: 1px solid #ddd; text-align: left; }
+        th { background-color: #f2f2f2; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <div class="logo">CyberShield</div>
+            <div>Xavfsizlik Tekshiruvi Hisoboti</div>
+        </div>
+        
+        <div class="section">
+            <h2>Asosiy ma'lumotlar</h2>
+            <p><strong>URL:</strong> {{ url }}</p>
+            <p><strong>Sana:</strong> {{ scan_date }}</p>
+            <p><strong>Xavfsizlik bali:</strong> {{ security_score }}</p>
+            <p><strong>Zaifliklar:</strong> Yuqori: {{ severity_counts.high }}, O'rta: {{ severity_counts.medium }}, Past: {{ severity_counts.low }}</p>
+        </div>
+        
+        <div class="section">
+            <h2>Qisqacha ma'lumot</h2>
+            <p>{{ summary }}</p>
+        </div>
+        
+        <div class="section">
+            <h2>Tavsiyalar</h2>
+            <ul>
+                {% for recommendation in recommendations %}
+                <li>{{ recommendation }}</li>
+                {% endfor %}
+            </ul>
+        </div>
+        
+        <div class="section">
+            <h2>Aniqlangan zaifliklar</h2>
+            <table>
+                <thead>
+                    <tr>
+                        <th>Zaiflik nomi</th>
+                        <th>Jiddiylik</th>
+                        <th>Ta'rif</th>
+                    </tr>
+                </thead>
+                <tbody>
+                    {% for vuln in vulnerabilities %}
+                    <tr>
+                        <td>{{ vuln.name }}</td>
+                        <td class="severity-{{ vuln.severity }}">{{ vuln.severity }}</td>
+                        <td>{{ vuln.description }}</td>
+                    </tr>
+                    {% endfor %}
+                </tbody>
+            </table>
+        </div>
+        
+        <div class="section">
+            <h2>Server ma'lumotlari</h2>
+            <p><strong>Server:</strong> {{ server_info.server }}</p>
+            {% if server_info.technologies %}
+            <p><strong>Texnologiyalar:</strong> {{ server_info.technologies }}</p>
+            {% endif %}
+        </div>
+        
+        <div style="text-align: center; margin-top: 30px; color: #666;">
+            <p>© {{ scan_date.split(' ')[0] }} CyberShield. Barcha huquqlar himoyalangan.</p>
+        </div>
+    </div>
+</body>
+</html>"""
+    
+    # Create directory if it doesn't exist
+    os.makedirs(os.path.dirname(template_path), exist_ok=True)
+    
+    # Write template to file
+    with open(template_path, 'w', encoding='utf-8') as f:
+        f.write(default_template)
+    
+    print(f"Default template created at: {template_path}")
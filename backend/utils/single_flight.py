@@ -0,0 +1,98 @@
+# in-flight scan registry
+import threading
+
+import redis
+
+
+class InFlightRegistry:
+    """
+    Tracks which scan currently owns each scan target, so duplicate requests can
+    attach to it instead of starting another scanner run.
+
+    Ownership lives in Redis (``<prefix>:owner:<target>`` set with NX and a TTL) so it
+    is shared by every backend process; attached scans are kept in
+    ``<prefix>:followers:<owner scan id>``. If Redis is unreachable an in-process
+    registry is used instead.
+    """
+
+    def __init__(self, redis_client, prefix='scan_inflight', ttl=3600):
+        self.redis = redis_client
+        self.prefix = prefix
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._owners = {}
+        self._followers = {}
+
+    def _owner_key(self, target):
+        return f'{self.prefix}:owner:{target}'
+
+    def _followers_key(self, owner_id):
+        return f'{self.prefix}:followers:{owner_id}'
+
+    def claim(self, target, scan_id):
+        """
+        Make scan_id the owner of target unless another scan already owns it.
+
+        Returns:
+            None if scan_id now owns the target, otherwise the owning scan ID
+        """
+        try:
+            # Retry once if the owner finished between SET NX and GET
+            for _ in range(2):
+                if self.redis.set(self._owner_key(target), scan_id, nx=True, ex=self.ttl):
+                    return None
+                owner = self.redis.get(self._owner_key(target))
+                if owner is not None:
+                    return owner.decode('utf-8')
+            return None
+        except redis.RedisError as e:
+            print(f"Redis unavailable for in-flight registry ({str(e)}), using local registry")
+
+        with self._lock:
+            owner = self._owners.setdefault(target, scan_id)
+            return None if owner == scan_id else owner
+
+    def release(self, target, scan_id):
+        """Drop scan_id's ownership of target (no-op if another scan owns it)."""
+        try:
+            key = self._owner_key(target)
+            owner = self.redis.get(key)
+            if owner is not None and owner.decode('utf-8') == scan_id:
+                self.redis.delete(key)
+            return
+        except redis.RedisError:
+            pass
+
+        with self._lock:
+            if self._owners.get(target) == scan_id:
+                del self._owners[target]
+
+    def attach(self, owner_id, scan_id):
+        """Register scan_id to receive owner_id's result."""
+        try:
+            key = self._followers_key(owner_id)
+            pipe = self.redis.pipeline()
+            pipe.rpush(key, scan_id)
+            pipe.expire(key, self.ttl)
+            pipe.execute()
+            return
+        except redis.RedisError:
+            pass
+
+        with self._lock:
+            self._followers.setdefault(owner_id, []).append(scan_id)
+
+    def pop_followers(self, owner_id):
+        """Remove and return the scans attached to owner_id."""
+        try:
+            key = self._followers_key(owner_id)
+            pipe = self.redis.pipeline()
+            pipe.lrange(key, 0, -1)
+            pipe.delete(key)
+            followers, _ = pipe.execute()
+            return [follower.decode('utf-8') for follower in followers]
+        except redis.RedisError:
+            pass
+
+        with self._lock:
+            return self._followers.pop(owner_id, [])
@@ -1 +1,92 @@
-# url validation
\ No newline at end of file
+# request validation
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit, urlunsplit
+
+# Page size limits for list endpoints
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def parse_page_args(args, default_limit=DEFAULT_PAGE_SIZE):
+    """
+    Read keyset pagination parameters from a request's query string.
+
+    Args:
+        args: request.args
+        default_limit: Page size used when ?limit is not given
+
+    Returns:
+        Tuple of (limit, cursor, view) where view is 'summary' or 'full'
+
+    Raises:
+        ValueError: If limit is not a positive integer or view is unknown
+    """
+    try:
+        limit = int(args.get('limit', default_limit))
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer")
+    if limit < 1:
+        raise ValueError("limit must be positive")
+
+    view = args.get('view', 'full').lower()
+    if view not in ('summary', 'full'):
+        raise ValueError("view must be 'summary' or 'full'")
+
+    return min(limit, MAX_PAGE_SIZE), args.get('cursor') or None, view
+
+
+def normalize_target(url):
+    """
+    Canonical form of a scan target, used to spot scans of the same site.
+
+    Adds http:// when no scheme is given, lowercases scheme and host, drops the
+    default port, the fragment and any trailing slash.
+    """
+    if '://' not in url:
+        url = 'http://' + url
+
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    port = parts.port
+    if port and not ((scheme == 'http' and port == 80) or (scheme == 'https' and port == 443)):
+        host = f'{host}:{port}'
+
+    path = parts.path.rstrip('/')
+    return urlunsplit((scheme, host, path, parts.query, ''))
+
+
+def parse_date_range(args):
+    """
+    Read a ?from=...&to=... date range from a request's query string.
+
+    Both ends are ISO dates or datetimes and inclusive; a plain date as 'to'
+    covers that whole day.
+
+    Returns:
+        Tuple of (since, until) in the ISO format scans are stored with: since is
+        the inclusive lower bound and until the exclusive upper bound, each None
+        when not given
+
+    Raises:
+        ValueError: If a date cannot be parsed or from is after to
+    """
+    bounds = []
+    for name in ('from', 'to'):
+        value = (args.get(name) or '').strip()
+        if not value:
+            bounds.append(None)
+            continue
+        try:
+            moment = datetime.fromisoformat(value)
+        except ValueError:
+            raise ValueError(f"{name} must be an ISO date, e.g. 2024-01-31")
+        if name == 'to':
+            moment += timedelta(days=1) if len(value) == 10 else timedelta(microseconds=1)
+        bounds.append(moment.replace(tzinfo=None).isoformat())
+
+    since, until = bounds
+    if since and until and since >= until:
+        raise ValueError("from must not be after to")
+    return since, until
+
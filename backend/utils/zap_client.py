@@ -0,0 +1,216 @@
+# zap daemon api client
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+
+from utils.metrics import Trace
+
+
+class ZapError(Exception):
+    """Raised when the ZAP daemon rejects or fails an API call."""
+
+
+class ZapClient:
+    """
+    Client for the long-running ZAP daemon (zap.sh -daemon) REST API.
+
+    One client (and one pooled HTTP session) is shared by all scans. Each scan gets
+    its own ZAP context on the warm daemon, so several scans can run side by side
+    without starting another ZAP/JVM. Alerts are kept per site in the shared
+    session, so scans of the same site take turns (see isolated()).
+    """
+
+    def __init__(self, base_url=None, api_key=None, request_timeout=30):
+        if base_url is None:
+            base_url = 'http://{}:{}'.format(
+                os.getenv('ZAP_SERVICE', 'zap_scanner'),
+                os.getenv('ZAP_PORT', '8080')
+            )
+        self.base_url = base_url.rstrip('/')
+        self.request_timeout = request_timeout
+        self.session = requests.Session()
+        api_key = api_key if api_key is not None else os.getenv('ZAP_API_KEY', '')
+        if api_key:
+            self.session.headers['X-ZAP-API-Key'] = api_key
+        self._site_locks = {}
+        self._site_locks_lock = threading.Lock()
+
+    def _call(self, component, call_type, name, **params):
+        url = f'{self.base_url}/JSON/{component}/{call_type}/{name}/'
+        try:
+            response = self.session.get(url, params=params, timeout=self.request_timeout)
+        except requests.RequestException as e:
+            raise ZapError(f"ZAP API request {component}/{name} failed: {str(e)}")
+
+        try:
+            data = response.json()
+        except ValueError:
+            raise ZapError(f"ZAP API {component}/{name} returned non-JSON response ({response.status_code})")
+
+        if response.status_code != 200 or 'code' in data:
+            raise ZapError(f"ZAP API {component}/{name} error: {data.get('message', data)}")
+
+        return data
+
+    def version(self):
+        """Return the daemon version (also a cheap health check)."""
+        return self._call('core', 'view', 'version')['version']
+
+    def create_context(self, name, target):
+        """Create a context that scopes the scan to the target URL and everything under it."""
+        context_id = self._call('context', 'action', 'newContext', contextName=name)['contextId']
+        self._call('context', 'action', 'includeInContext',
+                   contextName=name, regex=re.escape(target.rstrip('/')) + '.*')
+        return context_id
+
+    def remove_context(self, name):
+        self._call('context', 'action', 'removeContext', contextName=name)
+
+    def access_url(self, target):
+        """Seed the site tree by requesting the target through the daemon."""
+        self._call('core', 'action', 'accessUrl', url=target, followRedirects='true')
+
+    def start_spider(self, target, context_name):
+        return self._call('spider', 'action', 'scan',
+                          url=target, contextName=context_name, recurse='true')['scan']
+
+    def spider_progress(self, spider_id):
+        return int(self._call('spider', 'view', 'status', scanId=spider_id)['status'])
+
+    def stop_spider(self, spider_id):
+        self._call('spider', 'action', 'stop', scanId=spider_id)
+
+    def remove_spider(self, spider_id):
+        self._call('spider', 'action', 'removeScan', scanId=spider_id)
+
+    def records_to_scan(self):
+        """Number of messages the passive scanner still has to process (daemon-wide)."""
+        return int(self._call('pscan', 'view', 'recordsToScan')['recordsToScan'])
+
+    def message_count(self):
+        """Number of messages in the daemon's history (daemon-wide)."""
+        return int(self._call('core', 'view', 'numberOfMessages')['numberOfMessages'])
+
+    def delete_alerts(self, base_url):
+        """Delete the alerts raised for URLs under base_url from the session."""
+        self._call('alert', 'action', 'deleteAlerts', baseurl=base_url)
+
+    def _site_lock(self, target):
+        parts = urlsplit(target)
+        site = f'{parts.scheme.lower()}://{(parts.netloc or "").lower()}'
+        with self._site_locks_lock:
+            return self._site_locks.setdefault(site, threading.Lock())
+
+    @contextmanager
+    def isolated(self, target):
+        """
+        Run a scan of target and the reading of its alerts with the site to itself.
+
+        Alerts live in the shared daemon session and are looked up by URL prefix,
+        so a scan only sees its own alerts if no other scan of the same site
+        (e.g. the site root and a path under it) runs at the same time and the
+        alerts of earlier scans are gone. Scans of one site in this process are
+        serialized and the target's alerts are deleted before and after.
+        """
+        with self._site_lock(target):
+            self.delete_alerts(target)
+            try:
+                yield
+            finally:
+                try:
+                    self.delete_alerts(target)
+                except ZapError as e:
+                    print(f"Error deleting ZAP alerts for {target}: {str(e)}")
+
+    def alerts(self, base_url, start=0, count=0):
+        """Return alerts raised for URLs under base_url (one entry per alert instance)."""
+        return self._call('core', 'view', 'alerts',
+                          baseurl=base_url, start=start, count=count)['alerts']
+
+    def iter_alerts(self, base_url, page_size=500):
+        """Yield alerts for base_url page by page so the whole list is never held at once."""
+        start = 0
+        while True:
+            page = self.alerts(base_url, start=start, count=page_size)
+            yield from page
+            if len(page) < page_size:
+                return
+            start += page_size
+
+    def scan(self, target, scan_id, deadline, spider_duration=60, poll_interval=1, cancel_token=None, trace=None):
+        """
+        Spider the target and wait for passive scanning on the shared daemon.
+
+        Args:
+            target: Absolute URL to scan
+            scan_id: Scan ID, used to name the per-scan context
+            deadline: time.monotonic() value by which the scan must finish
+            spider_duration: Maximum seconds to spend spidering
+            poll_interval: Seconds between progress checks
+            cancel_token: Optional CancelToken; a cancel stops the spider and
+                returns without waiting for passive scanning
+            trace: Optional Trace to record the zap.spider and zap.passive_scan spans in
+
+        Alerts stay in the daemon session afterwards; read them with iter_alerts()
+        inside the same isolated() block.
+        """
+        context_name = f'scan-{scan_id}'
+        spider_id = None
+        trace = trace or Trace('zap')
+        self.create_context(context_name, target)
+        try:
+            self.access_url(target)
+
+            with trace.span('zap.spider') as span:
+                spider_id = self.start_spider(target, context_name)
+                spider_deadline = min(deadline, time.monotonic() + spider_duration)
+                while self.spider_progress(spider_id) < 100:
+                    if time.monotonic() >= spider_deadline:
+                        print(f"ZAP spider time budget reached for {target}, stopping spider")
+                        self.stop_spider(spider_id)
+                        span['stopped'] = 'time_budget'
+                        break
+                    if pause(poll_interval, cancel_token):
+                        print(f"Scan {scan_id} cancelled, stopping ZAP spider for {target}")
+                        self.stop_spider(spider_id)
+                        span['stopped'] = 'cancelled'
+                        return
+
+            # Passive rules run in the background on the daemon, oldest message first.
+            # Our messages are all in history now, so they have been processed once
+            # every record still queued arrived after this point (traffic of other
+            # scans); waiting for the whole backlog would wait on those scans too
+            with trace.span('zap.passive_scan') as span:
+                seen = self.message_count()
+                while self.records_to_scan() > self.message_count() - seen:
+                    if time.monotonic() >= deadline:
+                        print(f"ZAP passive scan did not finish before the deadline for {target}")
+                        span['stopped'] = 'deadline'
+                        break
+                    if pause(poll_interval, cancel_token):
+                        span['stopped'] = 'cancelled'
+                        return
+        finally:
+            try:
+                if spider_id is not None:
+                    self.remove_spider(spider_id)
+                self.remove_context(context_name)
+            except ZapError as e:
+                print(f"Error cleaning up ZAP context {context_name}: {str(e)}")
+
+
+def pause(seconds, cancel_token=None):
+    """Sleep between polls; returns True (early) if cancel_token was cancelled."""
+    if cancel_token is None:
+        time.sleep(seconds)
+        return False
+    return cancel_token.wait(seconds)
+
+
+# Shared client for the zap_scanner daemon
+zap_client = ZapClient()
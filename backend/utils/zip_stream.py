@@ -0,0 +1,58 @@
+# zip archives written as a stream
+import zipfile
+
+
+class _ChunkSink:
+    """
+    Write-only file object that collects what zipfile writes until it is drained.
+
+    It cannot tell() or seek(), so zipfile writes each entry's sizes and CRC in a
+    data descriptor after the data instead of going back to patch the header;
+    that is what lets the archive be sent while it is being built.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        if self.chunks:
+            data = b''.join(self.chunks)
+            self.chunks = []
+            yield data
+
+
+def stream_zip(entries, compression=zipfile.ZIP_DEFLATED):
+    """
+    Build a ZIP archive piece by piece.
+
+    Only the entry currently being compressed is held in memory, so archives of
+    any number of entries are produced in constant memory.
+
+    Args:
+        entries: Iterable of (name, date_time, chunks), where date_time is a
+            (year, month, day, hour, minute, second) tuple and chunks an iterable
+            of str (written as UTF-8) or bytes
+        compression: zipfile compression method
+
+    Yields:
+        Bytes of the archive
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=compression) as archive:
+        for name, date_time, chunks in entries:
+            info = zipfile.ZipInfo(name, date_time=date_time)
+            info.compress_type = compression
+            with archive.open(info, 'w') as entry:
+                for chunk in chunks:
+                    entry.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+                    yield from sink.drain()
+            yield from sink.drain()
+    # Central directory
+    yield from sink.drain()
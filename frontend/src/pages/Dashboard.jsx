@@ -27,8 +27,8 @@ const Dashboard = () => {
         setStats(dashboardStats);
         
         // Fetch recent scans
-        const history = await scan.getScanHistory();
-        setRecentScans(history.scans?.slice(0, 5) || []);
+        const history = await scan.getScanHistory({ limit: 5 });
+        setRecentScans(history.scans || []);
         
         setLoading(false);
       } catch (err) {
@@ -7,6 +7,8 @@ const History = () => {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
   const [isLoggedIn, setIsLoggedIn] = useState(false);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     const token = localStorage.getItem('token');
@@ -16,6 +18,7 @@ const History = () => {
       try {
         const response = await scan.getScanHistory();
         setHistory(response.scans || []);
+        setNextCursor(response.next_cursor || null);
         setLoading(false);
       } catch (err) {
         setError(err.error || 'Tarixni yuklashda xatolik yuz berdi');
@@ -26,6 +29,20 @@ const History = () => {
     fetchHistory();
   }, []);
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const response = await scan.getScanHistory({ cursor: nextCursor });
+      setHistory((prev) => [...prev, ...(response.scans || [])]);
+      setNextCursor(response.next_cursor || null);
+    } catch (err) {
+      setError(err.error || 'Tarixni yuklashda xatolik yuz berdi');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const getStatusBadge = (status) => {
     switch (status) {
       case 'completed':
@@ -184,6 +201,21 @@ const History = () => {
                 ))}
               </tbody>
             </table>
+            {nextCursor && (
+              <div className="p-4 text-center border-t border-gray-200">
+                <button
+                  onClick={loadMore}
+                  disabled={loadingMore}
+                  className="px-4 py-2 text-blue-800 border border-blue-800 rounded-lg hover:bg-blue-50 disabled:opacity-50"
+                >
+                  {loadingMore ? (
+                    <><i className="fas fa-spinner fa-spin mr-2"></i> Yuklanmoqda...</>
+                  ) : (
+                    "Ko'proq ko'rsatish"
+                  )}
+                </button>
+              </div>
+            )}
           </div>
         )}
       </div>
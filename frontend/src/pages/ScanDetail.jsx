@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useParams, Link, useNavigate } from 'react-router-dom';
 import { format } from 'date-fns';
 import { 
@@ -30,6 +30,8 @@ const ScanDetail = () => {
   const [pollingInterval, setPollingInterval] = useState(null);
   const [isDownloading, setIsDownloading] = useState(false);
   const [progress, setProgress] = useState(0);
+  const reportRequested = useRef(false);
+  const scanEvents = useRef(null);
 
   useEffect(() => {
     // ID parametrini tekshirish
@@ -42,6 +44,46 @@ const ScanDetail = () => {
       return;
     }
 
+    // The AI analysis runs in the background; poll until its report is ready
+    const generateAndWaitForReport = async () => {
+      await scan.generateReport(id);
+      for (let attempt = 0; attempt < 40; attempt++) {
+        const report = await scan.getReportStatus(id);
+        if (report.status === 'done') {
+          setScanData((prev) => ({ ...prev, ...report.report }));
+          return;
+        }
+        if (report.status === 'failed') {
+          return;
+        }
+        await new Promise((resolve) => setTimeout(resolve, 3000));
+      }
+    };
+
+    // Show the AI summary as it is written; fall back to polling if streaming fails
+    const streamReportContent = () => new Promise((resolve) => {
+      if (reportRequested.current) {
+        resolve();
+        return;
+      }
+      reportRequested.current = true;
+      setScanData((prev) => ({ ...prev, summary: '', recommendations: [] }));
+      scan.streamReport(id, {
+        onSummary: (text) => setScanData((prev) => ({ ...prev, summary: (prev.summary || '') + text })),
+        onRecommendation: (text) => setScanData((prev) => ({
+          ...prev,
+          recommendations: [...(prev.recommendations || []), text]
+        })),
+        onDone: (report) => {
+          setScanData((prev) => ({ ...prev, ...report }));
+          resolve();
+        },
+        onError: () => {
+          generateAndWaitForReport().finally(resolve);
+        }
+      });
+    });
+
     const fetchScanDetails = async () => {
       try {
         setLoading(true);
@@ -52,12 +94,10 @@ const ScanDetail = () => {
         const calculatedProgress = scan.calculateScanProgress(data);
         setProgress(calculatedProgress);
         
-        // If scan is in progress or queued, start polling
+        // If scan is in progress or queued, follow its progress events
         if (data.status === 'in_progress' || data.status === 'queued') {
-          // If not already polling, start polling
-          if (!pollingInterval) {
-            const interval = setInterval(() => fetchUpdatedStatus(), 3000);
-            setPollingInterval(interval);
+          if (!scanEvents.current && !pollingInterval) {
+            watchScanProgress();
           }
         } 
         // If scan is completed, fetch vulnerabilities and stop polling
@@ -72,7 +112,7 @@ const ScanDetail = () => {
           
           // Generate report if not already generated
           try {
-            await scan.generateReport(id);
+            await streamReportContent();
           } catch (reportErr) {
             console.error('Error generating report:', reportErr);
           }
@@ -119,7 +159,7 @@ const ScanDetail = () => {
           
           // Generate report if not already generated
           try {
-            await scan.generateReport(id);
+            await streamReportContent();
           } catch (reportErr) {
             console.error('Error generating report:', reportErr);
           }
@@ -138,6 +178,33 @@ const ScanDetail = () => {
       }
     };
 
+    // Progress is pushed by the server; polling is only the fallback when the stream fails
+    const watchScanProgress = () => {
+      const finishedStages = new Set();
+      scanEvents.current = scan.watchScan(id, {
+        onStage: (stage) => {
+          if (stage.state === 'done' && ['server_info', 'zap', 'nmap', 'scoring'].includes(stage.stage)) {
+            finishedStages.add(stage.stage);
+          }
+          if (stage.stage !== 'queued' || stage.state === 'done') {
+            setScanData((prev) => (prev ? { ...prev, status: 'in_progress' } : prev));
+          }
+          setProgress((prev) => Math.max(prev, 10 + finishedStages.size * 20));
+        },
+        onFinished: () => {
+          scanEvents.current = null;
+          fetchUpdatedStatus();
+        },
+        onError: () => {
+          scanEvents.current = null;
+          if (!pollingInterval) {
+            const interval = setInterval(() => fetchUpdatedStatus(), 3000);
+            setPollingInterval(interval);
+          }
+        }
+      });
+    };
+
     const clearPollingInterval = () => {
       if (pollingInterval) {
         clearInterval(pollingInterval);
@@ -150,8 +217,12 @@ const ScanDetail = () => {
       fetchScanDetails();
     }
 
-    // Cleanup: clear polling interval when component unmounts
+    // Cleanup: close the progress stream and clear polling interval when component unmounts
     return () => {
+      if (scanEvents.current) {
+        scanEvents.current.close();
+        scanEvents.current = null;
+      }
       if (pollingInterval) {
         clearInterval(pollingInterval);
       }
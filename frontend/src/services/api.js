@@ -77,6 +77,23 @@ export const user = {
   changePassword: (passwords) => apiClient.post('/users/change-password', passwords),
 };
 
+// Queue the PDF export of a scan and wait until it has been rendered
+const waitForPdfExport = async (scanId) => {
+  let job = await apiClient.post(`/report/export/${scanId}`);
+  while (job.status === 'queued' || job.status === 'running' || job.status === 'not_started') {
+    if (job.status === 'not_started') {
+      job = await apiClient.post(`/report/export/${scanId}`);
+      continue;
+    }
+    // Long-poll: the server answers as soon as the render finishes
+    job = await apiClient.get(`/report/export/${scanId}/status`, { params: { wait: 20 } });
+  }
+  if (job.status === 'failed') {
+    throw new Error(job.error || 'Hisobotni yaratishda xatolik yuz berdi');
+  }
+  return job;
+};
+
 // Scan service
 export const scan = {
   startScan: (url) => apiClient.post('/scan/start', { url }),
@@ -101,7 +118,7 @@ export const scan = {
     }
     return apiClient.get(`/scan/${scanId}`);
   },
-  getScanHistory: () => apiClient.get('/scan/history'),
+  getScanHistory: (params = {}) => apiClient.get('/scan/history', { params }),
   getDashboardStats: () => apiClient.get('/scan/stats'),
   getVulnerabilities: (scanId) => {
     if (!scanId) {
@@ -115,9 +132,11 @@ export const scan = {
       console.error('Invalid scan ID: undefined');
       return Promise.reject(new Error('Skanerlash ID raqami noto\'g\'ri'));
     }
-    return apiClient.get(`/report/export/${scanId}?format=${format}`, {
+    // PDFs are rendered in the background; wait for the export job before downloading
+    const ready = format === 'pdf' ? waitForPdfExport(scanId) : Promise.resolve();
+    return ready.then(() => apiClient.get(`/report/export/${scanId}?format=${format}`, {
       responseType: 'blob',
-    }).then(response => {
+    })).then(response => {
       try {
         // Check if response is valid
         if (!response || !response.data) {
@@ -168,6 +187,55 @@ export const scan = {
     }
     return apiClient.post(`/report/generate/${scanId}`);
   },
+  // Follow a scan's progress events until it has finished; returns the EventSource so it can be closed
+  watchScan: (scanId, { onStage, onFinished, onError }) => {
+    const source = new EventSource(`${API_URL}/scan/events/${scanId}`);
+    source.addEventListener('stage', (event) => onStage(JSON.parse(event.data)));
+    ['completed', 'failed', 'cancelled'].forEach((name) => {
+      source.addEventListener(name, (event) => {
+        source.close();
+        onFinished(name, JSON.parse(event.data));
+      });
+    });
+    source.onerror = (err) => {
+      source.close();
+      if (onError) {
+        onError(err);
+      }
+    };
+    return source;
+  },
+  // Stream the AI analysis while it is written; returns the EventSource so it can be closed
+  streamReport: (scanId, { onSummary, onRecommendation, onDone, onError }) => {
+    const source = new EventSource(`${API_URL}/report/stream/${scanId}`);
+    source.addEventListener('summary', (event) => onSummary(JSON.parse(event.data).text));
+    source.addEventListener('recommendation', (event) => onRecommendation(JSON.parse(event.data).text));
+    source.addEventListener('done', (event) => {
+      source.close();
+      onDone(JSON.parse(event.data));
+    });
+    // Sent when the analysis was already running elsewhere and did not finish
+    source.addEventListener('failed', (event) => {
+      source.close();
+      if (onError) {
+        onError(new Error(JSON.parse(event.data).error || 'Tahlil muvaffaqiyatsiz tugadi'));
+      }
+    });
+    source.onerror = (err) => {
+      source.close();
+      if (onError) {
+        onError(err);
+      }
+    };
+    return source;
+  },
+  getReportStatus: (scanId) => {
+    if (!scanId) {
+      console.error('Invalid scan ID: undefined');
+      return Promise.reject(new Error('Skanerlash ID raqami noto\'g\'ri'));
+    }
+    return apiClient.get(`/report/generate/${scanId}`);
+  },
   cancelScan: (scanId) => {
     if (!scanId) {
       console.error('Invalid scan ID: undefined');